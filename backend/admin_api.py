@@ -0,0 +1,34 @@
+""" Administration endpoints of the API server """
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+
+from .dependencies import get_cli_args, graph_reloader
+
+
+def require_admin_token(authorization: Optional[str] = Header(None)):
+    """ The endpoints don't exist unless the ADMIN_TOKEN setting is set, and then they require it as bearer token """
+    token = get_cli_args().admin_token
+    if not token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if authorization is None or not secrets.compare_digest(authorization.encode(), f"Bearer {token}".encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token", headers={"WWW-Authenticate": "Bearer"})
+
+
+api_router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin_token)])
+
+
+@api_router.post('/reload', status_code=202)
+async def reload_graph():
+    """ Loads the graph file in the background and then serves it. Requests in flight finish with the old graph """
+    if graph_reloader.disabled:
+        raise HTTPException(status_code=409, detail=graph_reloader.disabled)
+    started = graph_reloader.reload()
+    return {'started': started, **graph_reloader.status()}
+
+
+@api_router.get('/generation')
+async def generation():
+    """ Version of the graph being served, and the state of the last reload """
+    return graph_reloader.status()
@@ -4,10 +4,10 @@ from typing import Optional
 
 import networkx as nx
 from fastapi import APIRouter, Depends
-from networkx import MultiDiGraph
 from sqlalchemy.orm import Session
 
-from .utils import convert2cytoscapeJSON, get_global_edge_data
+from .compact_graph import CompactGraph
+from .utils import convert2cytoscapeJSON
 from evidence_index import Evidence
 from evidence_index.client import EvidenceIndexClient
 from . import models as md, utils
@@ -19,7 +19,7 @@ from .viz_api import get_category_number_from_id
 
 from .dependencies import get_db, get_evidence, get_entities, get_structured_entities, get_commit_hash, get_graph_hash, \
     get_rankings_hash, get_cli_args, get_graph, get_frequencies, get_es_client, get_significance, get_synonyms, \
-    get_entity_search_databases
+    get_entity_search_databases, get_graph_file, get_edge_significance, get_overview_table
 
 api_router = APIRouter(prefix="/api")
 
@@ -79,11 +79,12 @@ def record_weights(data: md.UserRecord, db: Session = Depends(get_db),
                    commit_hash: str = Depends(get_commit_hash),
                    graph_hash: str = Depends(get_graph_hash),
                    rankings_hash: str = Depends(get_rankings_hash),
+                   graph_file: str = Depends(get_graph_file),
                    settings: Settings = Depends(get_cli_args)):
     metadata = RecordMetadataCreate(
         commit=commit_hash,
         query_str=data.query_str,
-        graph_name=settings.graph_file,
+        graph_name=graph_file,
         graph_hash=graph_hash,
         rankings_name=settings.impact_factors,
         rankings_hash=rankings_hash
@@ -105,69 +106,13 @@ def record_weights(data: md.UserRecord, db: Session = Depends(get_db),
 
 
 @api_router.get('/overview/{term}')
-async def anchor(term, graph: MultiDiGraph = Depends(get_graph), frequencies=Depends(get_frequencies),
-                 significance=Depends(get_significance)):
+async def anchor(term, overview: utils.OverviewTable = Depends(get_overview_table)):
     """ Returns the neighors, classified by influenced on, by and reciprocal """
 
-    if term not in graph:
-        return {
-            "reciprocals": [],
-            "influenced": [],
-            "influencers": []
-        }
-    successors = set(graph.neighbors(term))
-    predecessors = set(graph.predecessors(term))
-
-    reciprocals = successors & predecessors
-    influenced = successors - reciprocals
-    influencers = predecessors - reciprocals
-
-    # Get the terms of the weights
-    def get_weight_terms(a, b, bidirectional=False):
-        has_sig = False
-        avg_sig = 0.
-        impacts = list()
-        p_vals = list()
-        max_impact = 0.
-        seen_in = set()
-
-        if bidirectional:
-            edges = it.chain(((a, b, i) for i in graph[a][b]), ((b, a, i) for i in graph[b][a]))
-        else:
-            edges = ((a, b, i) for i in graph[a][b])
-
-        for x, y, z in edges:
-            doc_data = get_global_edge_data((x, y, z), graph, significance)
-            edge_data = graph.get_edge_data(x, y, z)
-            has_sig |= doc_data['has_significance']
-            avg_sig += doc_data['num_w_significance']
-            impacts += edge_data['impact_factors']
-            p_vals += doc_data['p_values']
-            seen_in |= edge_data['seen_in']
-            for impact in edge_data['impact_factors']:
-                if impact > max_impact:
-                    max_impact = impact
-
-        avg_impact = sum(impacts) / len(impacts)
-        avg_sig /= len(impacts)
-        avg_p_value = (sum(p_vals) / len(p_vals)) if len(p_vals) > 0 else 1.
-
-        return {'percentage_significance': avg_sig, 'has_significance': int(has_sig), 'avg_impact': avg_impact,
-                'max_impact': max_impact, 'avg_pvalue': avg_p_value, 'num_papers':len(seen_in)}
-
+    neighbors = overview.neighbors.get(term, ([], [], []))
     return {
-        'reciprocals': list(sorted(
-            ((r, graph.nodes[r]['label'], frequencies[frozenset((term, r))], get_weight_terms(term, r)) for r in
-             reciprocals if
-             'label' in graph.nodes[r]), key=lambda x: x[1].lower())),
-        'influenced': list(sorted(
-            ((r, graph.nodes[r]['label'], frequencies[frozenset((term, r))], get_weight_terms(term, r)) for r in
-             influenced if
-             'label' in graph.nodes[r]), key=lambda x: x[1].lower())),
-        'influencers': list(sorted(
-            ((r, graph.nodes[r]['label'], frequencies[frozenset((term, r))], get_weight_terms(r, term)) for r in
-             influencers if
-             'label' in graph.nodes[r]), key=lambda x: x[1].lower())),
+        direction: [(r, label, frequency, terms._asdict()) for r, label, frequency, terms in entries]
+        for direction, entries in zip(('reciprocals', 'influenced', 'influencers'), neighbors)
     }
 
 
@@ -282,30 +227,19 @@ async def search_entity(query:str,
 
 
 @api_router.get("/interaction/{source}/{destination}/{bidirectional}")
-async def interaction(source, destination, bidirectional: bool, graph: MultiDiGraph = Depends(get_graph),
-                      significance=Depends(get_significance)):
+async def interaction(source, destination, bidirectional: bool, graph: CompactGraph = Depends(get_graph),
+                      edge_significance=Depends(get_edge_significance)):
     # Find the shortest path between source and destination
-    path = nx.shortest_path(graph, source, destination)
+    path = graph.shortest_path(source, destination)
     valid_edges = set(zip(path, path[1:]))
-    subgraph = graph.subgraph(path)
-
-    edges = list(
-        sorted((e for e in subgraph.edges if bidirectional or (e[0], e[1]) in valid_edges), key=lambda e: (e[0], e[1])))
-    grouped_edges = it.groupby(edges, key=lambda e: (e[0], e[1]))
-
-    discarded = set()
 
-    for group, subset in grouped_edges:
-        subset = list(subset)
-        subset.sort(key=lambda e: sum(v for k, v in subgraph.get_edge_data(*e).items() if k == 'freq'), reverse=True)
+    edges = ((*graph.edge_endpoints(e), e) for e in graph.subgraph_edges(path).tolist())
+    edges = list(sorted((e for e in edges if bidirectional or (e[0], e[1]) in valid_edges), key=lambda e: (e[0], e[1])))
 
     # Add the significance data here
     new_edges = list()
-    for e in edges:
-        if e not in discarded:
-            x = (*e, dict(**subgraph.get_edge_data(*e), **get_global_edge_data(e, graph, significance)))
-            new_edges.append(x)
-    # new_edges = [(*e, dict(**subgraph.get_edge_data(*e), **get_global_edge_data(e))) for e in subgraph.edges if e in edges and e not in discarded]
+    for src, dst, key, e in edges:
+        new_edges.append((src, dst, key, dict(**graph.edge_data(e), **edge_significance[e].to_dict())))
 
     # Group the new edges by their label
     aggregated_new_edges = dict()
@@ -339,46 +273,35 @@ async def interaction(source, destination, bidirectional: bool, graph: MultiDiGr
     new_edges = [(k[0], k[1], ix, v) for ix, (k, v) in enumerate(aggregated_new_edges.items())]
 
     new_g = nx.MultiDiGraph()
-    # new_g.add_nodes_from(set(it.chain.from_iterable((e[0], e[1]) for e in new_edges)))
     new_nodes = list()
 
     for e in new_edges:
-        new_nodes.append((e[0], subgraph.nodes[e[0]]))
-        new_nodes.append((e[1], subgraph.nodes[e[1]]))
-    # new_nodes = set(it.chain.from_iterable((n, subgraph.nodes[n]) for n in e for e in new_edges))
+        new_nodes.append((e[0], graph.node_data(e[0])))
+        new_nodes.append((e[1], graph.node_data(e[1])))
     new_g.add_nodes_from(list(new_nodes))
     new_g.add_edges_from(new_edges)
 
-    new_g.remove_edges_from(discarded)
-
     return convert2cytoscapeJSON(new_g)
 
 
 @api_router.get("/neighbors/{elem}")
-async def neighbors(elem, graph: MultiDiGraph = Depends(get_graph), significance = Depends(get_significance)):
-    subgraph = graph.subgraph(list(graph.neighbors(elem)) + list(graph.predecessors(elem)) + [elem])
-
-    edges = [e for e in subgraph.edges if (e[0] == elem or e[1] == elem)]
-    edges.sort(key=lambda e: sum(v for k, v in subgraph.get_edge_data(*e).items() if k == 'freq'), reverse=True)
+async def neighbors(elem, graph: CompactGraph = Depends(get_graph),
+                    edge_significance=Depends(get_edge_significance)):
+    edges = list(graph.out_edges(elem)) + graph.in_edges(elem)
+    edges.sort(key=lambda e: graph.edge_freq[e], reverse=True)
 
-    discarded = set(edges[100:])
-    # discarded = set()
-    edges = set(edges)
+    # The 100 most frequent, in the order of the graph
+    edges = sorted(edges[:100])
 
-    new_edges = [(*e, dict(**subgraph.get_edge_data(*e), **get_global_edge_data(e, graph, significance))) for e in
-                 subgraph.edges if
-                 e in edges and e not in discarded]
+    new_edges = [(*graph.edge_endpoints(e), dict(**graph.edge_data(e), **edge_significance[e].to_dict()))
+                 for e in edges]
     new_g = nx.MultiDiGraph()
-    # new_g.add_nodes_from(set(it.chain.from_iterable((e[0], e[1]) for e in new_edges)))
     new_nodes = list()
 
     for e in new_edges:
-        new_nodes.append((e[0], subgraph.nodes[e[0]]))
-        new_nodes.append((e[1], subgraph.nodes[e[1]]))
-    # new_nodes = set(it.chain.from_iterable((n, subgraph.nodes[n]) for n in e for e in new_edges))
+        new_nodes.append((e[0], graph.node_data(e[0])))
+        new_nodes.append((e[1], graph.node_data(e[1])))
     new_g.add_nodes_from(list(new_nodes))
     new_g.add_edges_from(new_edges)
 
-    new_g.remove_edges_from(discarded)
-
     return convert2cytoscapeJSON(new_g)
@@ -1,24 +1,33 @@
 import csv
 import glob
+import hashlib
 import itertools as it
 import json
 import logging
 import os.path
 import pickle
 import re
+import sqlite3
+import sys
+from abc import ABC, abstractmethod
+from array import array
 from collections import Counter, defaultdict
-from html.parser import HTMLParser
-from io import StringIO
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from functools import lru_cache
 from pathlib import Path
-from typing import NamedTuple, Set, Optional, Mapping
+from typing import NamedTuple, Set, Optional, Mapping, Iterator, Iterable, Dict, Tuple, List, Callable
 
 import networkx as nx
 import plac as plac
 from tqdm import tqdm
 
 # Function definitions
+from backend.build_profile import BuildProfile, default_report_path
+from backend.columnar import write_columnar
 from backend.network import SignificanceRow
-from evidence_index.create_evidence_index import parse_markup
+from backend.utils import md5_hash
+from evidence_index.markup import strip_markups
 from rankings import ImpactFactors
 
 pmcid_pattern = re.compile(r"^PMC[1-9]\d{0,6}$", re.IGNORECASE)
@@ -36,18 +45,130 @@ class XDDMetaData(NamedTuple):
     doi: Optional[str]
 
 
-def read_uniprot(path):
-    """ Parse the fasta file with uniprot data to generate a dictionary of descriptions """
-
-    ret = {}
+def iter_uniprot(path) -> Iterator[Tuple[str, str]]:
+    """ Parse the fasta file with uniprot data and yield the accession and description of each entry """
     with open(path, 'r') as f:
         for line in tqdm(f, desc='Reading uniprot ...'):
             if line.startswith('>sp'):
                 prefix = line.split('OS=')[0]
                 triplet, desc = prefix.split(' ', 1)
                 gid = triplet.split('|')[1]
-                ret[gid] = desc
-    return ret
+                yield gid, desc
+
+
+def read_uniprot(path):
+    """ Parse the fasta file with uniprot data to generate a dictionary of descriptions """
+    return dict(iter_uniprot(path))
+
+
+def file_signature(path) -> Optional[dict]:
+    """ Size and modification time of a file, used to detect changes in the inputs of the build """
+    if path is None:
+        return None
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+
+class SQLiteIndex(ABC):
+    """
+    Persistent key-value index of a source file, in a SQLite table. It is built once and rebuilt only when the size or
+    mtime of the source change. Closes its connection when used as a context manager
+    """
+
+    # Bump when the layout of the table changes, to rebuild the existing indices
+    SCHEMA_VERSION = 1
+
+    def __init__(self, source_path: Path, index_path: Optional[Path] = None) -> None:
+        if index_path is None:
+            index_path = source_path.with_name(source_path.name + '.sqlite')
+        signature = json.dumps({'source': file_signature(source_path), 'schema': self.SCHEMA_VERSION})
+
+        if not self._is_current(index_path, signature):
+            self._build(source_path, index_path, signature)
+
+        self._db = sqlite3.connect(str(index_path))
+
+    @abstractmethod
+    def _entries(self, source_path: Path) -> Iterator[Tuple[str, str]]:
+        """ Key-value pairs of the source. Later pairs replace earlier ones with the same key """
+
+    @staticmethod
+    def _is_current(index_path: Path, signature: str) -> bool:
+        if not index_path.exists():
+            return False
+        with closing(sqlite3.connect(str(index_path))) as db:
+            try:
+                row = db.execute("SELECT value FROM meta WHERE key = 'signature'").fetchone()
+            except sqlite3.DatabaseError:
+                return False
+        return row is not None and row[0] == signature
+
+    def _build(self, source_path: Path, index_path: Path, signature: str) -> None:
+        """ Writes the index into a temporary file and moves it in place when complete """
+        tmp_path = index_path.with_name(index_path.name + '.tmp')
+        tmp_path.unlink(missing_ok=True)
+        with closing(sqlite3.connect(str(tmp_path))) as db:
+            db.execute("CREATE TABLE entries (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID")
+            db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            entries = self._entries(source_path)
+            while batch := list(it.islice(entries, 10_000)):
+                db.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?)", batch)
+            db.execute("INSERT INTO meta VALUES ('signature', ?)", (signature,))
+            db.commit()
+        os.replace(tmp_path, index_path)
+
+    def lookup(self, key: str) -> Optional[str]:
+        row = self._db.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def lookup_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        """ Batch lookup. Returns the values of the keys present in the index """
+        keys = iter(keys)
+        ret = dict()
+        # Stay below the limit of parameters of a statement of old SQLite versions
+        while batch := list(it.islice(keys, 900)):
+            query = f"SELECT key, value FROM entries WHERE key IN ({', '.join('?' * len(batch))})"
+            ret.update(self._db.execute(query, batch))
+        return ret
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> 'SQLiteIndex':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class UniprotIndex(SQLiteIndex):
+    """
+    Index of the uniprot descriptions, built once per fasta file.
+    The descriptions are fetched as they are requested and memoized, so a build only loads the accessions it sees
+    """
+
+    def __init__(self, fasta_path: Path, index_path: Optional[Path] = None) -> None:
+        super().__init__(fasta_path, index_path)
+        self._cache: Dict[str, Optional[str]] = dict()
+
+    def _entries(self, source_path: Path) -> Iterator[Tuple[str, str]]:
+        return iter_uniprot(source_path)
+
+    def get(self, accession: str, default=None):
+        if accession not in self._cache:
+            self._cache[accession] = self.lookup(accession)
+        description = self._cache[accession]
+        return description if description is not None else default
+
+
+class PmcidIndex(SQLiteIndex):
+    """ DOI to PMCID index of the PMC-ids.csv file, built once per release """
+
+    def _entries(self, source_path: Path) -> Iterator[Tuple[str, str]]:
+        with source_path.open() as f:
+            reader = csv.DictReader(f)
+            for r in tqdm(reader, desc="Indexing PMCID metadata"):
+                yield r['DOI'], r['PMCID']
 
 
 def parse_file(p, bibliography: Mapping[str, XDDMetaData]):
@@ -80,14 +201,36 @@ def parse_file(p, bibliography: Mapping[str, XDDMetaData]):
     return rows
 
 
-def parse_files(ps, bibliography):
+# Bibliography shared by the worker processes of the parallel parser. Set once per worker by the pool initializer,
+# so it doesn't get pickled again for every file
+_worker_bibliography: Optional[Mapping[str, XDDMetaData]] = None
+
+
+def _init_parse_worker(bibliography: Mapping[str, XDDMetaData]):
+    global _worker_bibliography
+    _worker_bibliography = bibliography
+
+
+def _parse_file_in_worker(p):
+    return parse_file(p, _worker_bibliography)
+
+
+def parse_files(ps, bibliography, workers: int = 1):
     """
-    Reads all files and joins the resulting dictionaries
+    Reads all files and joins the resulting dictionaries.
+    If workers > 1, the files are parsed by a pool of processes. The rows are merged in the order of the input paths,
+    so the result is the same as the serial one
     """
     frs = list()
-    for p in ps:
-        fr = parse_file(p, bibliography)
-        frs.extend(fr)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_parse_worker,
+                                 initargs=(bibliography,)) as executor:
+            for fr in executor.map(_parse_file_in_worker, ps, chunksize=64):
+                frs.extend(fr)
+    else:
+        for p in ps:
+            fr = parse_file(p, bibliography)
+            frs.extend(fr)
     return frs
 
 
@@ -143,46 +286,126 @@ def merge_graphs(g, h):
 doi_pattern = re.compile(r"10.\d{4,9}/[-._;()/:A-Z0-9]+", re.IGNORECASE)
 
 
-def parse_xdd_blibliography(path: Path) -> Mapping[str, XDDMetaData]:
-    # Read the json file with the bibliography
-    with path.open() as f:
-        bib = json.load(f)
-
-    # Transform the json file into a dictionary with the data we need
-    # Key = xDD UUID
-    # Value: NamedTuple with the following fields
-    #   - Journal name
-    #   - Article link
-    #   - Article DOI
-
-    entries = list()
-    for elem in tqdm(bib, desc="Reading xDD bibliography", unit="entries"):
-        key, doi = None, None
-        for identifier in elem["identifier"]:
-            id_type = identifier["type"]
-            if id_type == "_xddid":
-                key = identifier["id"]
-            elif id_type == "doi":
-                doi = identifier["id"]
-
-        assert key is not None, f"Problem reading xdd id"
-
-        journal = elem["journal"]["name"]["name"]
-        link = elem["link"][0]["url"]
-
-        # If no DOI specified, try finding it in the link
-        if doi is None:
-            match = doi_pattern.search(link)
-            if match:
-                doi = match.group()
+def iter_json_array(f, chunk_size: int = 1 << 20) -> Iterator:
+    """
+    Incrementally reads a file with a JSON array and yields its elements one at a time. Only the element being decoded
+    and a chunk of the file are held in memory
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+
+    def next_char():
+        """ Skips the whitespace and returns the next character, reading more of the file if needed """
+        nonlocal buffer, pos, eof
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer) or eof:
+                return buffer[pos] if pos < len(buffer) else ''
+            chunk = f.read(chunk_size)
+            buffer, pos, eof = chunk, 0, not chunk
+
+    if next_char() != '[':
+        raise ValueError("Expected a JSON array")
+    pos += 1
+
+    first = True
+    while True:
+        char = next_char()
+        if char == ']':
+            return
+        if not first:
+            if char != ',':
+                raise ValueError(f"Expected ',' or ']' in the JSON array, found {char!r}")
+            pos += 1
+            next_char()
+        first = False
+
+        # Decode the next element, reading more of the file until it is complete
+        while True:
+            try:
+                elem, end = decoder.raw_decode(buffer, pos)
+                # A number at the end of the buffer may continue in the next chunk
+                complete = eof or (end < len(buffer) and buffer[end] not in '.eE+-0123456789')
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = False
+            if complete:
+                break
+            chunk = f.read(chunk_size)
+            buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+        pos = end
+        yield elem
+
+
+def parse_xdd_entry(elem) -> Tuple[str, XDDMetaData]:
+    """ Extracts the xDD UUID and the metadata we need from an entry of the bibliography """
+    key, doi = None, None
+    for identifier in elem["identifier"]:
+        id_type = identifier["type"]
+        if id_type == "_xddid":
+            key = identifier["id"]
+        elif id_type == "doi":
+            doi = identifier["id"]
+
+    assert key is not None, f"Problem reading xdd id"
+
+    journal = elem["journal"]["name"]["name"]
+    link = elem["link"][0]["url"]
+
+    # If no DOI specified, try finding it in the link
+    if doi is None:
+        match = doi_pattern.search(link)
+        if match:
+            doi = match.group()
+        else:
+            doi = None
+
+    return key, XDDMetaData(intern_str(journal), link, doi)
+
+
+def parse_xdd_blibliography(path: Path, cache_path: Optional[Path] = None) -> Mapping[str, XDDMetaData]:
+    """
+    Reads the json file with the bibliography into a dictionary:
+    Key = xDD UUID
+    Value: NamedTuple with the following fields
+      - Journal name
+      - Article link
+      - Article DOI
+
+    The dictionary is cached next to the bibliography, keyed on its hash, so later builds skip the parse
+    """
+    if cache_path is None:
+        cache_path = path.with_name(path.name + '.cache.pickle')
+
+    signature = file_signature(path)
+    cached = None
+    if cache_path.exists():
+        with cache_path.open('rb') as f:
+            cached = pickle.load(f)
+        # Only hash the bibliography if it may have changed
+        if cached['signature'] != signature:
+            source_hash = md5_hash(str(path))
+            if cached['md5'] != source_hash:
+                cached = None
             else:
-                doi = None
+                cached['signature'] = signature
+                with cache_path.open('wb') as f:
+                    pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
 
-        entry = XDDMetaData(journal, link, doi)
-        entries.append((key, entry))
+    if cached is None:
+        with path.open() as f:
+            entries = dict(parse_xdd_entry(elem) for elem in
+                           tqdm(iter_json_array(f), desc="Reading xDD bibliography", unit="entries"))
+        # Store plain tuples, so the cache doesn't depend on the module's name
+        cached = {'signature': signature, 'md5': md5_hash(str(path)),
+                  'entries': {key: tuple(entry) for key, entry in entries.items()}}
+        with cache_path.open('wb') as f:
+            pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return entries
 
-    # Return the dictionary built from the list of extracted entries
-    return dict(entries)
+    return {key: XDDMetaData._make(entry) for key, entry in cached['entries'].items()}
 
 
 class EdgeKey(NamedTuple):
@@ -212,43 +435,146 @@ def resolve_document(seen_in: str, bibilography: Mapping[str, XDDMetaData], doi2
             return key
 
 
-@plac.pos('output_file', 'Graph output file', type=Path)
-@plac.opt('index_factors_path', 'Pickle file that contains impact factors', type=Path)
-@plac.opt('bibliography_path', 'Json file with the bibliography generated by xDD', type=Path)
-@plac.opt('uniprot_path', 'Uniprot fasta file, for the participant descriptions', type=Path)
-@plac.opt('pmcid_map_path', 'PMCID to DOI and others file', type=Path)
-@plac.pos('input_files_dirs', 'Arizona files directory', type=Path)
-def main(output_file:Path,
-         index_factors_path: Optional[Path],
-         bibliography_path: Optional[Path],
-         uniprot_path=Path('../data/uniprot_sprot.fasta'),
-         pmcid_map_path=Path('../data/PMC-ids.csv'),
-         *input_files_dirs
-         ):
+def cached_document_resolver(bibliography: Mapping[str, XDDMetaData],
+                             doi2pmcid: Mapping[str, str]) -> Callable[[str], str]:
+    """ Memoized resolve_document for a build. Rows of the same paper share the SEEN IN value """
+
+    @lru_cache(maxsize=None)
+    def resolve(seen_in: str) -> str:
+        return resolve_document(seen_in, bibliography, doi2pmcid)
+
+    return resolve
+
+
+def row_publication(row: 'ArizonaRow') -> str:
+    """ The journal of the row, or else its paper, to look up the impact factor """
+    return row.journal if row.journal else row.seen_in.strip()
+
+
+def with_impacts(rows: Iterable['ArizonaRow'], index_factors,
+                 batch_size: int = 4096) -> Iterator[Tuple['ArizonaRow', float]]:
     """
-    Reads
+    Pairs each row with the impact factor of its publication. The distinct publications of each batch of rows are
+    looked up at once, and each publication only the first time it's seen. Zero for all without impact factors
     """
+    impacts = dict()
+    rows = iter(rows)
+    while batch := list(it.islice(rows, batch_size)):
+        unseen = list({row_publication(row) for row in batch}.difference(impacts))
+        if index_factors:
+            impacts.update(zip(unseen, index_factors.get_impacts(unseen)))
+        else:
+            impacts.update((publication, 0.) for publication in unseen)
+        for row in batch:
+            yield row, impacts[row_publication(row)]
 
-    # Read uniprot for the top_descriptions
-    uniprot_names = read_uniprot(uniprot_path)
-    paths = it.chain.from_iterable(glob.glob(os.path.join(input_dir, "*.tsv")) for input_dir in input_files_dirs)
 
-    index_factors = None
-    # Load the index factors if they are specified
-    if index_factors_path:
-        index_factors = ImpactFactors(index_factors_path)
+class ArizonaRow(NamedTuple):
+    """ Compact record with the columns of an arizona row used to build the graph """
+    input: str
+    output: str
+    controller: str
+    event_id: str
+    label: str
+    seen_in: str
+    seen: str
+    triggers: str
+    evidence: str
+    journal: Optional[str]
+    link: str
 
-    xdd_bib = None
-    if bibliography_path:
-        xdd_bib = parse_xdd_blibliography(bibliography_path)
 
-    # Parse the PMCIDs file
-    with pmcid_map_path.open() as f:
-        reader = csv.DictReader(f)
-        doi2pmcid = {r['DOI']:r['PMCID'] for r in tqdm(reader, desc="Reading PMCID metadata")}
+def compact_row(row: Mapping[str, str]) -> ArizonaRow:
+    """ Keeps only the columns used downstream, with the participant names fixed """
+    input_, output, controller = row['INPUT'], row['OUTPUT'], row['CONTROLLER']
+    try:
+        input_ = fix_frailty_groundings(input_)
+        output = fix_frailty_groundings(output)
+        controller = fix_frailty_groundings(controller)
+    except Exception:
+        print(f'Problem in {row["SEEN IN"]}')
+
+    # The values repeated across rows of the same paper or across papers share the same string object
+    journal = row.get('JOURNAL')
+    return ArizonaRow(input_, output, controller, row['EVENT ID'], intern_str(row['EVENT LABEL']),
+                      intern_str(row['SEEN IN']), row['SEEN'], intern_str(row['TRIGGERS']), row['EVIDENCE'],
+                      intern_str(journal), intern_str(row['LINK']))
+
+
+def intern_str(s):
+    """ sys.intern that lets through anything that is not a string """
+    return sys.intern(s) if type(s) == str else s
+
+
+class Interner:
+    """ Assigns consecutive integer ids to values. The values, in the order of their ids, are the lookup table """
+
+    def __init__(self, values: Iterable = ()) -> None:
+        self.values = list()
+        self._ids = dict()
+        for value in values:
+            self.id_of(value)
+
+    def id_of(self, value) -> int:
+        ix = self._ids.get(value)
+        if ix is None:
+            ix = self._ids[value] = len(self.values)
+            self.values.append(value)
+        return ix
+
+    def ids_of(self, values: Iterable) -> array:
+        """ Sorted, compact array with the ids of the values """
+        return array('I', sorted(self.id_of(value) for value in values))
+
+
+def iter_parsed_files(ps, bibliography, workers: int = 1) -> Iterator[Tuple[str, List[ArizonaRow]]]:
+    """
+    Lazily reads the files and yields each path with the compact records of its rows. Only the rows of the files in
+    flight are held in memory
+    """
+    if workers > 1:
+        batch_size = workers * 16
+        ps = iter(ps)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_parse_worker,
+                                 initargs=(bibliography,)) as executor:
+            # Submit the files in batches to keep bounded the number of parsed files waiting to be consumed
+            while batch := list(it.islice(ps, batch_size)):
+                for p, fr in zip(batch, executor.map(_parse_file_in_worker, batch)):
+                    yield p, list(map(compact_row, fr))
+    else:
+        for p in ps:
+            yield p, list(map(compact_row, parse_file(p, bibliography)))
+
+
+def iter_rows(ps, bibliography, workers: int = 1) -> Iterator[ArizonaRow]:
+    """ Lazily reads the files and yields a compact record per row """
+    for _, rows in iter_parsed_files(ps, bibliography, workers):
+        yield from rows
+
+
+class RowStream:
+    """ Re-iterable view over the rows. Every iteration reads them again from the source, instead of holding them """
+
+    def __init__(self, make_rows: Callable[[], Iterator[ArizonaRow]]):
+        self._make_rows = make_rows
+
+    def __iter__(self) -> Iterator[ArizonaRow]:
+        return self._make_rows()
 
-    # Generate a data frame from the arizona output files
-    all_rows = parse_files(tqdm(paths, desc='Parsing files'), xdd_bib)
+
+class RowScan(NamedTuple):
+    """ Results of the first pass over the rows, required to build the edges """
+    dataset_inputs: Dict[Tuple[str, str], str]
+    dataset_outputs: Dict[Tuple[str, str], str]
+    significance_extractions: Dict[str, List[SignificanceRow]]
+    all_descriptions: Dict[str, Counter]
+
+
+def scan_rows(rows: Iterable[ArizonaRow], bibliography, doi2pmcid, uniprot_names) -> RowScan:
+    """
+    Single pass over the rows to cache the event's inputs and outputs, collect the significance extractions and count
+    the descriptions of the entities
+    """
 
     # Dict to resolve the oututs
     dataset_outputs = dict()
@@ -256,49 +582,32 @@ def main(output_file:Path,
     dataset_inputs = dict()
     # Store the significance extractions in this variable
     significance_extractions = defaultdict(list)
-    # Journals associated to each row
-    journals = defaultdict(set)
-    impact_factors = defaultdict(list)
+    # Build top_descriptions
+    all_descriptions = defaultdict(Counter)
 
-    # Fix the participant names here:
-    for row in tqdm(all_rows, desc='Fixing participant\'s names'):
+    document_of = cached_document_resolver(bibliography, doi2pmcid)
+
+    for row in tqdm(rows, desc='Scanning rows'):
+        # Handle significance rows
         try:
-            row['INPUT'] = fix_frailty_groundings(row['INPUT'])
-            row['OUTPUT'] = fix_frailty_groundings(row['OUTPUT'])
-            row['CONTROLLER'] = fix_frailty_groundings(row['CONTROLLER'])
-
-            # Handle significance rows
-            if row['EVENT LABEL'] == 'Significance':
-                type_ = row['INPUT'].lower()
-                value = row['OUTPUT']
-                paper = resolve_document(row['SEEN IN'], xdd_bib, doi2pmcid)
+            if row.label == 'Significance':
+                type_ = row.input.lower()
+                value = row.output
+                paper = document_of(row.seen_in)
                 if paper is not None:  # Be sure to memorize only those instances that can be attributed to a paper
                     significance_extractions[paper].append(SignificanceRow(type_, value))
         except Exception:
-            print(f'Problem in {row["SEEN IN"]}')
-
-    for row in tqdm(all_rows, desc="Caching inputs and outputs"):
-        # key = (row._19, row._4) # ._4 = EVENT ID, ._19 = SEEN IN
-        key = (row['EVENT ID'], row['SEEN IN'])
-        val_o = row['OUTPUT']
-        dataset_outputs[key] = val_o
-        val_i = row['INPUT']
-        dataset_inputs[key] = val_i
-        if 'JOURNAL' in row:
-            journals[key] = row['JOURNAL']
-
-    # Filter criteria to discard any row with a malformed participant
-    row_stays = lambda row: not is_black_listed(row['INPUT']) and \
-                            not is_black_listed(row['OUTPUT']) and \
-                            not is_black_listed(row['CONTROLLER'])
+            print(f'Problem in {row.seen_in}')
 
-    filtered_rows = [row for row in tqdm(all_rows, desc='Choosing the rows to keep') if row_stays(row)]
+        key = (row.event_id, row.seen_in)
+        dataset_outputs[key] = row.output
+        dataset_inputs[key] = row.input
 
-    # Build top_descriptions
-    all_descriptions = defaultdict(Counter)
+        # Discard any row with a malformed participant
+        if not row_stays(row):
+            continue
 
-    for row in tqdm(filtered_rows, desc='Generating entity top_descriptions'):
-        for participant in (row[p] for p in ('INPUT', 'OUTPUT', 'CONTROLLER')):
+        for participant in (row.input, row.output, row.controller):
             if participant != 'NONE':
                 for txt, gid in decompose_complex([participant]):
                     # Normalize the text to remove case variations of the same description
@@ -307,75 +616,142 @@ def main(output_file:Path,
                     all_descriptions[gid][uniprot_names.get(num, txt)] += 1  # If in uniprot, use the desc, otherwise,
                     # use the text
 
-    # Choose the  most frequent description for each entity
-    top_descriptions = {k: v.most_common()[0][0] for k, v in
-                        tqdm(all_descriptions.items(), desc='Choosing the most frequent description')}
+    return RowScan(dataset_inputs, dataset_outputs, significance_extractions, all_descriptions)
+
+
+def row_stays(row: ArizonaRow) -> bool:
+    """ Filter criteria to discard any row with a malformed participant """
+    return not is_black_listed(row.input) and \
+           not is_black_listed(row.output) and \
+           not is_black_listed(row.controller)
+
+
+class EventResolutionTable:
+    """
+    Resolves the event ids used as participants to the participants they realize, following the chain of events
+    within the paper. The input of an event is realized by the output of the event it refers to, and vice versa.
+    All the chains are resolved upfront, iteratively, so each lookup is O(1). Chains that are broken or that loop
+    can't be resolved
+    """
+
+    def __init__(self, dataset_inputs: Mapping[Tuple[str, str], str], dataset_outputs: Mapping[Tuple[str, str], str]):
+        # Keyed by ((event id, paper), whether the output of the event is taken)
+        self._table: Dict[Tuple[Tuple[str, str], bool], Optional[str]] = dict()
+        for key in tqdm(dataset_outputs, desc='Resolving event chains'):
+            self._resolve_chain(key, True, dataset_inputs, dataset_outputs)
+            self._resolve_chain(key, False, dataset_inputs, dataset_outputs)
+
+    @staticmethod
+    def _is_participant(eid) -> bool:
+        return "::" in eid or eid == 'NONE'
+
+    def _resolve_chain(self, key, take_output, dataset_inputs, dataset_outputs):
+        table = self._table
+        chain = list()
+        on_chain = set()
+        state = (key, take_output)
+        while True:
+            if state in table:
+                resolved = table[state]
+                break
+            if state in on_chain:
+                resolved = None  # Cycle
+                break
+            key, take_output = state
+            cache = dataset_outputs if take_output else dataset_inputs
+            if key not in cache:
+                resolved = None  # Broken chain
+                break
+            chain.append(state)
+            on_chain.add(state)
+            value = cache[key]
+            if not isinstance(value, str):
+                resolved = None
+                break
+            if self._is_participant(value):
+                resolved = value
+                break
+            # The realized element of the next event is the opposite participant
+            state = ((value, key[1]), not take_output)
+
+        for state in chain:
+            table[state] = resolved
+
+    def resolve(self, eid: str, col: str, paper: str) -> str:
+        if col not in ('INPUT', 'OUTPUT', 'CONTROLLER'):
+            raise Exception("Invalid resolution")
+
+        if self._is_participant(eid):
+            return eid
+
+        # If we look for the input of an event, then the realized element is the output of the input
+        resolved = self._table.get(((eid, paper), col != 'OUTPUT'))
+        if resolved is None:
+            raise Exception(f"Can't resolve event {eid} of {paper}")
+        return resolved
+
+
+class EdgeAggregates(NamedTuple):
+    """ Information accumulated for each edge of the graph """
+    edges: Set[EdgeKey]
+    counts: Counter
+    evidences: Dict[EdgeKey, set]
+    seen_in: Dict[EdgeKey, set]
+    journals: Dict[EdgeKey, set]
+    impact_factors: Dict[EdgeKey, list]
+
+
+def build_edges(rows: Iterable[ArizonaRow], events: EventResolutionTable, bibliography, doi2pmcid,
+                index_factors) -> EdgeAggregates:
+    """ Second pass over the rows. Accumulates the information of the edges built from them """
 
     # Start building the graph edges here
     counts = Counter()
     evidences = defaultdict(set)
     seen_in = defaultdict(set)  # Keep track of the papers where an edge has been observed
+    journals = defaultdict(set)
+    impact_factors = defaultdict(list)
     edges: Set[EdgeKey] = set()
 
-    def resolve(eid, col, paper):
-        cache = dataset_inputs if col == 'OUTPUT' else dataset_outputs
-
-        if "::" not in eid and eid != 'NONE':
-            # Resolve complex events by following the trace of the events in the frame
-            row = cache[(eid, paper)]
-            # If we look for the input, of an event, then the realized element is the outut of the input
-            if col == 'INPUT':
-                return resolve(row, 'OUTPUT', paper)
-            elif col == 'OUTPUT':
-                return resolve(row, 'INPUT', paper)
-            elif col == 'CONTROLLER':
-                return resolve(row, 'OUTPUT', paper)
-            else:
-                raise Exception("Invalid resolution")
-        else:
-            return eid
+    resolve = events.resolve
+    document_of = cached_document_resolver(bibliography, doi2pmcid)
 
-    # Build the edges from the rows in the data frame
-    for row in tqdm(filtered_rows, desc='Building edges'):
+    # Build the edges from the rows in the data frame. The impact factor is the same for all the edges of the row
+    for row, impact_factor in with_impacts(tqdm(rows, desc='Building edges'), index_factors):
+
+        if not row_stays(row):
+            continue
 
         # Skip this extraction if it comes from a paper with low index factor
-        if index_factors:
-            source = row['JOURNAL'] if 'JOURNAL' in row else row['SEEN IN'].strip()
-            # TODO make this dynamic
-            # if row['SEEN IN'] and index_factors.get_impact(source) < 0.5:
-            #     continue
+        # TODO make this dynamic
+        # if row.seen_in and impact_factor < 0.5:
+        #     continue
 
         # Ignore those that have adhoc entities, i.e. uaz prefixes
-        if "uaz:" not in row['INPUT'] and "uaz:" not in row['OUTPUT'] and "uaz:" not in row['CONTROLLER']:
+        if "uaz:" not in row.input and "uaz:" not in row.output and "uaz:" not in row.controller:
             try:
-                paper = resolve_document(row['SEEN IN'], xdd_bib, doi2pmcid)
-                inputs = list(decompose_complex([resolve(row['INPUT'], 'INPUT', paper)]))
-                outputs = list(decompose_complex([resolve(row['OUTPUT'], 'OUTPUT', paper)]))
-                controllers = list(decompose_complex([resolve(row['CONTROLLER'], 'CONTROLLER', paper)]))
-                label = row['EVENT LABEL']
+                paper = document_of(row.seen_in)
+                inputs = list(decompose_complex([resolve(row.input, 'INPUT', paper)]))
+                outputs = list(decompose_complex([resolve(row.output, 'OUTPUT', paper)]))
+                controllers = list(decompose_complex([resolve(row.controller, 'CONTROLLER', paper)]))
+                label = row.label
 
                 if len(controllers) > 0:
+                    journal = row.journal
+
                     for controller, input, output in it.product(controllers, inputs, outputs):
                         controller = controller[1]
                         input = input[1]
                         output = output[1]
-                        freq = row['SEEN']
-                        doc = resolve_document(row['SEEN IN'], xdd_bib, doi2pmcid)
-                        trigger = row['TRIGGERS']
-                        evidence = row['EVIDENCE'].split(' ++++ ')
+                        freq = row.seen
+                        doc = paper
+                        trigger = row.triggers
+                        evidence = row.evidence.split(' ++++ ')
 
-                        if 'JOURNAL' in row:
-                            journal = row['JOURNAL']
-                        else:
-                            journal = None
-
-                        source = journal if journal else row['SEEN IN'].strip()
-                        impact_factor = index_factors.get_impact(source)
-
-                        key = EdgeKey(controller, input, output, trigger, label)
+                        key = EdgeKey(intern_str(controller), intern_str(input), intern_str(output), trigger, label)
                         seen_in[key].add(doc)  # This is the PMCID or paper id where the edge has been seen
                         counts[key] += int(freq)  # This comes as string, cast it to an int
-                        link = row['LINK']
+                        link = row.link
                         evidences[key] |= {(link, impact_factor, e) for e in evidence}
                         journals[key].add(journal)
                         impact_factors[key].append(impact_factor)
@@ -384,28 +760,23 @@ def main(output_file:Path,
                         edges.add(key)
                 elif "ssociation" in label:
 
-                    participants = [p for p in row['INPUT'].split(', ') if '::' in p]
+                    participants = [p for p in row.input.split(', ') if '::' in p]
                     if len(participants) > 1:
                         controller, output = [p[1] for p in list(decompose_complex([row.INPUT]))]
                         if controller != output:
                             input = controller
-                            freq = row['SEEN']
-                            doc = resolve_document(row['SEEN IN'], xdd_bib, doi2pmcid)
-                            trigger = row['TRIGGERS']
-                            evidence = row['EVIDENCE'].split(' ++++ ')
-
-                            if 'JOURNAL' in row:
-                                journal = row['JOURNAL']
-                            else:
-                                journal = None
+                            freq = row.seen
+                            doc = paper
+                            trigger = row.triggers
+                            evidence = row.evidence.split(' ++++ ')
 
-                            source = journal if journal else row['SEEN IN'].strip()
-                            impact_factor = index_factors.get_impact(source)
+                            journal = row.journal
 
-                            key = EdgeKey(controller, input, output, trigger, label)
+                            key = EdgeKey(intern_str(controller), intern_str(input), intern_str(output), trigger,
+                                          label)
                             seen_in[key].add(doc)  # This is the PMCID or paper id where the edge has been seen
                             counts[key] += int(freq)  # This comes as string, cast it to an int
-                            link = row['LINK']
+                            link = row.link
 
                             evidences[key] |= {(link, impact_factor, e) for e in evidence}
                             journals[key].add(journal)
@@ -416,82 +787,418 @@ def main(output_file:Path,
             except Exception as ex:
                 pass  # TODO log exceptions
 
+    return EdgeAggregates(edges, counts, evidences, seen_in, journals, impact_factors)
 
-    # Create the nx graph
-    G = nx.MultiDiGraph()
 
-    for key in tqdm(edges, desc="Making graph"):
-        try:
-            if key.controller not in G.nodes:
-                G.add_nodes_from([(key.controller, {'label': top_descriptions[key.controller]})])
-            if key.input not in G.nodes:
-                G.add_nodes_from([(key.input, {'label': top_descriptions[key.input]})])
-            if key.output not in G.nodes:
-                G.add_nodes_from([(key.output, {'label': top_descriptions[key.output]})])
-
-            if type(key.trigger) == str:
-                trigger = key.trigger
+def merge_row_scans(into: RowScan, other: RowScan) -> RowScan:
+    """ Folds the results of a pass over some rows into the results of the pass over the preceding rows """
+    into.dataset_inputs.update(other.dataset_inputs)
+    into.dataset_outputs.update(other.dataset_outputs)
+    for paper, extractions in other.significance_extractions.items():
+        into.significance_extractions[paper].extend(extractions)
+    for gid, descriptions in other.all_descriptions.items():
+        into.all_descriptions[gid].update(descriptions)
+    return into
+
+
+def merge_edge_aggregates(into: EdgeAggregates, other: EdgeAggregates) -> EdgeAggregates:
+    """ Folds the edge aggregates of some rows into the aggregates of the preceding rows """
+    into.edges.update(other.edges)
+    into.counts.update(other.counts)
+    for key in other.edges:
+        into.evidences[key] |= other.evidences[key]
+        into.seen_in[key] |= other.seen_in[key]
+        into.journals[key] |= other.journals[key]
+        into.impact_factors[key].extend(other.impact_factors[key])
+    return into
+
+
+def empty_row_scan() -> RowScan:
+    return RowScan(dict(), dict(), defaultdict(list), defaultdict(Counter))
+
+
+def empty_edge_aggregates() -> EdgeAggregates:
+    return EdgeAggregates(set(), Counter(), defaultdict(set), defaultdict(set), defaultdict(set), defaultdict(list))
+
+
+class IncrementalBuildCache:
+    """
+    Keeps, in a directory, the manifest of the arizona files seen by previous builds, the parse and contribution of
+    each file and the folded edge aggregates of all of them. The cached state is only valid for the same auxiliary
+    inputs (bibliography, PMC ids, uniprot and impact factors), described by their signatures
+    """
+
+    def __init__(self, cache_dir: Path, signatures: Mapping[str, Optional[dict]]) -> None:
+        self._dir = cache_dir
+        self._signatures = dict(signatures)
+        (cache_dir / 'files').mkdir(parents=True, exist_ok=True)
+
+        manifest_path = cache_dir / 'manifest.json'
+        manifest = None
+        if manifest_path.exists():
+            with manifest_path.open() as f:
+                manifest = json.load(f)
+
+        if manifest and manifest['signatures'] == self._signatures:
+            self.files = manifest['files']
+            # Files folded into the aggregates, in their order
+            self.paths: Optional[List[str]] = manifest['paths']
+        else:
+            # Anything cached was computed with different auxiliary inputs
+            self.files = dict()
+            self.paths = None
+            (cache_dir / 'aggregates.pickle').unlink(missing_ok=True)
+
+    def _file_cache_path(self, p: str) -> Path:
+        return self._dir / 'files' / (hashlib.md5(p.encode()).hexdigest() + '.pickle')
+
+    def is_unchanged(self, p: str) -> bool:
+        """ Compares the file against its manifest entry. The hash is only computed if the size or mtime differ """
+        entry = self.files.get(p)
+        if entry is None:
+            return False
+        signature = file_signature(p)
+        if signature['size'] != entry['size']:
+            return False
+        if signature['mtime'] != entry['mtime']:
+            if md5_hash(p) != entry['md5']:
+                return False
+            entry['mtime'] = signature['mtime']  # Touched, but with the same contents
+        return True
+
+    def papers(self, p: str) -> Set[str]:
+        return set(self.files[p]['papers']) if p in self.files else set()
+
+    def save_rows(self, p: str, rows: List[ArizonaRow]) -> None:
+        self.files[p] = {**file_signature(p), 'md5': md5_hash(p), 'papers': sorted({r.seen_in for r in rows})}
+        with self._file_cache_path(p).open('wb') as f:
+            pickle.dump({'rows': [tuple(r) for r in rows]}, f)
+
+    def load_rows(self, p: str) -> List[ArizonaRow]:
+        with self._file_cache_path(p).open('rb') as f:
+            return [ArizonaRow._make(r) for r in pickle.load(f)['rows']]
+
+    def save_contribution(self, p: str, scan: RowScan, aggregates: EdgeAggregates) -> None:
+        with self._file_cache_path(p).open('rb') as f:
+            data = pickle.load(f)
+        data['scan'] = tuple(scan)
+        data['aggregates'] = _aggregates_to_state(aggregates)
+        with self._file_cache_path(p).open('wb') as f:
+            pickle.dump(data, f)
+
+    def load_contribution(self, p: str) -> Tuple[RowScan, EdgeAggregates]:
+        with self._file_cache_path(p).open('rb') as f:
+            data = pickle.load(f)
+        return RowScan._make(data['scan']), _aggregates_from_state(data['aggregates'])
+
+    def forget(self, p: str) -> None:
+        del self.files[p]
+        self._file_cache_path(p).unlink(missing_ok=True)
+
+    def load_aggregates(self) -> Optional[Tuple[RowScan, EdgeAggregates]]:
+        path = self._dir / 'aggregates.pickle'
+        if not path.exists():
+            return None
+        with path.open('rb') as f:
+            data = pickle.load(f)
+        return RowScan._make(data['scan']), _aggregates_from_state(data['aggregates'])
+
+    def save(self, paths: List[str], scan: RowScan, aggregates: EdgeAggregates) -> None:
+        """ Stores the aggregates folded from the files in paths and then the manifest, which makes them valid """
+        with (self._dir / 'aggregates.pickle').open('wb') as f:
+            pickle.dump({'scan': tuple(scan), 'aggregates': _aggregates_to_state(aggregates)}, f)
+        self.paths = list(paths)
+        with (self._dir / 'manifest.json').open('w') as f:
+            json.dump({'signatures': self._signatures, 'paths': self.paths, 'files': self.files}, f)
+
+
+def _aggregates_to_state(aggregates: EdgeAggregates) -> dict:
+    """ Plain representation of the aggregates, so the pickles don't depend on the module's name """
+    return {tuple(key): (aggregates.counts[key], aggregates.evidences[key], aggregates.seen_in[key],
+                         aggregates.journals[key], aggregates.impact_factors[key]) for key in aggregates.edges}
+
+
+def _aggregates_from_state(state: dict) -> EdgeAggregates:
+    aggregates = empty_edge_aggregates()
+    for key, (count, evidence, seen_in, journals, impact_factors) in state.items():
+        key = EdgeKey._make(key)
+        aggregates.edges.add(key)
+        aggregates.counts[key] = count
+        aggregates.evidences[key] = evidence
+        aggregates.seen_in[key] = seen_in
+        aggregates.journals[key] = journals
+        aggregates.impact_factors[key] = impact_factors
+    return aggregates
+
+
+def incremental_build(paths: List[str], cache: IncrementalBuildCache, bibliography, doi2pmcid, uniprot_names,
+                      index_factors, workers: int = 1) -> Tuple[RowScan, EdgeAggregates]:
+    """
+    Parses only the new or changed files and folds their contributions into the aggregates of the previous build.
+    Events are resolved within the paper they are seen in, so the contribution of the files that share a paper
+    with a changed file is recomputed as well
+    """
+    changed = [p for p in paths if not cache.is_unchanged(p)]
+    current = set(paths)
+    removed = [p for p in cache.files if p not in current]
+    new_files = not any(p in cache.files for p in changed)
+
+    # Papers whose event resolution may be different now
+    dirty_papers = set()
+    for p in it.chain(changed, removed):
+        dirty_papers |= cache.papers(p)
+    for p in removed:
+        cache.forget(p)
+
+    for p, rows in iter_parsed_files(tqdm(changed, desc='Parsing changed files'), bibliography, workers):
+        cache.save_rows(p, rows)
+        dirty_papers |= {r.seen_in for r in rows}
+
+    changed_set = set(changed)
+    to_update = [p for p in paths if p in changed_set or cache.papers(p) & dirty_papers]
+    to_update_set = set(to_update)
+
+    # The resolution caches of the papers of the updated files, folded in the same order as a full build
+    update_papers = set(it.chain.from_iterable(cache.papers(p) for p in to_update))
+    scans = dict()
+    resolution = empty_row_scan()
+    for p in tqdm(paths, desc='Collecting event resolution caches'):
+        if p in to_update_set or cache.papers(p) & update_papers:
+            if p in changed_set:
+                scan = scans[p] = scan_rows(cache.load_rows(p), bibliography, doi2pmcid, uniprot_names)
+            elif p in to_update_set:
+                scan = scans[p] = cache.load_contribution(p)[0]
             else:
-                trigger = key.label
-
-            evidence = evidences[key]
-            kept_evidence = list()
-            seen = set()
-            for link, significance, markup in evidence:
-                stripper = TagStripper(markup)
-                raw_sent = stripper.raw_sentence
-                if raw_sent not in seen:
-                    kept_evidence.append((link, significance, markup))
-                    seen.add(raw_sent)
-
-            metadata = {
-                "input": key.output,
-                "trigger": trigger,
-                "freq": len(kept_evidence),
-                "evidence": kept_evidence,
-                "seen_in": seen_in[key],
-                "label": key.label,
-                "journals": journals[key],
-                "impact_factors": impact_factors[key]
-            }
-
-            # Ignore problematic entities
-            if key.controller in black_listed_entities or key.output in black_listed_entities:
-                continue
-
-            G.add_edge(key.controller, key.output, **metadata)
-        except Exception as ex:
-            print(key)
-            print(ex)
+                scan, _ = cache.load_contribution(p)
+            resolution.dataset_inputs.update(scan.dataset_inputs)
+            resolution.dataset_outputs.update(scan.dataset_outputs)
+
+    events = EventResolutionTable(resolution.dataset_inputs, resolution.dataset_outputs)
+    for p in tqdm(to_update, desc='Updating file contributions'):
+        aggregates = build_edges(cache.load_rows(p), events, bibliography, doi2pmcid, index_factors)
+        cache.save_contribution(p, scans[p], aggregates)
+
+    # Folding the contributions in any other order than the paths' changes the ties of the most common descriptions
+    # and the order of the impact factors and significance lists, so the previous aggregates are only extended when
+    # the new files come after all the previous ones
+    appended = cache.paths is not None and paths[:len(paths) - len(changed)] == cache.paths
+    previous = cache.load_aggregates() if appended else None
+    if previous is not None and not removed and new_files and to_update_set == changed_set:
+        # Only files with new papers were appended, fold them into the existing aggregates in order
+        scan, aggregates = previous
+        for p in to_update:
+            file_scan, file_aggregates = cache.load_contribution(p)
+            merge_row_scans(scan, file_scan)
+            merge_edge_aggregates(aggregates, file_aggregates)
+    else:
+        scan, aggregates = empty_row_scan(), empty_edge_aggregates()
+        for p in tqdm(paths, desc='Folding file contributions'):
+            file_scan, file_aggregates = cache.load_contribution(p)
+            merge_row_scans(scan, file_scan)
+            merge_edge_aggregates(aggregates, file_aggregates)
+
+    # The folded resolution caches are not needed by the following builds
+    scan = scan._replace(dataset_inputs=dict(), dataset_outputs=dict())
+    cache.save(paths, scan, aggregates)
+
+    return scan, aggregates
+
+
+@plac.pos('output_file', 'Graph output file', type=Path)
+@plac.opt('index_factors_path', 'Pickle file that contains impact factors', type=Path)
+@plac.opt('bibliography_path', 'Json file with the bibliography generated by xDD', type=Path)
+@plac.opt('uniprot_path', 'Uniprot fasta file, for the participant descriptions', type=Path)
+@plac.opt('uniprot_index_path', 'SQLite index of the uniprot descriptions. Built if missing or stale. '
+                               'Defaults to the fasta file path plus .sqlite', type=Path, abbrev='U')
+@plac.opt('pmcid_map_path', 'PMCID to DOI and others file', type=Path)
+@plac.opt('pmcid_index_path', 'SQLite index of the DOI to PMCID map. Built if missing or stale. '
+                              'Defaults to the PMCID file path plus .sqlite', type=Path, abbrev='P')
+@plac.opt('workers', 'Number of processes used to parse the arizona files', type=int)
+@plac.flg('streaming', 'Read the arizona files on each pass instead of holding all the rows in memory')
+@plac.opt('cache_dir', 'Directory with the state of previous builds. Only new or changed files will be processed',
+          type=Path)
+@plac.opt('columnar_dir', 'Directory to also write the graph as a memory-mappable columnar artifact', type=Path,
+          abbrev='C')
+@plac.opt('profile_path', 'Json file for the per-stage timing and memory report. '
+                          'Defaults to the output file path with the .profile.json suffix', type=Path, abbrev='R')
+@plac.flg('trace_memory', 'Also trace the python allocations of each stage in the report. Slows down the build')
+@plac.pos('input_files_dirs', 'Arizona files directory', type=Path)
+def main(output_file:Path,
+         index_factors_path: Optional[Path],
+         bibliography_path: Optional[Path],
+         uniprot_path=Path('../data/uniprot_sprot.fasta'),
+         uniprot_index_path: Optional[Path] = None,
+         pmcid_map_path=Path('../data/PMC-ids.csv'),
+         pmcid_index_path: Optional[Path] = None,
+         workers: int = 1,
+         streaming: bool = False,
+         cache_dir: Optional[Path] = None,
+         columnar_dir: Optional[Path] = None,
+         profile_path: Optional[Path] = None,
+         trace_memory: bool = False,
+         *input_files_dirs
+         ):
+    """
+    Reads
+    """
+
+    profile = BuildProfile(trace_memory)
+
+    # Index of uniprot for the top_descriptions
+    with profile.stage('uniprot index'):
+        uniprot_names = UniprotIndex(uniprot_path, uniprot_index_path)
+    paths = it.chain.from_iterable(glob.glob(os.path.join(input_dir, "*.tsv")) for input_dir in input_files_dirs)
+
+    index_factors = None
+    # Load the index factors if they are specified
+    if index_factors_path:
+        with profile.stage('impact factors'):
+            index_factors = ImpactFactors(index_factors_path)
+
+    xdd_bib = None
+    if bibliography_path:
+        with profile.stage('bibliography') as counts:
+            xdd_bib = parse_xdd_blibliography(bibliography_path)
+            counts['entries'] = len(xdd_bib)
+
+    # Resolve the PMCIDs of the DOIs of the bibliography
+    with profile.stage('pmcid index') as counts:
+        dois = {metadata.doi for metadata in xdd_bib.values() if metadata.doi} if xdd_bib else set()
+        with PmcidIndex(pmcid_map_path, pmcid_index_path) as pmcid_index:
+            doi2pmcid = pmcid_index.lookup_many(dois)
+        counts.update(dois=len(dois), resolved=len(doi2pmcid))
+
+    if cache_dir:
+        with profile.stage('incremental build') as counts:
+            signatures = {name: file_signature(path) for name, path in (('index_factors', index_factors_path),
+                                                                        ('bibliography', bibliography_path),
+                                                                        ('uniprot', uniprot_path),
+                                                                        ('pmcid_map', pmcid_map_path))}
+            cache = IncrementalBuildCache(cache_dir, signatures)
+            paths = list(paths)
+            scan, aggregates = incremental_build(paths, cache, xdd_bib, doi2pmcid, uniprot_names, index_factors,
+                                                 workers)
+            counts.update(files=len(paths), edges=len(aggregates.edges))
+    elif streaming:
+        # Don't keep the rows around. Read the files once for each pass over the rows
+        paths = list(paths)
+        rows = RowStream(lambda: iter_rows(tqdm(paths, desc='Parsing files'), xdd_bib, workers))
+    else:
+        # Generate a data frame from the arizona output files
+        with profile.stage('parsing') as counts:
+            paths = list(paths)
+            rows = list(iter_rows(tqdm(paths, desc='Parsing files'), xdd_bib, workers))
+            counts.update(files=len(paths), rows=len(rows))
+
+    if not cache_dir:
+        # When streaming, these stages also include the parsing of the files
+        with profile.stage('scanning rows') as counts:
+            scan = scan_rows(rows, xdd_bib, doi2pmcid, uniprot_names)
+            if not streaming:
+                counts['rows'] = len(rows)
+            counts.update(events=len(scan.dataset_inputs), entities=len(scan.all_descriptions),
+                          papers_with_significance=len(scan.significance_extractions))
+        with profile.stage('building edges') as counts:
+            events = EventResolutionTable(scan.dataset_inputs, scan.dataset_outputs)
+            aggregates = build_edges(rows, events, xdd_bib, doi2pmcid, index_factors)
+            counts['edges'] = len(aggregates.edges)
+
+    # The descriptions of all the entities were looked up while scanning the rows
+    uniprot_names.close()
+
+    significance_extractions, all_descriptions = scan.significance_extractions, scan.all_descriptions
+
+    # Choose the  most frequent description for each entity
+    with profile.stage('descriptions') as counts:
+        top_descriptions = {k: v.most_common()[0][0] for k, v in
+                            tqdm(all_descriptions.items(), desc='Choosing the most frequent description')}
+        counts['entities'] = len(top_descriptions)
+
+    edges, counts, evidences, seen_in, journals, impact_factors = aggregates
+
+    with profile.stage('graph assembly') as stage_counts:
+        # Compact integer ids for the entities, the documents and the journals. Edges keep arrays of ids and the output
+        # includes the lookup tables. Ids are given in sorted order to keep the output stable across builds
+        entities = Interner(sorted(top_descriptions))
+        documents = Interner(sorted(set(it.chain(significance_extractions, it.chain.from_iterable(seen_in.values())))))
+        journal_names = Interner(sorted(set(it.chain.from_iterable(journals.values())),
+                                        key=lambda j: (j is not None, j)))
+
+        # Create the nx graph
+        G = nx.MultiDiGraph()
+        edge_order = list()  # Order in which the edges are added, for the columnar artifact
+
+        for key in tqdm(edges, desc="Making graph"):
+            try:
+                if key.controller not in G.nodes:
+                    G.add_nodes_from([(key.controller, {'label': top_descriptions[key.controller]})])
+                if key.input not in G.nodes:
+                    G.add_nodes_from([(key.input, {'label': top_descriptions[key.input]})])
+                if key.output not in G.nodes:
+                    G.add_nodes_from([(key.output, {'label': top_descriptions[key.output]})])
+
+                if type(key.trigger) == str:
+                    trigger = key.trigger
+                else:
+                    trigger = key.label
+
+                # Sorted, so the kept evidence doesn't depend on the iteration order of the set
+                evidence = sorted(evidences[key])
+                raw_sents = strip_markups((markup for _, _, markup in evidence), normalize_spaces=True)
+                kept_evidence = list()
+                seen = set()
+                for (link, significance, markup), raw_sent in zip(evidence, raw_sents):
+                    if raw_sent not in seen:
+                        kept_evidence.append((link, significance, markup))
+                        seen.add(raw_sent)
+
+                metadata = {
+                    "input": entities.id_of(key.output),
+                    "trigger": trigger,
+                    "freq": len(kept_evidence),
+                    "evidence": kept_evidence,
+                    "seen_in": documents.ids_of(seen_in[key]),
+                    "label": key.label,
+                    "journals": journal_names.ids_of(journals[key]),
+                    "impact_factors": array('d', impact_factors[key])
+                }
+
+                # Ignore problematic entities
+                if key.controller in black_listed_entities or key.output in black_listed_entities:
+                    continue
+
+                edge_order.append((key.controller, key.output, G.add_edge(key.controller, key.output, **metadata)))
+            except Exception as ex:
+                print(key)
+                print(ex)
+        stage_counts.update(nodes=G.number_of_nodes(), edges=G.number_of_edges())
 
     output = {
         'graph': G,
-        'significance': dict(**significance_extractions),
-        'synonyms':{k:list(v.keys()) for k, v in all_descriptions.items()}
+        'significance': {documents.id_of(paper): rows for paper, rows in significance_extractions.items()},
+        'synonyms':{k:list(v.keys()) for k, v in all_descriptions.items()},
+        # Lookup tables of the ids
+        'entities': entities.values,
+        'documents': documents.values,
+        'journals': journal_names.values,
     }
     # Save the graph into a file
     logging.info(f"Saving output to {output_file}")
-    with output_file.open('wb') as f:
-        pickle.dump(output, f)
+    with profile.stage('pickling') as stage_counts:
+        with output_file.open('wb') as f:
+            pickle.dump(output, f)
+        stage_counts['bytes'] = output_file.stat().st_size
+    if columnar_dir:
+        logging.info(f"Saving columnar artifact to {columnar_dir}")
+        with profile.stage('columnar artifact'):
+            write_columnar(columnar_dir, output, edge_order)
+
+    profile_path = profile_path or default_report_path(output_file)
+    logging.info(f"Saving build profile to {profile_path}")
+    profile.save(profile_path, output_file=output_file, input_files_dirs=list(input_files_dirs), workers=workers,
+                 streaming=streaming, incremental=cache_dir is not None)
     logging.info("Done")
 
 
-class TagStripper(HTMLParser):
-    """ Use this class to strip markup and get the attributes of the tags as properties of the instance """
-    def __init__(self, data:str):
-        super().__init__()
-        self._raw_sentence = StringIO()
-        self._data = data
-        self.feed(data)
-        self.space_remover = re.compile(r'\s+')
-
-    def handle_data(self, data: str) -> None:
-        self._raw_sentence.write(data)
-
-    @property
-    def raw_sentence(self) -> str:
-        return self.space_remover.sub(' ', self._raw_sentence.getvalue().strip())
-
-
 if __name__ == "__main__":
     plac.call(main)
@@ -0,0 +1,100 @@
+""" Per-stage timing and memory report of the network builds """
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Not available on windows
+    resource = None
+
+REPORT_VERSION = 1
+
+
+def peak_rss_mb() -> Optional[float]:
+    """ Peak resident set size of this process so far, in megabytes """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / (1 << 10)
+
+
+def cpu_seconds() -> Dict[str, float]:
+    """ CPU time of this process and of its finished children, like the parsing workers """
+    times = os.times()
+    return {'self': times.user + times.system, 'children': times.children_user + times.children_system}
+
+
+class BuildProfile:
+    """ Collects the wall time, CPU time, memory and counts of each stage of a build """
+
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.stages: List[dict] = list()
+        self.started = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: str):
+        """ Measures the enclosed block. Yields a dictionary for the counts of the stage, i.e. rows or edges """
+        counts = dict()
+        rss_before = peak_rss_mb()
+        cpu_before = cpu_seconds()
+        if self.trace_memory:
+            traced_before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield counts
+        finally:
+            wall = time.perf_counter() - start
+            cpu_after = cpu_seconds()
+            rss_after = peak_rss_mb()
+            record = {
+                'name': name,
+                'wall_seconds': round(wall, 6),
+                'cpu_seconds': round(cpu_after['self'] - cpu_before['self'], 6),
+                'children_cpu_seconds': round(cpu_after['children'] - cpu_before['children'], 6),
+                'peak_rss_mb': rss_after,
+                'peak_rss_delta_mb': None if rss_after is None else rss_after - rss_before,
+            }
+            if self.trace_memory:
+                traced_after, traced_peak = tracemalloc.get_traced_memory()
+                record['traced_delta_mb'] = (traced_after - traced_before) / (1 << 20)
+                record['traced_peak_delta_mb'] = (traced_peak - traced_before) / (1 << 20)
+            record['counts'] = counts
+            self.stages.append(record)
+            logging.info(f"{name}: {wall:.2f}s {counts if counts else ''}")
+
+    def report(self, **info) -> dict:
+        """ The report as a dictionary. The keyword arguments are stored as build information """
+        return {
+            'version': REPORT_VERSION,
+            'started': self.started.isoformat(),
+            'wall_seconds': round(time.perf_counter() - self._start, 6),
+            'peak_rss_mb': peak_rss_mb(),
+            'python': sys.version.split()[0],
+            'build': info,
+            'stages': self.stages,
+        }
+
+    def save(self, path: Path, **info):
+        """ Writes the report as json """
+        with Path(path).open('w') as f:
+            json.dump(self.report(**info), f, indent=2, default=str)  # default=str for the paths
+
+
+def default_report_path(output_file: Path) -> Path:
+    """ The report goes next to the output graph, i.e. graph.pickle -> graph.profile.json """
+    output_file = Path(output_file)
+    return output_file.with_name(output_file.stem + '.profile.json')
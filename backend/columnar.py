@@ -0,0 +1,543 @@
+""" Memory-mappable columnar storage of the graph built by build_network """
+import hashlib
+import heapq
+import itertools as it
+import json
+import logging
+import pickle
+from array import array
+from pathlib import Path
+from typing import List, Mapping, NamedTuple, Optional, Sequence, Tuple, Iterable, Dict, Any
+
+import networkx as nx
+import numpy as np
+import plac
+
+from backend.network import SignificanceRow
+
+FORMAT_NAME = "frailty-graph-columnar"
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+logger = logging.getLogger("frailty-viz-columnar")
+
+
+class StringColumn:
+    """ Sequence of strings stored as the concatenation of their utf-8 bytes and the offsets of each one """
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray) -> None:
+        self._offsets = offsets
+        self._data = data
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, ix: int) -> str:
+        return self._data[self._offsets[ix]:self._offsets[ix + 1]].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        return iter(self.slice(0, len(self)))
+
+    def slice(self, start: int, end: int) -> List[str]:
+        """ Decodes the strings in [start, end) in bulk """
+        offsets = self._offsets[start:end + 1].tolist()
+        base = offsets[0]
+        data = self._data[base:offsets[-1]].tobytes()
+        return [data[a - base:b - base].decode('utf-8') for a, b in zip(offsets, offsets[1:])]
+
+    @staticmethod
+    def encode(strings: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """ Returns the offsets and the data arrays of the strings """
+        encoded = [s.encode('utf-8') for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return offsets, data
+
+
+class Ragged:
+    """ Variable length rows stored as a flat array of values and the offsets of each row """
+
+    def __init__(self, offsets: np.ndarray, values) -> None:
+        self.offsets = offsets
+        self.values = values
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, ix: int):
+        return self.values[self.offsets[ix]:self.offsets[ix + 1]]
+
+    @staticmethod
+    def offsets_of(lengths: Sequence[int]) -> np.ndarray:
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return offsets
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Sequence], dtype) -> 'Ragged':
+        values = np.fromiter((v for row in rows for v in row), dtype=dtype)
+        return cls(cls.offsets_of([len(row) for row in rows]), values)
+
+    def take(self, rows: np.ndarray) -> 'Ragged':
+        """ The rows at the positions, in their order, copied into new arrays """
+        starts = self.offsets[rows]
+        lengths = self.offsets[rows + 1] - starts
+        offsets = self.offsets_of(lengths)
+        # Position in the values of each value of the rows
+        positions = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return Ragged(offsets, self.values[positions])
+
+
+class _ColumnWriter:
+    """ Saves the columns as .npy files and keeps track of them, and of the hash of their contents, for the manifest """
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        self.columns: Dict[str, Dict[str, Any]] = dict()
+        self.md5 = hashlib.md5()
+        path.mkdir(parents=True, exist_ok=True)
+
+    def array(self, name: str, values, dtype) -> None:
+        values = np.ascontiguousarray(values, dtype=dtype)
+        np.save(self._path / f"{name}.npy", values, allow_pickle=False)
+        self.columns[name] = {"dtype": values.dtype.str, "shape": list(values.shape)}
+        self.md5.update(json.dumps([name, self.columns[name]]).encode())
+        self.md5.update(memoryview(values).cast('B'))
+
+    def strings(self, name: str, strings: Iterable[str]) -> None:
+        offsets, data = StringColumn.encode(strings)
+        self.array(f"{name}.offsets", offsets, np.int64)
+        self.array(f"{name}.data", data, np.uint8)
+
+    def ragged(self, name: str, rows: Sequence[Sequence], dtype) -> None:
+        self.array(f"{name}.offsets", Ragged.offsets_of([len(r) for r in rows]), np.int64)
+        self.array(f"{name}.values", list(it.chain.from_iterable(rows)), dtype)
+
+
+def _codes(values: Iterable[str]) -> Tuple[List[str], List[int]]:
+    """ Dictionary encoding of repetitive string values """
+    table, ids, codes = list(), dict(), list()
+    for value in values:
+        code = ids.get(value)
+        if code is None:
+            code = ids[value] = len(table)
+            table.append(value)
+        codes.append(code)
+    return table, codes
+
+
+def _insertion_order(graph: nx.MultiDiGraph) -> List[Tuple[Any, Any, int, Dict[str, Any]]]:
+    """
+    The edges in an order they could have been added to the graph in: the successors and the predecessors of each
+    node come in the order of the graph, which the iteration over its edges only keeps for the successors.
+    The earliest edges of the iteration come first, so it's the same order when it's already one
+    """
+    pairs = [(u, v) for u, nbrs in graph.adjacency() for v in nbrs]
+    rank = {pair: ix for ix, pair in enumerate(pairs)}
+    # The next pair of each pair in the successors and in the predecessors of its nodes
+    next_pairs = {pair: [] for pair in pairs}
+    for node in graph:
+        for adjacency in ([(node, v) for v in graph.succ[node]], [(u, node) for u in graph.pred[node]]):
+            for previous, pair in zip(adjacency, adjacency[1:]):
+                next_pairs[previous].append(pair)
+    waiting = dict.fromkeys(pairs, 0)
+    for pair in pairs:
+        for next_pair in next_pairs[pair]:
+            waiting[next_pair] += 1
+
+    ready = [rank[pair] for pair in pairs if waiting[pair] == 0]
+    heapq.heapify(ready)
+    edges = list()
+    while ready:
+        u, v = pairs[heapq.heappop(ready)]
+        edges.extend((u, v, k, d) for k, d in graph[u][v].items())
+        for next_pair in next_pairs[(u, v)]:
+            waiting[next_pair] -= 1
+            if waiting[next_pair] == 0:
+                heapq.heappush(ready, rank[next_pair])
+    return edges
+
+
+class GraphColumns(NamedTuple):
+    """
+    The nodes and the edges of the graph built by build_network as columns, the edges in the order they were added to
+    the graph. Nodes are referred to by their position
+    """
+    node_ids: List[str]
+    node_labels: List[Optional[str]]
+    edge_src: np.ndarray
+    edge_dst: np.ndarray
+    edge_key: np.ndarray
+    edge_input: np.ndarray
+    edge_freq: np.ndarray
+    edge_trigger_table: List[str]
+    edge_trigger: np.ndarray
+    edge_label_table: List[str]
+    edge_label: np.ndarray
+    edge_seen_in: Ragged
+    edge_journals: Ragged
+    edge_impact_factors: Ragged
+    # The evidence sentences of each edge
+    evidence_offsets: np.ndarray
+    evidence_link_table: List[str]
+    evidence_link: np.ndarray
+    evidence_impact: np.ndarray
+    evidence_markup: StringColumn
+
+    @classmethod
+    def from_networkx(cls, graph: nx.MultiDiGraph) -> 'GraphColumns':
+        """ The columns of the networkx graph of the pickle """
+        if not has_interned_ids(graph):
+            raise Exception("The graph has the names of the entities, documents and journals in its edges, from "
+                            "before the id lookup tables. Read it with read_graph_data, or rebuild it with "
+                            "build_network.py")
+        node_ids = list(graph.nodes)
+        node_index = {n: ix for ix, n in enumerate(node_ids)}
+        edges = _insertion_order(graph)
+        trigger_table, trigger_codes = _codes(d['trigger'] for _, _, _, d in edges)
+        label_table, label_codes = _codes(d['label'] for _, _, _, d in edges)
+        evidence = [d.get('evidence', ()) for _, _, _, d in edges]
+        flat_evidence = list(it.chain.from_iterable(evidence))
+        link_table, link_codes = _codes(link for link, _, _ in flat_evidence)
+        return cls(
+            node_ids=node_ids,
+            node_labels=[graph.nodes[n].get('label') for n in node_ids],
+            edge_src=np.array([node_index[u] for u, _, _, _ in edges], dtype=np.int32),
+            edge_dst=np.array([node_index[v] for _, v, _, _ in edges], dtype=np.int32),
+            edge_key=np.array([k for _, _, k, _ in edges], dtype=np.int32),
+            edge_input=np.array([d['input'] for _, _, _, d in edges], dtype=np.int32),
+            edge_freq=np.array([d['freq'] for _, _, _, d in edges], dtype=np.int64),
+            edge_trigger_table=trigger_table,
+            edge_trigger=np.array(trigger_codes, dtype=np.int32),
+            edge_label_table=label_table,
+            edge_label=np.array(label_codes, dtype=np.int32),
+            edge_seen_in=Ragged.from_rows([d['seen_in'] for _, _, _, d in edges], np.uint32),
+            edge_journals=Ragged.from_rows([d['journals'] for _, _, _, d in edges], np.uint32),
+            edge_impact_factors=Ragged.from_rows([d['impact_factors'] for _, _, _, d in edges], np.float64),
+            evidence_offsets=Ragged.offsets_of([len(e) for e in evidence]),
+            evidence_link_table=link_table,
+            evidence_link=np.array(link_codes, dtype=np.int32),
+            evidence_impact=np.array([impact for _, impact, _ in flat_evidence], dtype=np.float64),
+            evidence_markup=StringColumn(*StringColumn.encode(markup for _, _, markup in flat_evidence)),
+        )
+
+
+def has_interned_ids(graph: nx.MultiDiGraph) -> bool:
+    """ False for the graphs built before the id lookup tables, with the names of the entities in their edges """
+    for _, _, data in graph.edges(data=True):
+        return not isinstance(data['input'], str)
+    return True
+
+
+def intern_ids(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The output of build_network from before the id lookup tables, with the entity, document and journal names in
+    the edges and the significance by document name, with ids instead like build_network assigns them now.
+    The edges of the graph are updated in place
+    """
+    graph = data['graph']
+    edges = [d for _, _, d in graph.edges(data=True)]
+    entities = sorted(set(graph.nodes).union(d['input'] for d in edges))
+    documents = sorted(set(data['significance']).union(*(d['seen_in'] for d in edges)))
+    journals = sorted(set().union(*(d['journals'] for d in edges)), key=lambda j: (j is not None, j))
+    entity_ids, document_ids, journal_ids = ({value: ix for ix, value in enumerate(table)}
+                                             for table in (entities, documents, journals))
+    for d in edges:
+        d['input'] = entity_ids[d['input']]
+        d['seen_in'] = array('I', sorted(document_ids[doc] for doc in d['seen_in']))
+        d['journals'] = array('I', sorted(journal_ids[journal] for journal in d['journals']))
+        d['impact_factors'] = array('d', d['impact_factors'])
+    return {**data,
+            'significance': {document_ids[doc]: rows for doc, rows in data['significance'].items()},
+            'entities': entities,
+            'documents': documents,
+            'journals': journals}
+
+
+def write_columnar(path: Path, data: Mapping[str, Any], edge_order: Optional[Sequence[Tuple[str, str, int]]] = None):
+    """
+    Writes the output of build_network as a columnar artifact in the directory.
+    The edges are stored in the order they were added to the graph, if given, so the networkx view built from the
+    artifact iterates its nodes and edges in the same order as the original
+    """
+    graph: nx.MultiDiGraph = data['graph']
+    writer = _ColumnWriter(path)
+
+    # Nodes
+    node_ids = list(graph.nodes)
+    node_index = {n: ix for ix, n in enumerate(node_ids)}
+    writer.strings("node_ids", node_ids)
+    writer.array("node_has_label", ['label' in graph.nodes[n] for n in node_ids], np.bool_)
+    writer.strings("node_labels", (graph.nodes[n].get('label', '') for n in node_ids))
+
+    # Edges
+    if edge_order is None:
+        edge_order = list(graph.edges(keys=True))
+    edges = [(u, v, k, graph[u][v][k]) for u, v, k in edge_order]
+    writer.array("edge_src", [node_index[u] for u, _, _, _ in edges], np.int32)
+    writer.array("edge_dst", [node_index[v] for _, v, _, _ in edges], np.int32)
+    writer.array("edge_key", [k for _, _, k, _ in edges], np.int32)
+    writer.array("edge_input", [d['input'] for _, _, _, d in edges], np.int32)
+    writer.array("edge_freq", [d['freq'] for _, _, _, d in edges], np.int64)
+    for attr in ('trigger', 'label'):
+        table, codes = _codes(d[attr] for _, _, _, d in edges)
+        writer.strings(f"edge_{attr}_table", table)
+        writer.array(f"edge_{attr}", codes, np.int32)
+    writer.ragged("edge_seen_in", [d['seen_in'] for _, _, _, d in edges], np.uint32)
+    writer.ragged("edge_journals", [d['journals'] for _, _, _, d in edges], np.uint32)
+    writer.ragged("edge_impact_factors", [d['impact_factors'] for _, _, _, d in edges], np.float64)
+
+    # Evidence of the edges. The links repeat for all the evidence of the same paper
+    evidence = [d['evidence'] for _, _, _, d in edges]
+    writer.array("evidence.offsets", Ragged.offsets_of([len(e) for e in evidence]), np.int64)
+    flat_evidence = list(it.chain.from_iterable(evidence))
+    link_table, link_codes = _codes(link for link, _, _ in flat_evidence)
+    writer.strings("evidence_link_table", link_table)
+    writer.array("evidence_link", link_codes, np.int32)
+    writer.array("evidence_impact", [impact for _, impact, _ in flat_evidence], np.float64)
+    writer.strings("evidence_markup", (markup for _, _, markup in flat_evidence))
+
+    # Lookup tables of the ids
+    for table in ('entities', 'documents', 'journals'):
+        values = data[table]
+        writer.array(f"{table}_is_null", [v is None for v in values], np.bool_)
+        writer.strings(table, (v if v is not None else '' for v in values))
+
+    # Significance extractions of each document
+    significance = data['significance']
+    rows = [significance.get(doc, []) for doc in range(len(data['documents']))]
+    writer.array("significance.offsets", Ragged.offsets_of([len(r) for r in rows]), np.int64)
+    writer.strings("significance_type", (s.type_ for s in it.chain.from_iterable(rows)))
+    writer.strings("significance_value", (s.value for s in it.chain.from_iterable(rows)))
+
+    # Synonyms of the entities
+    synonyms = data['synonyms']
+    writer.strings("synonym_entities", synonyms.keys())
+    writer.array("synonyms.offsets", Ragged.offsets_of([len(v) for v in synonyms.values()]), np.int64)
+    writer.strings("synonym_values", it.chain.from_iterable(synonyms.values()))
+
+    manifest = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "num_nodes": len(node_ids),
+        "num_edges": len(edges),
+        "columns": writer.columns,
+        "md5": writer.md5.hexdigest(),
+    }
+    with (path / MANIFEST_FILE).open('w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def is_columnar(path: Path) -> bool:
+    return Path(path).is_dir() and (Path(path) / MANIFEST_FILE).exists()
+
+
+def content_hash(path: Path) -> Optional[str]:
+    """ MD5 of the columns of the artifact, from its manifest. None for the artifacts written without it """
+    with (Path(path) / MANIFEST_FILE).open() as f:
+        return json.load(f).get("md5")
+
+
+class ColumnarGraph:
+    """
+    Read-only view over a columnar artifact. The columns are memory mapped, so opening it is almost instant and the
+    pages are shared by all the processes that open the same artifact
+    """
+
+    def __init__(self, path: Path, mmap: bool = True) -> None:
+        path = Path(path)
+        with (path / MANIFEST_FILE).open() as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != FORMAT_NAME or self.manifest.get("version") != FORMAT_VERSION:
+            raise Exception(f"Unsupported graph artifact: {path}")
+
+        mmap_mode = 'r' if mmap else None
+        # Plain ndarray views of the memory maps, to skip the overhead of np.memmap on indexing
+        self._columns = {name: np.load(path / f"{name}.npy", mmap_mode=mmap_mode, allow_pickle=False).view(np.ndarray)
+                         for name in self.manifest['columns']}
+
+        self.num_nodes: int = self.manifest['num_nodes']
+        self.num_edges: int = self.manifest['num_edges']
+
+        self.node_ids = self._strings("node_ids")
+        self.node_labels = self._strings("node_labels")
+        self.node_has_label = self._columns["node_has_label"]
+
+        self.edge_src = self._columns["edge_src"]
+        self.edge_dst = self._columns["edge_dst"]
+        self.edge_key = self._columns["edge_key"]
+        self.edge_input = self._columns["edge_input"]
+        self.edge_freq = self._columns["edge_freq"]
+        self.edge_trigger = self._columns["edge_trigger"]
+        self.edge_trigger_table = self._strings("edge_trigger_table")
+        self.edge_label = self._columns["edge_label"]
+        self.edge_label_table = self._strings("edge_label_table")
+        self.edge_seen_in = self._ragged("edge_seen_in")
+        self.edge_journals = self._ragged("edge_journals")
+        self.edge_impact_factors = self._ragged("edge_impact_factors")
+
+        self.evidence_offsets = self._columns["evidence.offsets"]
+        self.evidence_link = self._columns["evidence_link"]
+        self.evidence_link_table = self._strings("evidence_link_table")
+        self.evidence_impact = self._columns["evidence_impact"]
+        self.evidence_markup = self._strings("evidence_markup")
+
+        self.entities = self._strings("entities")
+        self.documents = self._strings("documents")
+        self.journals = self._strings("journals")
+
+        self.significance_offsets = self._columns["significance.offsets"]
+        self.significance_type = self._strings("significance_type")
+        self.significance_value = self._strings("significance_value")
+
+        self.synonym_entities = self._strings("synonym_entities")
+        self.synonym_offsets = self._columns["synonyms.offsets"]
+        self.synonym_values = self._strings("synonym_values")
+
+        self._node_index: Optional[Dict[str, int]] = None
+
+    def _strings(self, name: str) -> StringColumn:
+        return StringColumn(self._columns[f"{name}.offsets"], self._columns[f"{name}.data"])
+
+    def _ragged(self, name: str) -> Ragged:
+        return Ragged(self._columns[f"{name}.offsets"], self._columns[f"{name}.values"])
+
+    def _table(self, name: str) -> List[Optional[str]]:
+        is_null = self._columns[f"{name}_is_null"]
+        return [None if null else value for value, null in zip(self._strings(name), is_null)]
+
+    @property
+    def node_index(self) -> Dict[str, int]:
+        """ Node id -> node position. Built the first time it is needed """
+        if self._node_index is None:
+            self._node_index = {n: ix for ix, n in enumerate(self.node_ids)}
+        return self._node_index
+
+    def node_label(self, ix: int) -> Optional[str]:
+        return self.node_labels[ix] if self.node_has_label[ix] else None
+
+    def evidence(self, edge: int) -> List[Tuple[str, float, str]]:
+        start, end = int(self.evidence_offsets[edge]), int(self.evidence_offsets[edge + 1])
+        links = [self.evidence_link_table[code] for code in self.evidence_link[start:end].tolist()]
+        return list(zip(links, self.evidence_impact[start:end].tolist(), self.evidence_markup.slice(start, end)))
+
+    def edge_data(self, edge: int, with_evidence: bool = True) -> Dict[str, Any]:
+        """ Attributes of the edge, as in the networkx graph of the pickle """
+        data = {
+            "input": int(self.edge_input[edge]),
+            "trigger": self.edge_trigger_table[self.edge_trigger[edge]],
+            "freq": int(self.edge_freq[edge]),
+            "seen_in": array('I', self.edge_seen_in[edge].tolist()),
+            "label": self.edge_label_table[self.edge_label[edge]],
+            "journals": array('I', self.edge_journals[edge].tolist()),
+            "impact_factors": array('d', self.edge_impact_factors[edge].tolist()),
+        }
+        if with_evidence:
+            data["evidence"] = self.evidence(edge)
+        return data
+
+    def significance(self) -> Dict[int, List[SignificanceRow]]:
+        offsets = self.significance_offsets
+        return {doc: [SignificanceRow(self.significance_type[ix], self.significance_value[ix])
+                      for ix in range(offsets[doc], offsets[doc + 1])]
+                for doc in range(len(offsets) - 1) if offsets[doc + 1] > offsets[doc]}
+
+    def synonyms(self) -> Dict[str, List[str]]:
+        offsets = self.synonym_offsets
+        return {entity: self.synonym_values.slice(int(offsets[ix]), int(offsets[ix + 1]))
+                for ix, entity in enumerate(self.synonym_entities)}
+
+    def columns(self) -> GraphColumns:
+        """ The columns of the graph, over the memory maps. Only the node ids and the tables are decoded """
+        return GraphColumns(
+            node_ids=list(self.node_ids),
+            node_labels=[label if has_label else None
+                         for label, has_label in zip(self.node_labels, self.node_has_label.tolist())],
+            edge_src=self.edge_src,
+            edge_dst=self.edge_dst,
+            edge_key=self.edge_key,
+            edge_input=self.edge_input,
+            edge_freq=self.edge_freq,
+            edge_trigger_table=list(self.edge_trigger_table),
+            edge_trigger=self.edge_trigger,
+            edge_label_table=list(self.edge_label_table),
+            edge_label=self.edge_label,
+            edge_seen_in=self.edge_seen_in,
+            edge_journals=self.edge_journals,
+            edge_impact_factors=self.edge_impact_factors,
+            evidence_offsets=self.evidence_offsets,
+            evidence_link_table=list(self.evidence_link_table),
+            evidence_link=self.evidence_link,
+            evidence_impact=self.evidence_impact,
+            evidence_markup=self.evidence_markup,
+        )
+
+    def to_networkx(self, with_evidence: bool = True) -> nx.MultiDiGraph:
+        """ Compatibility view: the networkx graph as stored in the pickle """
+        graph = nx.MultiDiGraph()
+        node_ids = list(self.node_ids)
+        graph.add_nodes_from((n, {'label': self.node_labels[ix]} if self.node_has_label[ix] else {})
+                             for ix, n in enumerate(node_ids))
+        src, dst, key = self.edge_src.tolist(), self.edge_dst.tolist(), self.edge_key.tolist()
+        graph.add_edges_from((node_ids[src[e]], node_ids[dst[e]], key[e], self.edge_data(e, with_evidence))
+                             for e in range(self.num_edges))
+        return graph
+
+    def to_graph_data(self) -> Dict[str, Any]:
+        """ Compatibility loader: the same dictionary as the pickle written by build_network """
+        return {
+            'graph': self.to_networkx(),
+            'significance': self.significance(),
+            'synonyms': self.synonyms(),
+            'entities': self._table('entities'),
+            'documents': self._table('documents'),
+            'journals': self._table('journals'),
+        }
+
+
+def read_graph_columns(path: Path) -> Dict[str, Any]:
+    """
+    Reads the output of build_network as served by the backend, either the pickle or the columnar artifact, with the
+    columns of the graph instead of the networkx graph. The columnar artifact is read without building the graph
+    """
+    if is_columnar(path):
+        graph = ColumnarGraph(path)
+        return {
+            'columns': graph.columns(),
+            'significance': graph.significance(),
+            'synonyms': graph.synonyms(),
+        }
+    data = read_graph_data(path)
+    return {
+        'columns': GraphColumns.from_networkx(data['graph']),
+        'significance': data['significance'],
+        'synonyms': data['synonyms'],
+    }
+
+
+def read_graph_data(path: Path) -> Dict[str, Any]:
+    """
+    Reads the output of build_network, either the pickle or the columnar artifact, as the dictionary of the pickle.
+    The compatibility loader for the code that works on the networkx graph
+    """
+    if is_columnar(path):
+        return ColumnarGraph(path).to_graph_data()
+    with open(path, 'rb') as f:
+        data = pickle.load(f)
+    if 'documents' not in data:
+        logger.warning(f"{path} was built before the id lookup tables, rebuild it with build_network.py to load "
+                       f"it faster")
+        data = intern_ids(data)
+    return data
+
+
+@plac.pos('graph_file', 'Graph pickle written by build_network', type=Path)
+@plac.pos('output_dir', 'Directory for the columnar artifact', type=Path)
+def main(graph_file: Path, output_dir: Path):
+    """ Converts a graph pickle into the columnar artifact """
+    write_columnar(output_dir, read_graph_data(graph_file))
+
+
+if __name__ == '__main__':
+    plac.call(main)
@@ -0,0 +1,290 @@
+""" Compact, read-only array representation of the knowledge graph served by the backend """
+import itertools as it
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import networkx as nx
+import numpy as np
+
+from .columnar import GraphColumns, Ragged, StringColumn
+
+
+def _encode(values: Sequence[str]) -> Tuple[List[str], np.ndarray]:
+    """ Dictionary encoding of repetitive string values: the table and the code of each value """
+    table, codes = np.unique(np.array(values, dtype=object), return_inverse=True)
+    return table.tolist(), codes.astype(np.int32)
+
+
+class CompactGraph:
+    """
+    The directed multigraph of entities over integer ids, in CSR form. The parallel edges of a pair of entities are
+    contiguous and the pairs of a source are contiguous, in the order of the graph it was built from. Edge
+    attributes are columns indexed by edge id. Nodes are referred to by their entity id in the public methods
+    """
+
+    def __init__(self, columns: GraphColumns, polarity_table: List[str], edge_polarity: np.ndarray,
+                 nodes: Optional[np.ndarray] = None, edges: Optional[np.ndarray] = None):
+        """
+        Compacts the columns of a graph, with the polarity code of each of its edges. Only the nodes and the edges
+        in the boolean masks are kept, and the edges of the nodes that aren't kept are left out too
+        """
+        if nodes is None:
+            nodes = np.ones(len(columns.node_ids), dtype=np.bool_)
+        if edges is None:
+            edges = np.ones(len(columns.edge_src), dtype=np.bool_)
+        self.node_ids = list(it.compress(columns.node_ids, nodes.tolist()))
+        self.node_labels = list(it.compress(columns.node_labels, nodes.tolist()))
+        self.node_index = {n: ix for ix, n in enumerate(self.node_ids)}
+        num_nodes = len(self.node_ids)
+        node_ids = np.cumsum(nodes, dtype=np.int64) - 1
+        kept = np.flatnonzero(edges & nodes[columns.edge_src] & nodes[columns.edge_dst])
+
+        # Group the edges by pair and the pairs by source, keeping the order of their first appearance
+        pair_keys = node_ids[columns.edge_src[kept]] * num_nodes + node_ids[columns.edge_dst[kept]]
+        keys, first_edges, edge_pairs = np.unique(pair_keys, return_index=True, return_inverse=True)
+        pair_src, pair_dst = np.divmod(keys, max(num_nodes, 1))
+        pair_order = np.lexsort((first_edges, pair_src))
+        pair_rank = np.empty_like(pair_order)
+        pair_rank[pair_order] = np.arange(len(pair_order))
+        edge_order = np.argsort(pair_rank[edge_pairs.ravel()], kind='stable')
+        # The rows of the columns of each edge id
+        rows = kept[edge_order]
+
+        self.pair_src = pair_src[pair_order].astype(np.int32)
+        self.pair_dst = pair_dst[pair_order].astype(np.int32)
+        self.edge_pair = pair_rank[edge_pairs.ravel()][edge_order].astype(np.int32)
+        self.pair_offsets = Ragged.offsets_of(np.bincount(self.edge_pair, minlength=len(keys)))
+        # Out pairs of each node, and the same sorted by destination to look pairs up
+        self.out_offsets = Ragged.offsets_of(np.bincount(self.pair_src, minlength=num_nodes))
+        self._out_by_dst = np.lexsort((self.pair_dst, self.pair_src)).astype(np.int32)
+        self._out_sorted_dst = self.pair_dst[self._out_by_dst]
+        # In pairs of each node, in the order of their first edges, as the predecessors of the networkx graph
+        self.in_pairs = np.lexsort((first_edges[pair_order], self.pair_dst)).astype(np.int32)
+        self.in_offsets = Ragged.offsets_of(np.bincount(self.pair_dst, minlength=num_nodes))
+
+        # Edge attributes
+        self.edge_key = columns.edge_key[rows].astype(np.int32)
+        self.edge_input = columns.edge_input[rows].astype(np.int32)
+        self.edge_freq = columns.edge_freq[rows].astype(np.int32)
+        self.trigger_table, self.edge_trigger = list(columns.edge_trigger_table), columns.edge_trigger[rows]
+        self.label_table, self.edge_label = list(columns.edge_label_table), columns.edge_label[rows]
+        self.polarity_table = polarity_table
+        self.edge_polarity = np.asarray(edge_polarity)[rows].astype(np.int8)  # Positive, Negative or Neutral
+        self.edge_seen_in = columns.edge_seen_in.take(rows)
+        self.edge_journals = columns.edge_journals.take(rows)
+        self.edge_impact_factors = columns.edge_impact_factors.take(rows)
+
+        # Evidence of the edges, read from the columns until it's moved to the evidence store
+        self.evidence_rows = rows
+        self.evidence_offsets = columns.evidence_offsets
+        self.evidence_link_table, self.evidence_link = list(columns.evidence_link_table), columns.evidence_link
+        self.evidence_impact = columns.evidence_impact
+        self.evidence_markup = columns.evidence_markup
+
+    @classmethod
+    def from_networkx(cls, graph: nx.MultiDiGraph) -> 'CompactGraph':
+        """ Compacts the post-processed graph, with the polarity of each edge """
+        columns = GraphColumns.from_networkx(graph)
+        node_ids = columns.node_ids
+        polarity_table, edge_polarity = _encode([graph[node_ids[u]][node_ids[v]][k]['polarity'] for u, v, k in
+                                                 zip(columns.edge_src.tolist(), columns.edge_dst.tolist(),
+                                                     columns.edge_key.tolist())])
+        return cls(columns, polarity_table, edge_polarity)
+
+    def to_networkx(self) -> nx.MultiDiGraph:
+        """ Compatibility view: the networkx graph it was built from, without the evidence """
+        graph = nx.MultiDiGraph()
+        graph.add_nodes_from((n, self.node_data(n)) for n in self.node_ids)
+        graph.add_edges_from((*self.edge_endpoints(e), self.edge_data(e)) for e in range(self.number_of_edges()))
+        return graph
+
+    # Nodes
+
+    def __contains__(self, node: str) -> bool:
+        return node in self.node_index
+
+    def __len__(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def nodes(self) -> List[str]:
+        return self.node_ids
+
+    def number_of_nodes(self) -> int:
+        return len(self.node_ids)
+
+    def number_of_pairs(self) -> int:
+        return len(self.pair_src)
+
+    def number_of_edges(self) -> int:
+        return len(self.edge_key)
+
+    def node_label(self, node: str) -> Optional[str]:
+        return self.node_labels[self.node_index[node]]
+
+    def node_data(self, node: str) -> Dict[str, str]:
+        """ Attributes of the node, as in the networkx graph """
+        label = self.node_label(node)
+        return {'label': label} if label is not None else {}
+
+    # Adjacency
+
+    def out_pairs(self, node: str) -> range:
+        """ Ids of the pairs of the node and each of its successors """
+        ix = self.node_index[node]
+        return range(self.out_offsets[ix], self.out_offsets[ix + 1])
+
+    def in_pairs_of(self, node: str) -> np.ndarray:
+        """ Ids of the pairs of each predecessor and the node """
+        ix = self.node_index[node]
+        return self.in_pairs[self.in_offsets[ix]:self.in_offsets[ix + 1]]
+
+    def successors(self, node: str) -> List[str]:
+        pairs = self.out_pairs(node)
+        return [self.node_ids[v] for v in self.pair_dst[pairs.start:pairs.stop].tolist()]
+
+    neighbors = successors
+
+    def predecessors(self, node: str) -> List[str]:
+        return [self.node_ids[u] for u in self.pair_src[self.in_pairs_of(node)].tolist()]
+
+    def degree(self, node: str, parallel: bool = True) -> int:
+        """ Number of incident edges. Without parallel, the number of incident pairs, as in the simple graph """
+        ix = self.node_index[node]
+        if parallel:
+            return int(self.pair_offsets[self.out_offsets[ix + 1]] - self.pair_offsets[self.out_offsets[ix]] +
+                       sum(len(self.pair_edges(p)) for p in self.in_pairs_of(node).tolist()))
+        return int(self.out_offsets[ix + 1] - self.out_offsets[ix] + self.in_offsets[ix + 1] - self.in_offsets[ix])
+
+    def pair_id(self, source: str, destination: str) -> Optional[int]:
+        """ Id of the pair of source to destination, None if there's no edge between them """
+        if source not in self.node_index or destination not in self.node_index:
+            return None
+        ix, dst = self.node_index[source], self.node_index[destination]
+        start, end = self.out_offsets[ix], self.out_offsets[ix + 1]
+        pos = start + np.searchsorted(self._out_sorted_dst[start:end], dst)
+        if pos < end and self._out_sorted_dst[pos] == dst:
+            return int(self._out_by_dst[pos])
+        return None
+
+    def pair_endpoints(self, pair: int) -> Tuple[str, str]:
+        return self.node_ids[self.pair_src[pair]], self.node_ids[self.pair_dst[pair]]
+
+    def pair_edges(self, pair: int) -> range:
+        """ Ids of the parallel edges of a pair """
+        return range(self.pair_offsets[pair], self.pair_offsets[pair + 1])
+
+    def edges_between(self, source: str, destination: str) -> range:
+        """ Ids of the parallel edges from source to destination """
+        pair = self.pair_id(source, destination)
+        return self.pair_edges(pair) if pair is not None else range(0)
+
+    def out_edges(self, node: str) -> range:
+        pairs = self.out_pairs(node)
+        return range(self.pair_offsets[pairs.start], self.pair_offsets[pairs.stop])
+
+    def in_edges(self, node: str) -> List[int]:
+        return [e for p in self.in_pairs_of(node).tolist() for e in self.pair_edges(p)]
+
+    def subgraph_edges(self, nodes: Iterable[str]) -> np.ndarray:
+        """ Ids of the edges between the nodes, in edge order. Ids of nodes that aren't in the graph are ignored """
+        ids = np.array(sorted({self.node_index[n] for n in nodes if n in self.node_index}), dtype=np.int64)
+        member = np.zeros(len(self.node_ids), dtype=np.bool_)
+        member[ids] = True
+        edges = list()
+        for ix in ids.tolist():
+            start, end = self.out_offsets[ix], self.out_offsets[ix + 1]
+            for pair in (start + np.flatnonzero(member[self.pair_dst[start:end]])).tolist():
+                edges.append(np.arange(self.pair_offsets[pair], self.pair_offsets[pair + 1]))
+        return np.concatenate(edges) if edges else np.zeros(0, dtype=np.int64)
+
+    def shortest_path(self, source: str, target: str) -> List[str]:
+        """ A shortest directed path, by the bidirectional breadth-first search of networkx """
+        for node in (source, target):
+            if node not in self.node_index:
+                raise nx.NodeNotFound(f"Either source {source} or target {target} is not in G")
+        source_ix, target_ix = self.node_index[source], self.node_index[target]
+        pred, succ = {source_ix: None}, {target_ix: None}
+        meeting = source_ix if source_ix == target_ix else None
+        forward_fringe, reverse_fringe = [source_ix], [target_ix]
+        while meeting is None and forward_fringe and reverse_fringe:
+            if len(forward_fringe) <= len(reverse_fringe):
+                this_level, forward_fringe = forward_fringe, []
+                for v in this_level:
+                    for w in self.pair_dst[self.out_offsets[v]:self.out_offsets[v + 1]].tolist():
+                        if w not in pred:
+                            forward_fringe.append(w)
+                            pred[w] = v
+                        if w in succ:
+                            meeting = w
+                            break
+                    if meeting is not None:
+                        break
+            else:
+                this_level, reverse_fringe = reverse_fringe, []
+                for v in this_level:
+                    for w in self.pair_src[self.in_pairs[self.in_offsets[v]:self.in_offsets[v + 1]]].tolist():
+                        if w not in succ:
+                            succ[w] = v
+                            reverse_fringe.append(w)
+                        if w in pred:
+                            meeting = w
+                            break
+                    if meeting is not None:
+                        break
+        if meeting is None:
+            raise nx.NetworkXNoPath(f"No path between {source} and {target}.")
+
+        path = list()
+        node = meeting
+        while node is not None:
+            path.append(node)
+            node = pred[node]
+        path.reverse()
+        node = succ[meeting]
+        while node is not None:
+            path.append(node)
+            node = succ[node]
+        return [self.node_ids[n] for n in path]
+
+    # Edges
+
+    def edge_endpoints(self, edge: int) -> Tuple[str, str, int]:
+        """ (source, destination, key) of the edge, as in the networkx graph """
+        pair = self.edge_pair[edge]
+        return self.node_ids[self.pair_src[pair]], self.node_ids[self.pair_dst[pair]], int(self.edge_key[edge])
+
+    def edges(self) -> Iterable[Tuple[str, str, int]]:
+        return (self.edge_endpoints(e) for e in range(self.number_of_edges()))
+
+    def edge_data(self, edge: int) -> Dict[str, Any]:
+        """ Attributes of the edge, as in the networkx graph once its evidence is in the evidence store """
+        return {
+            'input': int(self.edge_input[edge]),
+            'trigger': self.trigger_table[self.edge_trigger[edge]],
+            'freq': int(self.edge_freq[edge]),
+            'seen_in': array('I', self.edge_seen_in[edge].tolist()),
+            'label': self.label_table[self.edge_label[edge]],
+            'journals': array('I', self.edge_journals[edge].tolist()),
+            'impact_factors': array('d', self.edge_impact_factors[edge].tolist()),
+            'polarity': self.polarity_table[self.edge_polarity[edge]],
+        }
+
+    def polarity(self, edge: int) -> str:
+        return self.polarity_table[self.edge_polarity[edge]]
+
+    def evidence(self, edge: int) -> List[Tuple[str, float, str]]:
+        """ (link, impact, markup) of the evidence sentences of the edge """
+        row = self.evidence_rows[edge]
+        start, end = int(self.evidence_offsets[row]), int(self.evidence_offsets[row + 1])
+        links = [self.evidence_link_table[code] for code in self.evidence_link[start:end].tolist()]
+        return list(zip(links, self.evidence_impact[start:end].tolist(), self.evidence_markup.slice(start, end)))
+
+    def drop_evidence(self):
+        """ Frees the evidence, once it's in the evidence store """
+        # A read-only view of a single zero, so the rows take no memory
+        self.evidence_rows = np.broadcast_to(np.int64(0), (self.number_of_edges(),))
+        self.evidence_offsets = np.zeros(2, dtype=np.int64)
+        self.evidence_link_table, self.evidence_link = [], np.zeros(0, dtype=np.int32)
+        self.evidence_impact = np.zeros(0, dtype=np.float64)
+        self.evidence_markup = StringColumn(*StringColumn.encode([]))
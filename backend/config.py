@@ -1,5 +1,7 @@
 """ Backend config schema. Doesn't include ASGI's settings """
 
+from typing import Optional
+
 from pydantic import BaseSettings
 
 class Settings(BaseSettings):
@@ -7,6 +9,20 @@ class Settings(BaseSettings):
     impact_factors: str
     records_db: str
     es_index: str
+    # Directory of the warm-start cache of the post-processed graph and evidence. Disabled if not set
+    state_cache_dir: Optional[str] = None
+    # Directory of the evidence stores, one per graph file. The stores of other graph files in it are deleted.
+    # Defaults to the state cache directory, or else to a directory in the system's temporary directory, where nothing
+    # is deleted
+    evidence_store_dir: Optional[str] = None
+    # Number of edges whose evidence is kept in memory. The rest is read from the evidence store on demand
+    evidence_cache_size: int = 1024
+    # Number of coefficient vectors whose edge weights are kept in memory
+    weight_cache_size: int = 16
+    # Bearer token of the /admin endpoints. They are disabled if not set
+    admin_token: Optional[str] = None
+    # Seconds between checks of the graph file for changes, to reload it. Disabled if 0
+    graph_watch_interval: float = 0
 
     class Config:
         env_file = ".env"
@@ -1,23 +1,34 @@
 """ Global dependencies of the API server """
 import itertools
 import logging
+import os
 import pickle
+import tempfile
+import threading
+import time
 from collections import defaultdict
-from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
+from functools import lru_cache, wraps
 from pathlib import Path
+from types import TracebackType
+from typing import Callable, Dict, List, NamedTuple, Optional
 
-import networkx as nx
+import numpy as np
 from sqlalchemy.orm import sessionmaker
 from tqdm import tqdm
 
 # from backend.cli_parser import args
 from .config import Settings
 from evidence_index.client import EvidenceIndexClient
-from .models import EvidenceItem
+from .compact_graph import CompactGraph
+from .edge_weights import EdgeWeights
+from .evidence_store import EvidenceStore, build_evidence_store, is_evidence_store
 from backend.rankings import ImpactFactors
+from .columnar import ColumnarGraph, GraphColumns, content_hash, is_columnar, read_graph_columns
 from .sql_app import models
 from .sql_app.database import construct_engine
-from .utils import get_git_revision_hash, md5_hash
+from .utils import build_overview_table, get_git_revision_hash, md5_hash, summarize_edges_significance
 
 logger = logging.getLogger("frailty-viz-dependencies")
 
@@ -26,7 +37,293 @@ logger = logging.getLogger("frailty-viz-dependencies")
 def get_cli_args():
     return Settings()
 
-@lru_cache()
+
+def graph_file_signature(path) -> Optional[tuple]:
+    """ Sizes and modification times of the graph file, or of the files of the columnar artifact. None if missing """
+    path = Path(path)
+    try:
+        if path.is_dir():
+            return tuple(sorted((f.name, f.stat().st_size, f.stat().st_mtime_ns) for f in path.iterdir()))
+        stat = path.stat()
+        return stat.st_size, stat.st_mtime_ns
+    except OSError:
+        return None
+
+
+class _Failure(NamedTuple):
+    """ Error of a dependency that failed to compute """
+    error: Exception
+    traceback: Optional[TracebackType]
+
+
+class Generation:
+    """
+    A version of the graph data. Holds the values of all the dependencies derived from the graph file, computed once
+    per generation. A reload builds a new generation and swaps it in, the old one lives while requests use it
+    """
+
+    def __init__(self, number: int, graph_file: str):
+        self.number = number
+        self.graph_file = graph_file
+        self.created = time.time()
+        # Taken before loading the file, so a change while loading is caught by the next check
+        self.signature = graph_file_signature(graph_file)
+        self._values: Dict[Callable, object] = dict()
+        self._locks: Dict[Callable, threading.RLock] = dict()
+        self._lock = threading.Lock()
+
+    def computed(self, dependency: Callable):
+        """ Value of the dependency if this generation already computed it, else None. Never computes it """
+        value = self._values.get(getattr(dependency, '__wrapped__', dependency))
+        return None if isinstance(value, _Failure) else value
+
+    def get(self, dependency: Callable):
+        """
+        Value of the dependency for this generation. Computed by the first caller, the others wait for it. If it
+        fails, the error is raised again to every later caller, so a broken graph file is only loaded once
+        """
+        if dependency not in self._values:
+            with self._lock:
+                lock = self._locks.setdefault(dependency, threading.RLock())
+            with lock:
+                if dependency not in self._values:
+                    try:
+                        self._values[dependency] = dependency()
+                    except Exception as ex:
+                        self._values[dependency] = _Failure(ex, ex.__traceback__)
+        value = self._values[dependency]
+        if isinstance(value, _Failure):
+            raise value.error.with_traceback(value.traceback)
+        return value
+
+
+_generation: Optional[Generation] = None
+_generation_lock = threading.Lock()
+# Generation being built in the background, for the dependencies computed by the reload
+_building_generation: ContextVar[Optional[Generation]] = ContextVar("building_generation", default=None)
+# Generation pinned at the start of a request, so all its dependencies come from the same version
+_request_generation: ContextVar[Optional[Generation]] = ContextVar("request_generation", default=None)
+# Dependencies derived from the graph, in definition order
+_generation_dependencies: List[Callable] = list()
+
+
+def current_generation() -> Generation:
+    """ The generation served to new requests """
+    global _generation
+    if _generation is None:
+        with _generation_lock:
+            if _generation is None:
+                _generation = Generation(0, get_cli_args().graph_file)
+    return _generation
+
+
+def active_generation() -> Generation:
+    """ The generation being built in this context, or the one pinned by the request, or else the current one """
+    return _building_generation.get() or _request_generation.get() or current_generation()
+
+
+def generation_cache(dependency: Callable) -> Callable:
+    """ Like lru_cache() for the dependencies derived from the graph, but with a value for each generation """
+
+    @wraps(dependency)
+    def cached():
+        return active_generation().get(dependency)
+
+    _generation_dependencies.append(cached)
+    return cached
+
+
+def single_init(dependency: Callable) -> Callable:
+    """ Like lru_cache() for the dependencies without arguments, but concurrent first calls compute the value once """
+    lock = threading.Lock()
+    value = list()
+
+    @wraps(dependency)
+    def cached():
+        if not value:
+            with lock:
+                if not value:
+                    value.append(dependency())
+        return value[0]
+
+    return cached
+
+
+def preload(dependencies: List[Callable], max_workers: int = 8) -> Dict[str, float]:
+    """
+    Computes the dependencies concurrently. The ones that depend on another wait for it, as they are single
+    initialization, so the independent ones load in parallel. Returns the seconds until each one was available
+    """
+    def timed(dependency):
+        start = time.perf_counter()
+        dependency()
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="preload") as executor:
+        # Each in a copy of this context, to see the generation being built by a reload
+        futures = {d.__name__: executor.submit(copy_context().run, timed, d) for d in dependencies}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def preload_generation() -> Dict[str, float]:
+    """ Computes all the dependencies derived from the graph for the active generation """
+    return preload(_generation_dependencies)
+
+
+class PinGeneration:
+    """ ASGI middleware that pins the current generation for the whole of each request """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        token = _request_generation.set(current_generation())
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_generation.reset(token)
+
+
+def get_graph_file() -> str:
+    return active_generation().graph_file
+
+
+class GraphReloader:
+    """
+    Builds a new generation in a background thread and then swaps it in. Requests in flight finish with the
+    generation they started with, and new requests see the new one. Memory holds both while the new one is built
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reloading = False
+        self.last_error: Optional[str] = None
+        # Why the reloads are refused, if they are
+        self.disabled: Optional[str] = None
+
+    def disable(self, reason: str):
+        """ Refuses the reloads from now on, for servers whose processes can't reload one by one """
+        self.disabled = reason
+
+    def reload(self, graph_file: Optional[str] = None) -> bool:
+        """
+        Starts building a generation of the graph file, by default the GRAPH_FILE setting as currently configured.
+        False if a reload is already in progress, or if the reloads are disabled
+        """
+        with self._lock:
+            if self.reloading or self.disabled:
+                return False
+            self.reloading = True
+        graph_file = graph_file or Settings().graph_file
+        threading.Thread(target=self._build, args=(graph_file,), name="graph-reload", daemon=True).start()
+        return True
+
+    def _build(self, graph_file: str):
+        global _generation
+        try:
+            generation = Generation(current_generation().number + 1, graph_file)
+            logger.info(f"Building generation {generation.number} of {graph_file}")
+            token = _building_generation.set(generation)
+            try:
+                preload_generation()
+            finally:
+                _building_generation.reset(token)
+            with _generation_lock:
+                _generation = generation
+            self.last_error = None
+            logger.info(f"Serving generation {generation.number} of {graph_file}")
+        except Exception as ex:
+            logger.exception(f"Failed to load {graph_file}, still serving the previous generation")
+            self.last_error = f"{type(ex).__name__}: {ex}"
+        finally:
+            self.reloading = False
+
+    def watch(self, interval: float):
+        """ Reloads when the graph file of the current generation changes, once it has stayed the same for a check """
+        if self.disabled:
+            logger.warning(f"Not watching the graph file: {self.disabled}")
+            return
+
+        def watch_loop():
+            pending = None
+            while True:
+                time.sleep(interval)
+                generation = current_generation()
+                signature = graph_file_signature(generation.graph_file)
+                if signature is None or signature == generation.signature:
+                    pending = None
+                elif signature != pending:
+                    pending = signature  # Still being written, or just changed
+                elif self.reload(generation.graph_file):
+                    pending = None
+
+        threading.Thread(target=watch_loop, name="graph-watch", daemon=True).start()
+
+    def status(self) -> dict:
+        generation = current_generation()
+        return {'generation': generation.number, 'graph_file': generation.graph_file,
+                'loaded_since': generation.created, 'reloading': self.reloading, 'last_error': self.last_error,
+                'reload_disabled': self.disabled}
+
+
+graph_reloader = GraphReloader()
+
+
+class StartupPreload:
+    """ Loads all the data of the API at startup, in the background. The API is ready once it is done """
+
+    def __init__(self):
+        self._started = False
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._done = threading.Event()
+        self.error: Optional[str] = None
+        self.seconds: Dict[str, float] = dict()
+
+    def _claim(self) -> bool:
+        """ True for the first caller only, which is the one to load """
+        with self._lock:
+            if self._started:
+                return False
+            self._started = True
+            return True
+
+    def start(self):
+        """ Starts loading in a background thread, unless it already started """
+        if self._claim():
+            threading.Thread(target=self._load, name="startup-preload", daemon=True).start()
+
+    def run(self):
+        """ Loads in this thread, or waits for the load that already started """
+        if self._claim():
+            self._load()
+        else:
+            self._done.wait()
+
+    def _load(self):
+        start = time.perf_counter()
+        try:
+            self.seconds = preload(_generation_dependencies + [get_impact_factors, get_rankings_hash, get_commit_hash])
+        except Exception as ex:
+            logger.exception("Failed to load the data of the API")
+            self.error = f"{type(ex).__name__}: {ex}"
+        else:
+            logger.info(f"Data loaded in {time.perf_counter() - start:.1f}s")
+            self._ready.set()
+        finally:
+            self._done.set()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def status(self) -> dict:
+        return {'ready': self.ready, 'error': self.error, 'seconds': self.seconds}
+
+
+startup_preload = StartupPreload()
+
+@single_init
 def _build_db_session_class():
     engine = construct_engine(Path(get_cli_args().records_db))
     models.Base.metadata.create_all(bind=engine)
@@ -45,37 +342,121 @@ def get_es_client():
     return EvidenceIndexClient(get_cli_args().es_index)
 
 
-@lru_cache()
+@single_init
 def get_commit_hash():
     """ Get the current directory from the script's location """
     commit_hash = get_git_revision_hash(str(Path(__file__).parent))
     return commit_hash
 
 
-@lru_cache()
+@generation_cache
 def get_graph_hash():
-    graph_hash = md5_hash(get_cli_args().graph_file)
-    return graph_hash
+    graph_file = get_graph_file()
+    # The columnar artifact stores the hash of its columns, computed when written
+    graph_hash = content_hash(graph_file) if is_columnar(graph_file) else None
+    return graph_hash or md5_hash(graph_file)
 
 
-@lru_cache()
+@single_init
 def get_rankings_hash():
     rankings_hash = md5_hash(get_cli_args().impact_factors)
     return rankings_hash
 
 
-@lru_cache()
+@single_init
 def get_impact_factors():
     impacts = ImpactFactors(Path(get_cli_args().impact_factors))
     return impacts
 
 
-@lru_cache()
-def read_graph_and_significance():
+# Bump when the post-processing of the graph or of the evidence changes, to discard the warm-start caches
+STATE_CACHE_VERSION = 5
+
+
+def _state_cache_path() -> Optional[Path]:
+    """ Warm-start cache file of the current graph and rankings, if the cache is enabled """
+    cache_dir = get_cli_args().state_cache_dir
+    if not cache_dir:
+        return None
+    return Path(cache_dir) / f"state-v{STATE_CACHE_VERSION}-{get_graph_hash()}-{get_rankings_hash()}.pickle"
+
+
+def _evidence_store_dir() -> Path:
+    settings = get_cli_args()
+    store_dir = settings.evidence_store_dir or settings.state_cache_dir
+    return Path(store_dir) if store_dir else Path(tempfile.gettempdir(), "frailty_viz")
+
+
+def _evidence_store_path() -> Path:
+    """ Evidence store of the current graph """
+    return _evidence_store_dir() / f"evidence-v{STATE_CACHE_VERSION}-{get_graph_hash()}.sqlite"
+
+
+def prune_evidence_stores(keep: Path):
+    """
+    Deletes the evidence stores of other graphs, or of previous versions, from the store directory. The store of the
+    generation being served is kept too, as it serves requests until a reload swaps the new one in. Only done in a
+    configured directory: the default one, in the shared temporary directory, may hold the stores of other servers
+    """
+    settings = get_cli_args()
+    if not (settings.evidence_store_dir or settings.state_cache_dir):
+        return
+    keep = {keep}
+    served = current_generation().computed(get_evidence_sentences_and_frequencies)
+    if served is not None:
+        keep.add(served[0].path)
+    for path in _evidence_store_dir().glob("evidence-v*.sqlite"):
+        if path not in keep:
+            logger.info(f"Deleting the evidence store of another graph {path}")
+            path.unlink(missing_ok=True)
+
+
+@generation_cache
+def read_warm_state() -> Optional[dict]:
+    """
+    Post-processed graph, significance, synonyms and frequencies saved by a previous start with the same graph and
+    rankings files. None if there isn't one, or if its evidence store is gone. Without the graph for the columnar
+    artifact, which is compacted again from its memory maps
+    """
+    path = _state_cache_path()
+    if path is None or not path.exists() or not is_evidence_store(_evidence_store_path()):
+        return None
+    print(f"Loading warm-start cache {path} ...")
+    try:
+        with path.open('rb') as f:
+            return pickle.load(f)
+    except Exception as ex:
+        logger.warning(f"Ignoring unreadable warm-start cache {path}: {ex}")
+        return None
+
+
+def save_warm_state(state: dict):
+    """ Writes the warm-start cache atomically, so concurrent starts never read a partial file """
+    path = _state_cache_path()
+    if path is None:
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    print(f"Saved warm-start cache {path}")
+
 
-    def infer_polarity(edge):
+# Polarity of the edges, by their code in the compact graph
+POLARITIES = ["Positive", "Negative", "Neutral"]
+
+
+def _compact_graph(columns: GraphColumns) -> CompactGraph:
+    """ The graph as served: compacted, with the polarity of each edge and without self loops nor uaz entities """
+
+    def infer_polarity(label):
         """ Temporary function that will infer polarity out of the label for display and grouping purposes """
-        label = edge['label'].lower()
+        label = label.lower()
         if "positive" in label:
             polarity = "Positive"
         elif "negative" in label:
@@ -85,23 +466,37 @@ def read_graph_and_significance():
 
         return polarity
 
+    # Add polarity to all edges, by their label. This will go away soon
+    label_polarity = np.array([POLARITIES.index(infer_polarity(label)) for label in columns.edge_label_table],
+                              dtype=np.int8)
+
+    print("Cleaning graph ...")
+    # Without the self loops and the uaz entities
+    nodes = np.array([not n.startswith("uaz:") for n in columns.node_ids], dtype=np.bool_)
+    edges = columns.edge_src != columns.edge_dst
+
+    print("Compacting graph ...")
+    return CompactGraph(columns, POLARITIES, label_polarity[columns.edge_label], nodes, edges)
+
+
+@generation_cache
+def read_graph_and_significance():
+    warm_state = read_warm_state()
+    if warm_state is not None:
+        graph = warm_state.get('graph')
+        if graph is None:
+            # The evidence is already in the store
+            graph = _compact_graph(ColumnarGraph(get_graph_file()).columns())
+            graph.drop_evidence()
+        return graph, warm_state['significance'], warm_state['synonyms']
+
     print("Loading data ...")
-    with open(get_cli_args().graph_file, 'rb') as f:
-        data = pickle.load(f)
+    # Either the pickle or the columnar artifact
+    data = read_graph_columns(Path(get_graph_file()))
 
-    graph = data['graph']
     significance = data['significance']
     synonyms  = {k.strip().lower():list({s.strip().lower() for s in v}) for k, v in data['synonyms'].items()}
-
-    # Add polarity to all edges. This will go away soon
-    for (_, _, data) in graph.edges(data=True):
-        polarity = infer_polarity(data)
-        data['polarity'] = polarity
-
-    print("Cleaning graph ...")
-    graph.remove_edges_from(list(nx.selfloop_edges(graph)))
-    uaz_nodes = [n for n in graph.nodes if n.startswith("uaz:")]
-    graph.remove_nodes_from(uaz_nodes)
+    graph = _compact_graph(data['columns'])
 
     return graph, significance, synonyms
 
@@ -116,11 +511,29 @@ def get_significance():
     return significance
 
 
+@generation_cache
+def get_edge_significance():
+    """ Significance summary of each edge, with the p-values already parsed """
+    return summarize_edges_significance(get_graph(), get_significance())
+
+
+@generation_cache
+def get_overview_table():
+    """ Weight terms of each pair of entities and the sorted neighbors of each entity, for the overview """
+    return build_overview_table(get_graph(), get_frequencies(), get_edge_significance())
+
+
+@generation_cache
+def get_edge_weights():
+    """ Terms of the weight formula of every edge, to weigh them all at once for any coefficients """
+    return EdgeWeights.from_graph(get_graph(), get_edge_significance(), get_cli_args().weight_cache_size)
+
+
 def get_synonyms():
     _, _, synonyms = read_graph_and_significance()
     return synonyms
 
-@lru_cache()
+@generation_cache
 def get_entity_search_databases():
     synonyms = get_synonyms()
     graph = get_graph()
@@ -131,9 +544,9 @@ def get_entity_search_databases():
             inverted_synonyms[s.strip().lower()] = k.strip().lower()
 
     inverted_entities = defaultdict(list)
-    for n in graph.nodes:
-        if 'label' in graph.nodes[n]:
-            inverted_entities[graph.nodes[n]['label'].strip().lower()].append(n.strip().lower())
+    for n, label in zip(graph.node_ids, graph.node_labels):
+        if label is not None:
+            inverted_entities[label.strip().lower()].append(n.strip().lower())
 
     # inverted_entities = {graph.nodes[n]['label'].lower():n.lower() for n in graph.nodes if 'label' in graph.nodes[n]}
 
@@ -146,54 +559,72 @@ def get_entity_search_databases():
 
     return ids, inverted_entities, inverted_synonyms
 
-@lru_cache()
+@generation_cache
 def get_entities():
     graph = get_graph()
     # Compute the graph entities
-    entities = {f"{graph.nodes[n]['label']} ({n})" for n in graph.nodes if 'label' in graph.nodes[n]}
+    entities = {f"{label} ({n})" for n, label in zip(graph.node_ids, graph.node_labels) if label is not None}
 
     return entities
 
 
-@lru_cache()
+@generation_cache
 def get_structured_entities():
     graph = get_graph()
-    structured_entities = [{"label": graph.nodes[n]['label'], "id": n} for n in
-                           {nn for nn in graph.nodes if 'label' in graph.nodes[nn]}]
+    structured_entities = [{"label": graph.node_label(n), "id": n} for n in
+                           {nn for nn in graph.nodes if graph.node_label(nn) is not None}]
 
     return structured_entities
 
 
-@lru_cache()
+@generation_cache
 def get_evidence_sentences_and_frequencies():
-    graph = get_graph()
-
-    # Cache the evidence
-    print("Building evidence")
-    evidence_sentences = defaultdict(list)
-    frequencies = defaultdict(int)
-    for s, d, ix in tqdm(graph.edges, desc="Caching evidence"):
-        edge = graph[s][d][ix]
-
-        polarity = edge['polarity']
+    """
+    The evidence store and the number of evidence sentences between each pair of entities. The evidence sentences are
+    moved out of the graph into the store, which is written once per graph
+    """
+    store_path = _evidence_store_path()
+    settings = get_cli_args()
 
-        trigger = edge['trigger']
+    warm_state = read_warm_state()
+    if warm_state is not None:
+        prune_evidence_stores(store_path)
+        return EvidenceStore(store_path, settings.evidence_cache_size), warm_state['frequencies']
 
-        key = (s, d, polarity)
-        w_key = frozenset((s, d))
-        sents = list(set(edge['evidence']))
-        formatted_sents = set()
-        for link, impact, sent in sents:
-            fimpact = "%.2f" % impact
-            ev = EvidenceItem(sentence=sent, impact=impact, hyperlink=link,
-                              list_item=f'({fimpact}) <a href="{link}" target="_blank">Source</a>: {sent}', markup=sent)
-            formatted_sents.add(ev)
+    graph, significance, synonyms = read_graph_and_significance()
 
-        frequencies[w_key] += len(formatted_sents)
-        evidence_sentences[key] += formatted_sents
-        del edge['evidence']
-
-    return evidence_sentences, frequencies
+    print("Building evidence")
+    frequencies = defaultdict(int)
+    store_exists = is_evidence_store(store_path)
+
+    def evidence_rows():
+        """ Counts the evidence of each edge and, unless they are already stored, yields its rows """
+        for edge in tqdm(range(graph.number_of_edges()), desc="Caching evidence"):
+            s, d, _ = graph.edge_endpoints(edge)
+            # Duplicates within an edge are counted and stored once
+            sents = set(graph.evidence(edge))
+            frequencies[frozenset((s, d))] += len(sents)
+            if not store_exists:
+                polarity = graph.polarity(edge)
+                yield from ((s, d, polarity, sent, impact, link) for link, impact, sent in sents)
+
+    if store_exists:
+        for _ in evidence_rows():
+            pass
+    else:
+        # Streamed into the store, the rows are never all in memory
+        build_evidence_store(store_path, evidence_rows())
+    graph.drop_evidence()
+    prune_evidence_stores(store_path)
+
+    # The graph is fully post-processed at this point. The next starts can skip all of the above. The columnar
+    # artifact is compacted again instead, so its columns are mapped rather than loaded into memory from the cache
+    state = {'significance': significance, 'synonyms': synonyms, 'frequencies': frequencies}
+    if not is_columnar(get_graph_file()):
+        state['graph'] = graph
+    save_warm_state(state)
+
+    return EvidenceStore(store_path, settings.evidence_cache_size), frequencies
 
 
 def get_evidence():
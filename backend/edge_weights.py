@@ -0,0 +1,150 @@
+""" Vectorized evaluation of the weight formula of documentation/weighting.md over all the edges of the graph """
+from functools import lru_cache
+from typing import Dict, Iterable, List, Mapping, Tuple
+
+import numpy as np
+from tqdm import tqdm
+
+from .utils import WEIGHT_COEFFICIENTS, weight_terms
+
+
+class EdgeWeights:
+    """
+    The terms of the weight formula of every edge of the compact graph as a matrix, one row per edge id and one column
+    per coefficient. The parallel edges of each pair of entities are contiguous rows, so the pair weights are sums
+    over row ranges. The weights of the most recently requested coefficients are kept in memory
+    """
+
+    def __init__(self, graph, features: np.ndarray, cache_size: int = 16):
+        self.graph = graph
+        self.features = features
+        # Min-max scaling of each term to [0, 1]. A term with the same value for all the edges scales to 0
+        if len(features):
+            self.minima, maxima = features.min(axis=0), features.max(axis=0)
+        else:
+            self.minima = maxima = np.zeros(features.shape[1])
+        self.ranges = maxima - self.minima
+
+        self.pair_starts = graph.pair_offsets[:-1]
+        # The index of the opposite pair of each pair, -1 if there is no such pair
+        num_nodes = graph.number_of_nodes()
+        keys = graph.pair_src.astype(np.int64) * num_nodes + graph.pair_dst
+        opposite_keys = graph.pair_dst.astype(np.int64) * num_nodes + graph.pair_src
+        # With a sentinel at the end for the keys past the last one
+        by_key = np.append(np.argsort(keys), -1)
+        sorted_keys = np.append(keys[by_key[:-1]], -1)
+        pos = np.searchsorted(sorted_keys[:-1], opposite_keys)
+        self.opposite_pairs = np.where(sorted_keys[pos] == opposite_keys, by_key[pos], -1)
+        # The pairs by decreasing number of parallel edges, to add the j-th edge of the pairs that have one at once
+        multiplicity = np.diff(graph.pair_offsets)
+        self._by_multiplicity = np.argsort(-multiplicity, kind='stable')
+        self._num_with_edge = np.searchsorted(-multiplicity[self._by_multiplicity],
+                                              -np.arange(1, multiplicity.max(initial=0) + 1), side='right')
+
+        self._weights = lru_cache(maxsize=cache_size)(self._compute)
+
+    @classmethod
+    def from_graph(cls, graph, edge_significance, cache_size: int = 16) -> 'EdgeWeights':
+        """ Evaluates the terms of each edge. The significance comes from utils.summarize_edges_significance """
+        features = np.empty((graph.number_of_edges(), len(WEIGHT_COEFFICIENTS)), dtype=np.float64)
+        for edge in tqdm(range(graph.number_of_edges()), desc="Weight terms"):
+            significance = edge_significance[edge]
+            features[edge] = weight_terms({'freq': int(graph.edge_freq[edge]),
+                                           'has_significance': significance.has_significance,
+                                           'impact_factors': graph.edge_impact_factors[edge].tolist(),
+                                           'p_values': significance.p_values})
+        return cls(graph, features, cache_size)
+
+    @staticmethod
+    def coefficient_vector(coefficients: Mapping[str, float]) -> Tuple[float, ...]:
+        """ The coefficients in the order of the terms. The missing ones are zero and the unknown ones are ignored """
+        return tuple(float(coefficients.get(name, 0.)) for name in WEIGHT_COEFFICIENTS)
+
+    def _compute(self, coefficients: Tuple[float, ...], normalized: bool) -> Tuple[np.ndarray, np.ndarray]:
+        # Term by term, in the order of utils.calculateWeight, so the raw weights are equal to its results
+        weights = np.zeros(len(self.features), dtype=np.float64)
+        for column, coefficient in enumerate(coefficients):
+            terms = self.features[:, column]
+            if normalized:
+                terms = self._normalized(column)
+            weights += terms * coefficient
+        pair_weights = self._pair_sums(weights)
+        # The arrays are shared by the callers of the cache
+        weights.setflags(write=False)
+        pair_weights.setflags(write=False)
+        return weights, pair_weights
+
+    def _normalized(self, column: int) -> np.ndarray:
+        """ The terms of a column scaled to [0, 1] """
+        if self.ranges[column] <= 0:
+            return np.zeros(len(self.features), dtype=np.float64)
+        return (self.features[:, column] - self.minima[column]) / self.ranges[column]
+
+    def _pair_sums(self, weights: np.ndarray) -> np.ndarray:
+        """ Sums of the edge weights of each pair, added in the order of the edges like sum() would """
+        sums = np.zeros(len(self.pair_starts), dtype=np.float64)
+        for j, num_pairs in enumerate(self._num_with_edge.tolist()):
+            pairs = self._by_multiplicity[:num_pairs]
+            sums[pairs] += weights[self.pair_starts[pairs] + j]
+        return sums
+
+    def edge_weights(self, coefficients: Mapping[str, float], normalized: bool = False) -> np.ndarray:
+        """ Weight of each edge, by edge id """
+        weights, _ = self._weights(self.coefficient_vector(coefficients), normalized)
+        return weights
+
+    def pair_weights(self, coefficients: Mapping[str, float], normalized: bool = False) -> np.ndarray:
+        """ Sum of the weights of the parallel edges of each pair, by pair id """
+        _, weights = self._weights(self.coefficient_vector(coefficients), normalized)
+        return weights
+
+    def node_weights(self, nodes: Iterable[str], coefficients: Mapping[str, float],
+                     normalized: bool = False) -> Dict[str, float]:
+        """
+        Sums, for each node, the weights of the edges in both directions between it and its neighbors among the
+        nodes. Each direction of a reciprocal pair counts on its own, so the edges of those pairs count twice
+        """
+        graph = self.graph
+        nodes = list(dict.fromkeys(nodes))
+        ids = np.array([graph.node_index[n] for n in nodes if n in graph.node_index], dtype=np.int64)
+        local = np.full(graph.number_of_nodes(), -1, dtype=np.int64)
+        local[ids] = np.arange(len(ids))
+
+        sources, targets = local[graph.pair_src], local[graph.pair_dst]
+        selected = np.flatnonzero((sources >= 0) & (targets >= 0))
+        pair_weights = self.pair_weights(coefficients, normalized)
+        opposite = self.opposite_pairs[selected]
+        weights = pair_weights[selected] + np.where(opposite >= 0, pair_weights[opposite], 0.)
+
+        endpoints = np.concatenate((sources[selected], targets[selected]))
+        sums = np.bincount(endpoints, np.concatenate((weights, weights)), minlength=len(ids))
+        incident = np.bincount(endpoints, minlength=len(ids)) > 0
+
+        node_weights = {n: 0 for n in nodes}
+        for node_id, total, has_edges in zip(ids.tolist(), sums.tolist(), incident.tolist()):
+            if has_edges:
+                node_weights[graph.node_ids[node_id]] = total
+        return node_weights
+
+    def top_edges(self, coefficients: Mapping[str, float], k: int,
+                  normalized: bool = False) -> List[Tuple[Tuple[str, str, int], float]]:
+        """ The k edges with the highest weight, heaviest first """
+        weights = self.edge_weights(coefficients, normalized)
+        return [(self.graph.edge_endpoints(ix), weights[ix].item()) for ix in top_k(weights, k).tolist()]
+
+    def top_pairs(self, coefficients: Mapping[str, float], k: int,
+                  normalized: bool = False) -> List[Tuple[Tuple[str, str], float]]:
+        """ The k pairs of entities with the highest sum of weights of their parallel edges, heaviest first """
+        weights = self.pair_weights(coefficients, normalized)
+        return [(self.graph.pair_endpoints(ix), weights[ix].item()) for ix in top_k(weights, k).tolist()]
+
+
+def top_k(values: np.ndarray, k: int) -> np.ndarray:
+    """ Indices of the k largest values, sorted decreasingly. Ties are broken by index """
+    k = max(0, min(k, len(values)))
+    if k == 0:
+        return np.zeros(0, dtype=np.int64)
+    # Everything as heavy as the k-th heaviest, so the ties at the boundary are broken by index too
+    kth = -np.partition(-values, k - 1)[k - 1]
+    candidates = np.flatnonzero(values >= kth)
+    return candidates[np.lexsort((candidates, -values[candidates]))][:k]
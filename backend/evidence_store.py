@@ -0,0 +1,85 @@
+""" Disk-backed store of the evidence sentences of the graph edges """
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import closing
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+from .models import EvidenceItem
+
+SCHEMA_VERSION = 1
+
+
+def build_evidence_store(path: Path, rows: Iterable[Tuple[str, str, str, str, float, str]]):
+    """
+    Writes the store from (source, destination, polarity, sentence, impact, hyperlink) rows. Built into a temporary
+    file that replaces the destination, so concurrent readers never see a partial store
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix='.tmp')
+    os.close(fd)
+    try:
+        with closing(sqlite3.connect(tmp_path)) as db:
+            db.execute("CREATE TABLE evidence (source TEXT, destination TEXT, polarity TEXT, sentence TEXT, "
+                       "impact REAL, hyperlink TEXT)")
+            db.executemany("INSERT INTO evidence VALUES (?, ?, ?, ?, ?, ?)", rows)
+            db.execute("CREATE INDEX edge ON evidence (source, destination, polarity)")
+            db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            db.commit()
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def is_evidence_store(path: Path) -> bool:
+    """ Whether the path is a complete store of the current schema """
+    if not Path(path).exists():
+        return False
+    try:
+        with closing(sqlite3.connect(f"file:{path}?mode=ro", uri=True)) as db:
+            return db.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    except sqlite3.DatabaseError:
+        return False
+
+
+class EvidenceStore:
+    """
+    Read-only access to the evidence of each (source, destination, polarity), as the EvidenceItems of the API.
+    Only the items of the most recently requested edges are kept in memory
+    """
+
+    def __init__(self, path: Path, cache_size: int = 1024):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._db = None
+        self._pid = None
+        self.get = lru_cache(maxsize=cache_size)(self._query)
+
+    def _connection(self) -> sqlite3.Connection:
+        # A connection can't be shared with forked processes, open one per process
+        if self._pid != os.getpid():
+            self._db = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._pid = os.getpid()
+        return self._db
+
+    def _query(self, key: Tuple[str, str, str]) -> List[EvidenceItem]:
+        with self._lock:
+            rows = self._connection().execute("SELECT sentence, impact, hyperlink FROM evidence "
+                                              "WHERE source = ? AND destination = ? AND polarity = ? ORDER BY rowid",
+                                              key).fetchall()
+        items = list()
+        for sent, impact, link in rows:
+            fimpact = "%.2f" % impact
+            items.append(EvidenceItem(sentence=sent, impact=impact, hyperlink=link,
+                                      list_item=f'({fimpact}) <a href="{link}" target="_blank">Source</a>: {sent}',
+                                      markup=sent))
+        return items
+
+    def __getitem__(self, key: Tuple[str, str, str]) -> List[EvidenceItem]:
+        """ Evidence of (source, destination, polarity). Empty if there is none """
+        return self.get(tuple(key))
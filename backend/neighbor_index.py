@@ -0,0 +1,66 @@
+""" Neighbors of each node of the blob viz graph, partitioned by category and sorted by frequency """
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+
+class NeighborIndex:
+    """
+    The out and in neighbors of each node over integer node ids. The neighbors of a (node, category) are a contiguous
+    slice of the neighbor and frequency arrays, the most frequent first, in the order of the graph for ties
+    """
+
+    def __init__(self, nodes: List[str], node_index: Dict[str, int], categories: np.ndarray, sources: np.ndarray,
+                 targets: np.ndarray, freqs: np.ndarray, num_categories: int):
+        self.nodes = nodes
+        self.node_index = node_index
+        self.categories = categories
+        self.num_categories = num_categories
+
+        sources = sources.astype(np.int64)
+        targets = targets.astype(np.int64)
+        freqs = freqs.astype(np.int64)
+        self.out_offsets, self.out_neighbors, self.out_freqs = self._partition(sources, targets, freqs)
+        self.in_offsets, self.in_neighbors, self.in_freqs = self._partition(targets, sources, freqs)
+
+    def _partition(self, nodes: np.ndarray, neighbors: np.ndarray, freqs: np.ndarray):
+        # lexsort is stable, so the ties keep the order of the edges
+        segments = nodes * self.num_categories + self.categories[neighbors]
+        order = np.lexsort((-freqs, segments))
+        offsets = np.zeros(len(self.nodes) * self.num_categories + 1, dtype=np.int64)
+        np.cumsum(np.bincount(segments, minlength=len(self.nodes) * self.num_categories), out=offsets[1:])
+        return offsets, neighbors[order].astype(np.int32), freqs[order]
+
+    @classmethod
+    def from_graph(cls, graph, pair_freqs: np.ndarray, category_of: Callable[[str], int], num_categories: int,
+                   skip_target: str = None) -> 'NeighborIndex':
+        """
+        Indexes the pairs of the compact graph, with the frequency of each pair. The pairs to skip_target aren't
+        indexed
+        """
+        categories = np.array([category_of(n) for n in graph.node_ids], dtype=np.int8)
+        indexed = np.ones(len(pair_freqs), dtype=np.bool_)
+        if skip_target in graph:
+            indexed = graph.pair_dst != graph.node_index[skip_target]
+        return cls(graph.node_ids, graph.node_index, categories, graph.pair_src[indexed], graph.pair_dst[indexed],
+                   pair_freqs[indexed], num_categories)
+
+    def top(self, node: int, category: int, k: int, excluded: set, incoming: bool = False) -> List[Tuple[int, int]]:
+        """ The k most frequent (neighbor, frequency) of a category that aren't excluded """
+        if k <= 0 or not 0 <= category < self.num_categories:
+            return []
+        if incoming:
+            offsets, neighbors, freqs = self.in_offsets, self.in_neighbors, self.in_freqs
+        else:
+            offsets, neighbors, freqs = self.out_offsets, self.out_neighbors, self.out_freqs
+        segment = node * self.num_categories + category
+        start, end = offsets[segment], offsets[segment + 1]
+        # At most len(excluded) of the slice are skipped
+        end = min(end, start + k + len(excluded))
+        top = list()
+        for neighbor, freq in zip(neighbors[start:end].tolist(), freqs[start:end].tolist()):
+            if len(top) == k:
+                break
+            if neighbor not in excluded:
+                top.append((neighbor, freq))
+        return top
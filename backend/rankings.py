@@ -1,49 +1,82 @@
 """ Make a dictionary with maps from PMCID -> journal name and journal name to impact metrics """
 
 import csv
+import itertools as it
 import pickle
 import re
+from array import array
+from bisect import bisect_left
 from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
 
 import plac
 from tqdm import tqdm
 
 class ImpactFactors:
-    """ Puts together all the information for easy retrieval of impact factor information """
+    """
+    Puts together all the information for easy retrieval of impact factor information.
+    Each journal gets an integer id, and the metrics are arrays indexed by it. Both the PMCIDs and the journal names
+    resolve to a journal id, so repeated lookups don't go through the metric dictionaries
+    """
+
+    METRICS = ("sjr", "hindex")
 
     def __init__(self, data_path: Path) -> None:
         with data_path.open('rb') as f:
             data = pickle.load(f)
 
         self._pmc_to_sjr = data['pmc_to_sjr']
-        self._pmc_to_journal = data['journals']
-        self._hindex = data['hindex']
-        self._sjr = data['sjr']
+        pmc_to_journal = data['journals']
+        metrics = {'sjr': data['sjr'], 'hindex': data['hindex']}
+
+        # The journals with a metric. Any other journal or publication resolves to the last id, which has no impact
+        self.journals: List[str] = sorted(set(it.chain.from_iterable(metrics.values())))
+        self._unknown = len(self.journals)
+        self._metrics: Dict[str, array] = {
+            name: array('d', it.chain((float(values.get(j, 0.)) for j in self.journals), (0.,)))
+            for name, values in metrics.items()
+        }
+
+        journal_ids = {j: ix for ix, j in enumerate(self.journals)}
+        # Journal names first, so a PMCID of the same name takes precedence, as when matching the PMCIDs first
+        self._ids: Dict[str, int] = dict(journal_ids)
+        for publication, journal in pmc_to_journal.items():
+            self._ids[publication] = journal_ids.get(journal, self._unknown)
+
+    def journal_id(self, publication: str) -> int:
+        """ Journal id of a PMCID or a journal name """
+        return self._ids.get(publication, self._unknown)
+
+    def journal_ids(self, publications: Iterable[str]) -> array:
+        """ Journal ids of a sequence of PMCIDs or journal names """
+        ids, unknown = self._ids, self._unknown
+        return array('I', (ids.get(p, unknown) for p in publications))
+
+    def metric_array(self, metric="sjr") -> array:
+        """ Values of a metric indexed by journal id """
+        if metric not in self._metrics:
+            raise Exception(f"Invalid impact metric: {metric}")
+        return self._metrics[metric]
 
     def get_impact(self, publication:str, metric="sjr") -> float:
-        """ Returns an impact factor metric for a PMCID entry """
-
-        metric = self.__data_for(metric)
+        """ Returns an impact factor metric for a PMCID entry or a journal. If missing, then returns 0 """
+        return self.metric_array(metric)[self.journal_id(publication)]
 
-        # Get the journal for the specific pmcid
-        if publication in self._pmc_to_journal:
-            journal = self._pmc_to_journal[publication]
-            value = metric.get(journal, 0.) # Find the impact for the current journal. If missing, then return 0.
-            return value
-        else:
-            score = metric.get(publication, 0.)
-            return score
+    def get_impacts(self, publications: Iterable[str], metric="sjr") -> array:
+        """ Impact factor metric of each of a sequence of PMCIDs or journals, in a single pass """
+        values = self.metric_array(metric)
+        return array('d', (values[ix] for ix in self.journal_ids(publications)))
 
 
-
-    def __data_for(self, metric):
-        """ Utility method to fetch the appropriate impact metric """
-        if metric == "hindex":
-            return self._hindex
-        if metric == "sjr":
-            return self._sjr
-        else:
-            raise Exception(f"Invalid impact metric: {metric}")
+def first_with_prefix(sorted_keys: Sequence[str], prefix: str) -> Optional[str]:
+    """
+    First key, in sorted order, that starts with the prefix. The keys with a prefix are contiguous in sorted order,
+    starting at the insertion point of the prefix
+    """
+    ix = bisect_left(sorted_keys, prefix)
+    if ix < len(sorted_keys) and sorted_keys[ix].startswith(prefix):
+        return sorted_keys[ix]
+    return None
 
 
 @plac.pos('pmc_file_list', help='Path to the FTP service file list', type=Path)
@@ -82,19 +115,18 @@ def main(pmc_file_list:Path = Path('../data', 'oa_file_list.csv'), rankings_file
     journal_keys = list(sorted(rankings.keys()))
 
     for j in tqdm(pmcoa_journals, desc='Matching journals to rankings', unit='entries'):
-        for key in journal_keys:
-            if key.startswith(j.lower()):
-                maps.append((j, key))
-                data = rankings[key]
-                h = float(data['H index'])
-                s = data['SJR'].replace(',', '.')
-                if s:
-                    s = float(s)
-                else:
-                    s = 0.
-                hindex[j] = h
-                sjr[j] = s
-                break
+        key = first_with_prefix(journal_keys, j.lower())
+        if key is not None:
+            maps.append((j, key))
+            data = rankings[key]
+            h = float(data['H index'])
+            s = data['SJR'].replace(',', '.')
+            if s:
+                s = float(s)
+            else:
+                s = 0.
+            hindex[j] = h
+            sjr[j] = s
 
 
     with open(output_pickle, 'wb') as f:
@@ -1,12 +1,17 @@
 """ Starts the backend """
 
+import gc
 import logging
+import os
+import signal
+import socket
 from argparse import ArgumentParser
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from .dependencies import get_evidence_sentences_and_frequencies
+from .dependencies import get_cli_args, graph_reloader, PinGeneration, startup_preload
+from .admin_api import api_router as admin_api_router
 from .api import api_router
 from .viz_api import api_router as viz_api_router
 
@@ -14,9 +19,6 @@ logger = logging.getLogger("frailty_viz_main")
 
 logger.addHandler(logging.StreamHandler())
 
-# Load the data beforehand. This is necessary because React sometimes refreshes component multiple times when loading for first time. Which runs this function multiple times perallally in different threads (and LRU does not become effective)
-get_evidence_sentences_and_frequencies()
-
 app = FastAPI(title="Frailty Visualization REST API")
 
 app.add_middleware(
@@ -27,5 +29,97 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# All the dependencies of a request come from the same generation of the graph, even if a reload swaps it meanwhile
+app.add_middleware(PinGeneration)
+
 app.include_router(api_router)
 app.include_router(viz_api_router)
+app.include_router(admin_api_router)
+
+
+@app.on_event("startup")
+def preload_data():
+    # Loads in the background, the requests that arrive meanwhile wait for the data they need
+    startup_preload.start()
+
+
+@app.on_event("startup")
+def watch_graph_file():
+    # Started by each worker, threads don't survive the fork
+    interval = get_cli_args().graph_watch_interval
+    if interval > 0:
+        graph_reloader.watch(interval)
+
+
+@app.get("/ready")
+def ready(response: Response):
+    """ Readiness probe. 503 until all the data is loaded """
+    if not startup_preload.ready:
+        response.status_code = 503
+    return startup_preload.status()
+
+
+def preload_shared_state():
+    """
+    Computes all the read-only structures of the API: graph, evidence, entity search tables, blob viz data and impact
+    factors. Done once in the parent process of the workers, so they share them instead of loading their own copy
+    """
+    startup_preload.run()
+    if not startup_preload.ready:
+        raise RuntimeError(f"Failed to load the data: {startup_preload.error}")
+
+
+def serve_prefork(host: str, port: int, workers: int, log_level: str = "info"):
+    """
+    Serves the app with worker processes forked after the data is loaded. The workers share the memory pages of the
+    loaded data, copy-on-write, so the number of workers is not bounded by the size of the data. POSIX only.
+    Unlike uvicorn --workers, which spawns fresh interpreters that load everything again
+    """
+    preload_shared_state()
+    # Each worker would reload on its own, each with its own copy of the new graph and for a while with a different
+    # graph than the others. Until the reloads are coordinated by this process, the workers serve the graph they forked
+    # with, restart them to serve another
+    graph_reloader.disable("The graph isn't reloaded when served with forked workers, restart the server instead")
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+
+    # Keep the garbage collector of the workers from touching, and so copying, the pages of the loaded objects
+    gc.collect()
+    gc.freeze()
+
+    children = list()
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            config = uvicorn.Config(app, host=host, port=port, log_level=log_level)
+            uvicorn.Server(config).run(sockets=[sock])
+            os._exit(0)
+        children.append(pid)
+    logger.info(f"Serving on {host}:{port} with {workers} forked workers: {children}")
+
+    def stop(signum, frame):
+        for child in children:
+            try:
+                os.kill(child, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for child in children:
+        os.waitpid(child, 0)
+    sock.close()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Serves the backend with forked workers that share the loaded data")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1601)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    serve_prefork(args.host, args.port, args.workers, args.log_level)
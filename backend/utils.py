@@ -4,7 +4,8 @@ import itertools as it
 import logging
 import os
 import subprocess
-from typing import List
+from array import array
+from typing import Dict, List, NamedTuple, Optional, Tuple
 import math
 
 from backend.network import SignificanceRow
@@ -12,38 +13,144 @@ from backend.network import SignificanceRow
 logger = logging.getLogger("frailty_viz_utils")
 
 
-def get_global_edge_data(edge, graph, significance):
-    """ Returns a dictionary with significance information for the edge which will go into cytoscape """
-    # Get the paper IDs for this edge
+class EdgeSignificance(NamedTuple):
+    """ Summary of the significance extractions of the papers where an edge was seen """
+    has_significance: bool
+    num_w_significance: int
+    p_values: array
 
-    data = graph[edge[0]][edge[1]][edge[2]]
-    seen_in = set(data['seen_in'])  # Make this a set to avoid double counting
-    summary = {
-        'has_significance': False,
-        'num_w_significance': 0,
-        # 'impact_factors': data['impact_factors'],
-        'p_values': list(),
-    }
-    for paper_id in seen_in:
+    def to_dict(self) -> dict:
+        """ The dictionary with significance information for the edge which will go into cytoscape """
+        return {
+            'has_significance': self.has_significance,
+            'num_w_significance': self.num_w_significance,
+            'p_values': self.p_values.tolist(),
+        }
+
+
+NO_SIGNIFICANCE = EdgeSignificance(False, 0, array('d'))
+
+
+def parse_p_values(significance_detections: List[SignificanceRow]) -> List[float]:
+    """ The p-values among the significance extractions of a paper, skipping those that aren't numbers """
+    p_values = list()
+    for detection in significance_detections:
+        if detection.type_.strip() == "p":
+            try:
+                val = float(detection.value.strip().strip('='))
+            except ValueError as ex:
+                # logger.exception(ex)
+                # TODO pipe this to a file
+                pass
+            else:
+                p_values.append(val)
+    return p_values
+
+
+def summarize_significance(seen_in, significance, paper_p_values: Optional[Dict] = None) -> EdgeSignificance:
+    """
+    Significance summary of an edge seen in the given papers. paper_p_values memoizes the parsed p-values of each
+    paper across edges
+    """
+    if paper_p_values is None:
+        paper_p_values = dict()
+    has_significance, num_w_significance, p_values = False, 0, array('d')
+    for paper_id in set(seen_in):  # Make this a set to avoid double counting
         # Fetch the significance extractions
         significance_detections: List[SignificanceRow] = significance.get(paper_id, [])
         if len(significance_detections) > 0:
-            summary['has_significance'] = True
-            summary['num_w_significance'] += 1
+            has_significance = True
+            num_w_significance += 1
+            if paper_id not in paper_p_values:
+                paper_p_values[paper_id] = parse_p_values(significance_detections)
+            p_values.extend(paper_p_values[paper_id])
+    if not has_significance:
+        return NO_SIGNIFICANCE
+    return EdgeSignificance(has_significance, num_w_significance, p_values)
+
+
+def summarize_edges_significance(graph, significance) -> List[EdgeSignificance]:
+    """ Significance summary of every edge of the compact graph, by edge id """
+    paper_p_values = dict()
+    return [summarize_significance(graph.edge_seen_in[edge].tolist(), significance, paper_p_values)
+            for edge in range(graph.number_of_edges())]
+
+
+class PairAggregate(NamedTuple):
+    """ Weight terms of the edges from an entity to another """
+    percentage_significance: float
+    has_significance: int
+    avg_impact: float
+    max_impact: float
+    avg_pvalue: float
+    num_papers: int
+
+
+def aggregate_pair(graph, pair: int, edge_significance: List[EdgeSignificance]) -> PairAggregate:
+    """ Aggregates the significance, impact factors and papers of the parallel edges of a pair of the compact graph """
+    has_sig = False
+    avg_sig = 0.
+    impacts = list()
+    p_vals = list()
+    max_impact = 0.
+    seen_in = set()
+
+    for edge in graph.pair_edges(pair):
+        doc_data = edge_significance[edge]
+        impact_factors = graph.edge_impact_factors[edge].tolist()
+        has_sig |= doc_data.has_significance
+        avg_sig += doc_data.num_w_significance
+        impacts += impact_factors
+        p_vals += doc_data.p_values
+        seen_in.update(graph.edge_seen_in[edge].tolist())
+        for impact in impact_factors:
+            if impact > max_impact:
+                max_impact = impact
+
+    # Every edge has at least an impact factor, one per row it was extracted from
+    avg_impact = sum(impacts) / len(impacts) if impacts else 0.
+    avg_sig = avg_sig / len(impacts) if impacts else 0.
+    avg_p_value = (sum(p_vals) / len(p_vals)) if len(p_vals) > 0 else 1.
 
-        # Get the p-values and the correlations
-        for detection in significance_detections:
-            if detection.type_.strip() == "p":
-                try:
-                    val = float(detection.value.strip().strip('='))
-                except ValueError as ex:
-                    # logger.exception(ex)
-                    # TODO pipe this to a file
-                    pass
-                else:
-                    summary['p_values'].append(val)
+    return PairAggregate(avg_sig, int(has_sig), avg_impact, max_impact, avg_p_value, len(seen_in))
 
-    return summary
+
+class OverviewTable(NamedTuple):
+    """
+    Weight terms of each pair of entities of the compact graph, by pair id, and the neighbors of each entity
+    classified into reciprocals, influenced and influencers. The neighbors are (id, label, frequency, weight terms),
+    sorted by label
+    """
+    pairs: List[PairAggregate]
+    neighbors: Dict[str, Tuple[List[tuple], List[tuple], List[tuple]]]
+
+
+def build_overview_table(graph, frequencies, edge_significance: List[EdgeSignificance]) -> OverviewTable:
+    """ Precomputes the overview of every entity of the compact graph """
+    pairs = [aggregate_pair(graph, pair, edge_significance) for pair in range(graph.number_of_pairs())]
+
+    def entry(r, pair):
+        return r, graph.node_label(r), frequencies.get(frozenset(graph.pair_endpoints(pair)), 0), pairs[pair]
+
+    def by_label(entries):
+        return sorted(entries, key=lambda x: (x[1].lower(), x[0]))
+
+    neighbors = dict()
+    for term in graph.nodes:
+        # Neighbor -> the pair with the term
+        successors = {graph.node_ids[graph.pair_dst[p]]: p for p in graph.out_pairs(term)}
+        predecessors = {graph.node_ids[graph.pair_src[p]]: p for p in graph.in_pairs_of(term).tolist()}
+
+        reciprocals = successors.keys() & predecessors.keys()
+        influenced = successors.keys() - reciprocals
+        influencers = predecessors.keys() - reciprocals
+
+        labeled = lambda rs: (r for r in rs if graph.node_label(r) is not None)
+        neighbors[term] = (by_label(entry(r, successors[r]) for r in labeled(reciprocals)),
+                           by_label(entry(r, successors[r]) for r in labeled(influenced)),
+                           by_label(entry(r, predecessors[r]) for r in labeled(influencers)))
+
+    return OverviewTable(pairs, neighbors)
 
 
 def get_git_revision_hash(path: str) -> str:
@@ -55,7 +162,19 @@ def get_git_revision_hash(path: str) -> str:
 
 
 def md5_hash(path: str) -> str:
-    return hashlib.md5(open(path, 'rb').read()).hexdigest()
+    """ MD5 of a file. For a directory, like the columnar graph artifact, of the names and contents of its files """
+    md5 = hashlib.md5()
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            md5.update(name.encode())
+            with open(os.path.join(path, name), 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    md5.update(chunk)
+    else:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                md5.update(chunk)
+    return md5.hexdigest()
 
 
 # Deprecated
@@ -154,17 +273,26 @@ def convert2cytoscapeJSON(G, label_field="polarity"):
     final += (edges + cluster_edges)
     return final
 
+# Coefficients of the weight formula, in the order of the terms returned by weight_terms
+WEIGHT_COEFFICIENTS = ('frequency', 'hasSignificance', 'avgImpactFactor', 'maxImpactFactor', 'pValue')
+
+
+def weight_terms(meta) -> Tuple[float, float, float, float, float]:
+    """ Values of the terms of the weight formula for an edge, see documentation/weighting.md """
+    return (math.log((meta['freq']) + 1),
+            (meta['has_significance'] if 'has_significance' in meta else 0.0),
+            (sum(meta['impact_factors'])/len(meta['impact_factors'])),
+            max(meta['impact_factors']),
+            (1 - (1 if len(meta['p_values']) == 0 else (sum(meta['p_values'])/len(meta['p_values'])))))
+
+
 def calculateWeight(meta, coefficients):
-    frequency = coefficients['frequency']
-    hasSignificance = coefficients['hasSignificance']
-    avgImpactFactor = coefficients['avgImpactFactor']
-    maxImpactFactor = coefficients['maxImpactFactor']
-    pValue = coefficients['pValue']
-
-    weight = math.log((meta['freq']) + 1) * frequency + \
-        (meta['has_significance'] if 'has_significance' in meta else 0.0) * hasSignificance + \
-        (sum(meta['impact_factors'])/len(meta['impact_factors'])) * avgImpactFactor + \
-        max(meta['impact_factors']) * maxImpactFactor + \
-        (1 - (1 if len(meta['p_values']) == 0 else (sum(meta['p_values'])/len(meta['p_values'])))) * pValue
+    frequency, hasSignificance, avgImpactFactor, maxImpactFactor, pValue = weight_terms(meta)
+
+    weight = frequency * coefficients['frequency'] + \
+        hasSignificance * coefficients['hasSignificance'] + \
+        avgImpactFactor * coefficients['avgImpactFactor'] + \
+        maxImpactFactor * coefficients['maxImpactFactor'] + \
+        pValue * coefficients['pValue']
 
     return weight
@@ -1,18 +1,19 @@
-from functools import lru_cache
+import heapq
 from typing import NamedTuple
 
 from fastapi import APIRouter, Depends
 
 import difflib
 
-import networkx as nx
+import numpy as np
 
-from networkx import MultiDiGraph, DiGraph
-from backend.utils import calculateWeight, convert2cytoscapeJSON, get_global_edge_data
-import itertools
+from backend.utils import convert2cytoscapeJSON
 
 # Data loading and preprocessing
-from .dependencies import get_graph, get_significance
+from .compact_graph import CompactGraph
+from .dependencies import generation_cache, get_edge_weights, get_graph
+from .edge_weights import EdgeWeights
+from .neighbor_index import NeighborIndex
 
 # Auxiliary data and data structures
 from .models import CategoryCount, NodesList, Weights
@@ -60,38 +61,35 @@ def get_category_number_from_id(node_id):
     return category_encoding_rev[get_category_name_from_id(node_id)]
 
 
+def category_number_or_default(node_id):
+    """ Like get_category_number_from_id, without reporting the ids of unknown categories """
+    return category_encoding_rev[categories.get(node_id.split(':')[0].lower(), categories["go"])]
+
+
 class PreprocessedVizData(NamedTuple):
     max_frequency: int
-    graph_se: DiGraph
-    reversed_graph: DiGraph
+    graph: CompactGraph
+    # Sum of the frequencies of the parallel edges of each pair of the graph, by pair id
+    pair_freqs: np.ndarray
+    neighbor_index: NeighborIndex
 
 
-@lru_cache()
+@generation_cache
 def get_blob_graph() -> PreprocessedVizData:
     """ Dependency injector for the data of the blob viz API """
 
-    # Creating no-self-loop and singly-graph variants
-    G_no_selfloop = get_graph()
-    # G_no_selfloop.remove_edges_from(nx.selfloop_edges(G_no_selfloop))
-    G_se = nx.DiGraph()
-    G_se.add_nodes_from(G_no_selfloop.nodes.data())
-    edges = {
-        (u, v): 0 for u, v, i in G_no_selfloop.edges
-    }
-    for i, (u, v, d) in enumerate(G_no_selfloop.edges.data()):
-        if 'freq' in d:
-            edges[(u, v)] += d['freq']
-        else:
-            edges[(u, v)] += 1
-    for k, v in edges.items():
-        G_se.add_edge(k[0], k[1], freq=v)
+    # The pairs of the graph are the edges of its simple graph variant
+    graph = get_graph()
+    pair_freqs = np.add.reduceat(graph.edge_freq, graph.pair_offsets[:-1], dtype=np.int64) if graph.number_of_edges() \
+        else np.zeros(0, dtype=np.int64)
 
-    max_freq = max([d[2]['freq'] for d in G_se.edges.data()])
+    max_freq = int(pair_freqs.max())
 
-    # Reverse graph: To calculate incident edges of X
-    G_se_rev = G_se.reverse()
+    # The empty id isn't a valid out neighbor
+    neighbor_index = NeighborIndex.from_graph(graph, pair_freqs, category_number_or_default,
+                                              max(category_encoding) + 1, skip_target='')
 
-    return PreprocessedVizData(max_freq, G_se, G_se_rev)
+    return PreprocessedVizData(max_freq, graph, pair_freqs, neighbor_index)
 
 
 # Router, to be exposed by the API entry point
@@ -125,69 +123,71 @@ async def get_best_subgraph(nodes: NodesList, category_count: CategoryCount,
     }
     """
 
-    max_freq, G_se, G_se_rev = data
+    max_freq, graph, pair_freqs, index = data
 
     nodes = nodes.nodes
     category_count = category_count.categorycount
+    excluded = {index.node_index[node] for node in nodes if node in index.node_index}
 
     catFinalList = {}
     for cat_id, cat_count in category_count.items():
-        finalList = [{
+        search_space = {node: {
             'id': node,
             'freq': max_freq + 1,
             'pinned': True,
             'total_search_freq': float('inf')
-        } for node in nodes if get_category_number_from_id(node) == cat_id]
-        search_space = finalList
+        } for node in nodes if get_category_number_from_id(node) == cat_id}
         for node in nodes:
-            neighbors = list(map(lambda d: {
-                'id': d[0],
-                'freq': d[1]['freq'],
-                'pinned': False
-            }, filter(lambda x: x[0] != '' and get_category_number_from_id(x[0]) == cat_id and x[0] not in nodes, dict(G_se[node]).items())))
-            to_neighbors = sorted(neighbors, key=lambda x: x['freq'], reverse=True)[:cat_count]
-
-            neighbors = list(map(lambda d: {
-                'id': d[0],
-                'freq': d[1]['freq'],
-                'pinned': False
-            }, filter(lambda x: get_category_number_from_id(x[0]) == cat_id and x[0] not in nodes, dict(G_se_rev[node]).items())))
-            from_neighbors = sorted(neighbors, key=lambda x: x['freq'], reverse=True)[:cat_count]
-
-            all_neighbors = to_neighbors + from_neighbors
-
-            for neighbor in (to_neighbors + from_neighbors):
-                for search_space_item in search_space:
-                    if search_space_item['id'] == neighbor['id']:
-                        search_space_item['total_search_freq'] += neighbor['freq']
-                        break
+            if node not in index.node_index:
+                continue
+            node_id = index.node_index[node]
+            to_neighbors = index.top(node_id, cat_id, cat_count, excluded)
+            from_neighbors = index.top(node_id, cat_id, cat_count, excluded, incoming=True)
+
+            for neighbor_id, freq in (to_neighbors + from_neighbors):
+                neighbor = index.nodes[neighbor_id]
+                if neighbor in search_space:
+                    search_space[neighbor]['total_search_freq'] += freq
                 else:
-                    neighbor['total_search_freq'] = neighbor['freq']
-                    search_space.append(neighbor)
-
-        catFinalList[cat_id] = sorted(search_space, key=lambda x: x['total_search_freq'], reverse=True)[:cat_count]
-
-    finalNodes = []
-    for v in catFinalList.values():
-        finalNodes += v
-
-    subgraph = G_se.subgraph(map(lambda x: x['id'], finalNodes))
+                    search_space[neighbor] = {
+                        'id': neighbor,
+                        'freq': freq,
+                        'pinned': False,
+                        'total_search_freq': freq
+                    }
+
+        # Same as sorting decreasingly and slicing, ties keep the order of the search space
+        catFinalList[cat_id] = heapq.nlargest(cat_count, search_space.values(), key=lambda x: x['total_search_freq'])
+
+    pinned = {d['id']: d['pinned'] for v in catFinalList.values() for d in v}
+
+    # The induced subgraph
+    selected = [node for node in pinned if node in graph]
+    member = np.zeros(graph.number_of_nodes(), dtype=np.bool_)
+    member[[graph.node_index[node] for node in selected]] = True
+    links = list()
+    for u in selected:
+        pairs = graph.out_pairs(u)
+        for pair in (pairs.start + np.flatnonzero(member[graph.pair_dst[pairs.start:pairs.stop]])).tolist():
+            links.append((u, graph.node_ids[graph.pair_dst[pair]], int(pair_freqs[pair])))
+
+    def category(node_id):
+        return int(index.categories[index.node_index[node_id]])
 
     return {
         'nodes': list(map(lambda x: {
             'id': x[0],
-            'category': get_category_number_from_id(x[0]),
+            'category': category(x[0]),
             'label': d['label'] if 'label' in (d := x[1]) else x[0],
-            'pinned': next(filter(lambda d: d['id'] == x[0], catFinalList[get_category_number_from_id(x[0])]))[
-                'pinned'],
-            'degree': G_se.degree(x[0])
-        }, subgraph.nodes.data())),
+            'pinned': pinned[x[0]],
+            'degree': graph.degree(x[0], parallel=False)
+        }, ((node, graph.node_data(node)) for node in selected))),
         'links': list(map(lambda x: {
             'source': x[0],
             'target': x[1],
-            'freq': x[2]['freq'] if 'freq' in x[2] else 1,
-            'samecategory': get_category_number_from_id(x[0]) == get_category_number_from_id(x[1])
-        }, subgraph.edges.data())),
+            'freq': x[2],
+            'samecategory': category(x[0]) == category(x[1])
+        }, links)),
     }
 
 
@@ -217,61 +217,23 @@ async def get_best_subgraph(nodes: NodesList, category_count: CategoryCount,
 #         "matches": ret
 #     }
 
-def interaction(source, destination, bidirectional: bool, graph: MultiDiGraph = get_graph(),
-                      significance=get_significance()):
-    # Find the shortest path between source and destination
-    path = nx.shortest_path(graph, source, destination)
-    valid_edges = set(zip(path, path[1:]))
-    subgraph = graph.subgraph(path)
-
-    edges = list(
-        sorted((e for e in subgraph.edges if bidirectional or (e[0], e[1]) in valid_edges), key=lambda e: (e[0], e[1])))
-    grouped_edges = itertools.groupby(edges, key=lambda e: (e[0], e[1]))
-
-    discarded = set()
-
-    for group, subset in grouped_edges:
-        subset = list(subset)
-        subset.sort(key=lambda e: sum(v for k, v in subgraph.get_edge_data(*e).items() if k == 'freq'), reverse=True)
-
-    # Add the significance data here
-    new_edges = list()
-    for e in edges:
-        if e not in discarded:
-            x = (*e, dict(**subgraph.get_edge_data(*e), **get_global_edge_data(e, graph, significance)))
-            new_edges.append(x)
-    # new_edges = [(*e, dict(**subgraph.get_edge_data(*e), **get_global_edge_data(e))) for e in subgraph.edges if e in edges and e not in discarded]
-
-    new_g = nx.MultiDiGraph()
-    # new_g.add_nodes_from(set(it.chain.from_iterable((e[0], e[1]) for e in new_edges)))
-    new_nodes = list()
-
-    for e in new_edges:
-        new_nodes.append((e[0], subgraph.nodes[e[0]]))
-        new_nodes.append((e[1], subgraph.nodes[e[1]]))
-    # new_nodes = set(it.chain.from_iterable((n, subgraph.nodes[n]) for n in e for e in new_edges))
-    new_g.add_nodes_from(list(new_nodes))
-    new_g.add_edges_from(new_edges)
-
-    new_g.remove_edges_from(discarded)
-
-    return new_g
-
-
 @api_router.post("/noderadius")
-async def node_radius(nodes: NodesList, weights: Weights, data: PreprocessedVizData = Depends(get_blob_graph)):
-    nodes = nodes.nodes
-    weights = weights.weights
-    _, G_se, _ = data
-    subgraph = G_se.subgraph(nodes)
-
-    node_weights = {node:0 for node in nodes}
-
-    for edge in subgraph.edges(data=True):
-        edge_interactions = interaction(edge[0], edge[1], True)
+async def node_radius(nodes: NodesList, weights: Weights, edge_weights: EdgeWeights = Depends(get_edge_weights)):
+    """ Sum of the weights of the edges between each node and the rest of the nodes, in both directions """
+    return edge_weights.node_weights(nodes.nodes, weights.weights)
 
-        calculatedWeights = sum([calculateWeight(edge[2], weights) for edge in edge_interactions.edges(data=True)])
-        node_weights[edge[0]] += calculatedWeights
-        node_weights[edge[1]] += calculatedWeights
 
-    return node_weights
\ No newline at end of file
+@api_router.post("/topweights")
+async def top_weights(weights: Weights, k: int = 10, pairs: bool = False, normalized: bool = True,
+                      edge_weights: EdgeWeights = Depends(get_edge_weights)):
+    """
+    The k heaviest edges by the weight formula with the given coefficients. With pairs, the k heaviest pairs of
+    entities by the sum of the weights of their edges. With normalized, each term of the formula is scaled to [0, 1]
+    """
+    coefficients = weights.weights
+    if pairs:
+        return [{'source': u, 'target': v, 'weight': weight}
+                for (u, v), weight in edge_weights.top_pairs(coefficients, k, normalized)]
+    else:
+        return [{'source': u, 'target': v, 'key': key, 'weight': weight}
+                for (u, v, key), weight in edge_weights.top_edges(coefficients, k, normalized)]
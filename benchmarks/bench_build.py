@@ -0,0 +1,119 @@
+"""
+Benchmarks the stages of build_network on synthetic corpora of increasing size. Run from the repository root with
+PYTHONPATH=.:backend, as build_network imports the rankings module of the backend directory
+"""
+import glob
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+
+import plac
+
+from backend import build_network
+from backend.build_network import EventResolutionTable, PmcidIndex, UniprotIndex, cached_document_resolver, \
+    compact_row, decompose_complex, parse_files, parse_xdd_blibliography, scan_rows
+from backend.build_profile import BuildProfile
+from benchmarks.synthetic_corpus import SyntheticCorpus, generate_corpus, parse_scale
+
+
+def corpus_for(corpora_dir: Path, num_rows: int, seed: int) -> SyntheticCorpus:
+    """ Generates the corpus of a scale, or reuses the one generated by a previous run with the same arguments """
+    path = corpora_dir / f"rows-{num_rows}-seed-{seed}"
+    info_path = path / "corpus.json"
+    if info_path.exists():
+        with info_path.open() as f:
+            info = json.load(f)
+        return SyntheticCorpus(**{k: Path(v) if isinstance(v, str) else v for k, v in info.items()})
+    corpus = generate_corpus(path, num_rows, seed=seed)
+    with info_path.open('w') as f:
+        json.dump(corpus._asdict(), f, default=str)
+    return corpus
+
+
+def bench_scale(corpus: SyntheticCorpus, workers: int, repeat: int, output_dir: Path) -> dict:
+    """ Times parse_files, decompose_complex, the event resolution and the whole build on a corpus """
+    profile = BuildProfile()
+    paths = sorted(glob.glob(os.path.join(corpus.tsv_dir, "*.tsv")))
+    bibliography = parse_xdd_blibliography(corpus.bibliography)
+    dois = {metadata.doi for metadata in bibliography.values() if metadata.doi}
+    with PmcidIndex(corpus.pmcid_map) as pmcid_index:
+        doi2pmcid = pmcid_index.lookup_many(dois)
+
+    for _ in range(repeat):
+        with profile.stage('parse_files') as counts:
+            parsed = parse_files(paths, bibliography, workers)
+            counts.update(files=len(paths), rows=len(parsed))
+    rows = list(map(compact_row, parsed))
+    del parsed
+
+    participants = [p for row in rows for p in (row.input, row.output, row.controller) if p != 'NONE']
+    for _ in range(repeat):
+        with profile.stage('decompose_complex') as counts:
+            decomposed = sum(1 for p in participants for _ in decompose_complex([p]))
+            counts.update(participants=len(participants), decomposed=decomposed)
+
+    with UniprotIndex(corpus.uniprot) as uniprot_names:
+        scan = scan_rows(rows, bibliography, doi2pmcid, uniprot_names)
+    document_of = cached_document_resolver(bibliography, doi2pmcid)
+    for _ in range(repeat):
+        with profile.stage('resolve') as counts:
+            events = EventResolutionTable(scan.dataset_inputs, scan.dataset_outputs)
+            resolved, failed = 0, 0
+            for row in rows:
+                try:
+                    paper = document_of(row.seen_in)
+                except KeyError:
+                    paper = None  # Not in the bibliography
+                for eid, col in ((row.input, 'INPUT'), (row.output, 'OUTPUT'), (row.controller, 'CONTROLLER')):
+                    try:
+                        events.resolve(eid, col, paper)
+                        resolved += 1
+                    except Exception:
+                        failed += 1
+            counts.update(events=len(scan.dataset_outputs), resolved=resolved, failed=failed)
+    del rows, participants, scan
+
+    output_file = output_dir / f"graph-{corpus.rows}.pickle"
+    for _ in range(repeat):
+        with profile.stage('build_network.main'):
+            plac.call(build_network.main, [str(output_file), '-i', str(corpus.impact_factors),
+                                           '-b', str(corpus.bibliography), '-u', str(corpus.uniprot),
+                                           '-p', str(corpus.pmcid_map), '-w', str(workers), str(corpus.tsv_dir)])
+    # The stage breakdown of the last build
+    with output_file.with_name(output_file.stem + '.profile.json').open() as f:
+        build_report = json.load(f)
+
+    return {'rows': corpus.rows, 'papers': corpus.papers, 'stages': profile.stages, 'build_network': build_report}
+
+
+@plac.opt('scales', 'Comma separated numbers of rows, with optional k or M suffix', type=str)
+@plac.opt('corpora_dir', 'Directory to keep the generated corpora between runs. Defaults to a temporary directory',
+          type=Path)
+@plac.opt('workers', 'Number of processes used to parse the arizona files', type=int)
+@plac.opt('repeat', 'Number of timing repetitions of each stage', type=int)
+@plac.opt('output_path', 'Json file for the results', type=Path)
+@plac.opt('seed', 'Random seed of the corpora', type=int, abbrev='S')
+def main(scales: str = "10k,100k,1M", corpora_dir: Optional[Path] = None, workers: int = 1, repeat: int = 1,
+         output_path: Optional[Path] = None, seed: int = 0):
+    with tempfile.TemporaryDirectory() as tmp:
+        corpora_dir = corpora_dir or Path(tmp)
+        results: List[dict] = list()
+        for num_rows in map(parse_scale, scales.split(',')):
+            corpus = corpus_for(corpora_dir, num_rows, seed)
+            result = bench_scale(corpus, workers, repeat, Path(tmp))
+            results.append(result)
+
+            print(f"{result['rows']:,} rows, {result['papers']:,} papers")
+            for name in dict.fromkeys(s['name'] for s in result['stages']):
+                best = min(s['wall_seconds'] for s in result['stages'] if s['name'] == name)
+                print(f"  {name}: {best:.3f}s ({result['rows'] / best:,.0f} rows/s)")
+
+    if output_path:
+        with output_path.open('w') as f:
+            json.dump({'workers': workers, 'repeat': repeat, 'seed': seed, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    plac.call(main)
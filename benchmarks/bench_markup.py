@@ -0,0 +1,75 @@
+""" Benchmarks the evidence markup extraction against the HTML parser it replaces, and checks they agree """
+import pickle
+import random
+import re
+import timeit
+from pathlib import Path
+from typing import List, Optional
+
+import plac
+
+from evidence_index.markup import EvidenceParser, MarkupStripper, parse_evidence_markups, strip_markups
+
+space_remover = re.compile(r'\s+')
+
+
+def synthetic_markups(num: int, seed: int = 0) -> List[str]:
+    """ Sentences with the markup of the arizona output """
+    rnd = random.Random(seed)
+    words = ["frailty", "is", "associated", "with", "the", "levels", "of", "IL-6", "in", "older", "adults", "&amp;",
+             "p < 0.05", "(n = 120)", "TNF-alpha", "muscle", "strength"]
+    labels = ["Positive_activation", "Negative_activation", "Activation", "Positive_association", "Association"]
+    markups = list()
+    for _ in range(num):
+        controller = ' '.join(rnd.choices(words, k=2))
+        controlled = ' '.join(rnd.choices(words, k=2))
+        markups.append(f'{" ".join(rnd.choices(words, k=rnd.randint(3, 15)))} '
+                       f'<span class="controller">{controller}</span>  '
+                       f'<span class="event {rnd.choice(labels)}">increases</span>\n'
+                       f'<span class="controlled">{controlled}</span> {" ".join(rnd.choices(words, k=rnd.randint(3, 15)))}.')
+    return markups
+
+
+def graph_markups(graph_path: Path) -> List[str]:
+    """ Evidence markup of the edges of a graph built by build_network """
+    with graph_path.open('rb') as f:
+        graph = pickle.load(f)['graph']
+    return [markup for _, _, data in graph.edges(data=True) for _, _, markup in data['evidence']]
+
+
+def html_parser_markups(markups):
+    ret = list()
+    for m in markups:
+        parser = EvidenceParser(m)
+        ret.append((parser.raw_sentence, parser.event_type))
+    return ret
+
+
+def html_parser_raw_sentences(markups):
+    return [space_remover.sub(' ', MarkupStripper(m).raw_sentence.strip()) for m in markups]
+
+
+@plac.opt('graph_path', 'Graph pickle to take the evidence from. Synthetic markup is used if missing', type=Path)
+@plac.opt('num', 'Number of synthetic sentences', type=int)
+@plac.opt('repeat', 'Number of timing repetitions', type=int)
+def main(graph_path: Optional[Path] = None, num: int = 100_000, repeat: int = 3):
+    markups = graph_markups(graph_path) if graph_path else synthetic_markups(num)
+    print(f"{len(markups)} evidence sentences")
+
+    assert parse_evidence_markups(markups) == html_parser_markups(markups), "Different raw sentences or event types"
+    assert strip_markups(markups, normalize_spaces=True) == html_parser_raw_sentences(markups), \
+        "Different de-duplication keys"
+
+    cases = [
+        ("raw sentence and event type, HTMLParser", lambda: html_parser_markups(markups)),
+        ("raw sentence and event type, parse_evidence_markups", lambda: parse_evidence_markups(markups)),
+        ("de-duplication key, HTMLParser", lambda: html_parser_raw_sentences(markups)),
+        ("de-duplication key, strip_markups", lambda: strip_markups(markups, normalize_spaces=True)),
+    ]
+    for name, fn in cases:
+        best = min(timeit.repeat(fn, number=1, repeat=repeat))
+        print(f"{name}: {best:.3f}s ({len(markups) / best:,.0f} sentences/s)")
+
+
+if __name__ == '__main__':
+    plac.call(main)
@@ -0,0 +1,106 @@
+"""
+Benchmarks /viz_api/noderadius on views of a graph built by build_network, against the computation it replaces that
+weighs the edges of a shortest path subgraph for every edge of the view. Checks that both agree
+"""
+import math
+import os
+import random
+import timeit
+from pathlib import Path
+from typing import List
+
+import networkx as nx
+import plac
+
+from backend.utils import calculateWeight, summarize_edges_significance
+
+WEIGHTS = {'frequency': 1., 'hasSignificance': .5, 'avgImpactFactor': .3, 'maxImpactFactor': .2, 'pValue': .1}
+
+
+def interaction(source: str, destination: str, graph: nx.MultiDiGraph, edge_significance: dict) -> nx.MultiDiGraph:
+    """ The edges in both directions of the shortest path between the entities, with their significance """
+    path = nx.shortest_path(graph, source, destination)
+    subgraph = graph.subgraph(path)
+    edges = sorted(subgraph.edges, key=lambda e: (e[0], e[1]))
+    new_g = nx.MultiDiGraph()
+    new_g.add_nodes_from([(n, subgraph.nodes[n]) for e in edges for n in e[:2]])
+    new_g.add_edges_from((*e, dict(**subgraph.get_edge_data(*e), **edge_significance[e].to_dict())) for e in edges)
+    return new_g
+
+
+def node_radius_by_paths(nodes: List[str], weights: dict, graph: nx.MultiDiGraph, graph_se: nx.DiGraph,
+                         edge_significance: dict) -> dict:
+    """ The previous /viz_api/noderadius, over the networkx graph """
+    subgraph = graph_se.subgraph(nodes)
+    node_weights = {node: 0 for node in nodes}
+    for edge in subgraph.edges(data=True):
+        edge_interactions = interaction(edge[0], edge[1], graph, edge_significance)
+        calculated_weights = sum([calculateWeight(e[2], weights) for e in edge_interactions.edges(data=True)])
+        node_weights[edge[0]] += calculated_weights
+        node_weights[edge[1]] += calculated_weights
+    return node_weights
+
+
+def blob_views(graph_se, num: int, size: int, seed: int) -> List[List[str]]:
+    """ Connected sets of nodes like the ones of the blob viz, grown breadth first from random nodes """
+    rnd = random.Random(seed)
+    nodes = sorted(graph_se.nodes)
+    views = list()
+    for _ in range(num):
+        view = dict.fromkeys([rnd.choice(nodes)])
+        frontier = list(view)
+        while frontier and len(view) < size:
+            node = frontier.pop(0)
+            for neighbor in sorted(set(graph_se.successors(node)) | set(graph_se.predecessors(node))):
+                if neighbor not in view and len(view) < size:
+                    view[neighbor] = None
+                    frontier.append(neighbor)
+        views.append(list(view))
+    return views
+
+
+@plac.pos('graph_file', 'Graph pickle or columnar artifact built by build_network', type=Path)
+@plac.pos('impact_factors', 'Journal rankings pickle the graph was built with', type=Path)
+@plac.opt('num_views', 'Number of views to weigh', type=int)
+@plac.opt('view_size', 'Number of nodes of each view', type=int)
+@plac.opt('repeat', 'Number of timing repetitions', type=int)
+@plac.opt('seed', 'Random seed of the views', type=int, abbrev='S')
+def main(graph_file: Path, impact_factors: Path, num_views: int = 20, view_size: int = 100, repeat: int = 3,
+         seed: int = 0):
+    # The backend dependencies read their settings from the environment
+    os.environ.update(GRAPH_FILE=str(graph_file), IMPACT_FACTORS=str(impact_factors))
+    os.environ.setdefault('RECORDS_DB', 'records.db')
+    os.environ.setdefault('ES_INDEX', '')
+    from backend.dependencies import get_edge_weights, get_graph, get_significance
+
+    # The networkx graph and its simple graph variant the previous implementation ran on
+    compact_graph = get_graph()
+    graph = compact_graph.to_networkx()
+    graph_se = nx.DiGraph(graph)
+    edge_significance = dict(zip(compact_graph.edges(), summarize_edges_significance(compact_graph,
+                                                                                     get_significance())))
+    edge_weights = get_edge_weights()
+    views = blob_views(graph_se, num_views, view_size, seed)
+    num_edges = sum(graph_se.subgraph(view).number_of_edges() for view in views)
+    print(f"{len(views)} views of {view_size} nodes, {num_edges / len(views):,.0f} edges per view")
+
+    for view in views:
+        expected = node_radius_by_paths(view, WEIGHTS, graph, graph_se, edge_significance)
+        actual = edge_weights.node_weights(view, WEIGHTS)
+        assert expected.keys() == actual.keys() and \
+               all(math.isclose(expected[n], actual[n], rel_tol=1e-12) for n in view), "Different node weights"
+
+    cases = [
+        ("shortest path subgraphs",
+         lambda: [node_radius_by_paths(view, WEIGHTS, graph, graph_se, edge_significance) for view in views]),
+        ("precomputed pair weights", lambda: [edge_weights.node_weights(view, WEIGHTS) for view in views]),
+    ]
+    timings = dict()
+    for name, fn in cases:
+        timings[name] = min(timeit.repeat(fn, number=1, repeat=repeat)) / len(views)
+        print(f"{name}: {timings[name] * 1000:.3f}ms per view")
+    print(f"speedup: {timings['shortest path subgraphs'] / timings['precomputed pair weights']:,.0f}x")
+
+
+if __name__ == '__main__':
+    plac.call(main)
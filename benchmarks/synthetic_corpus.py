@@ -0,0 +1,247 @@
+""" Generates a synthetic corpus of Arizona output files, with the auxiliary files needed by build_network """
+import csv
+import itertools as it
+import json
+import pickle
+import random
+import string
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+import plac
+from tqdm import tqdm
+
+# Arizona output columns, in the order of the real files
+COLUMNS = ["INPUT", "OUTPUT", "CONTROLLER", "EVENT ID", "EVENT LABEL", "NEGATED", "TRIGGERS", "SEEN", "EVIDENCE",
+           "SEEN IN"]
+
+# Share of the entities of each namespace and a factory of their ids
+NAMESPACES = [
+    ("uniprot", 50, lambda r: f"uniprot:{r.choice('PQO')}{r.randint(10000, 99999)}"),
+    ("mesh", 15, lambda r: f"mesh:D{r.randint(0, 999999):06d}"),
+    ("go", 12, lambda r: f"go:GO:{r.randint(0, 9999999):07d}"),
+    ("pubchem", 7, lambda r: f"pubchem:{r.randint(1, 9999999)}"),
+    ("chebi", 5, lambda r: f"chebi:CHEBI:{r.randint(1, 99999)}"),
+    ("fplx", 4, lambda r: f"fplx:{_word(r).upper()}"),
+    ("uberon", 2, lambda r: f"uberon:UBERON:{r.randint(0, 9999999):07d}"),
+    ("cl", 2, lambda r: f"cl:CL:{r.randint(0, 9999999):07d}"),
+    ("uaz", 3, lambda r: f"uaz:UAZ{r.randint(0, 99999):05d}"),  # Ad hoc entities, discarded by the build
+]
+
+CONTROLLED_LABELS = ["Positive_activation", "Negative_activation", "Activation"]
+ASSOCIATION_LABELS = ["Positive_association", "Negative_association", "Association"]
+TRIGGERS = ["increases", "decreases", "promotes", "inhibits", "induces", "reduces", "associated", "correlated",
+            "regulates", "enhances"]
+FILLER = ["frailty", "is", "in", "the", "levels", "of", "older", "adults", "were", "significantly", "&amp;",
+          "muscle", "strength", "p < 0.05", "(n = 120)", "serum", "with", "and", "patients", "cohort"]
+
+
+class SyntheticCorpus(NamedTuple):
+    """ Paths of a generated corpus, ready to be passed to build_network.main """
+    tsv_dir: Path
+    bibliography: Path
+    pmcid_map: Path
+    uniprot: Path
+    impact_factors: Path
+    rows: int
+    papers: int
+
+
+def _word(rnd: random.Random) -> str:
+    return ''.join(rnd.choices(string.ascii_lowercase, k=rnd.randint(3, 9)))
+
+
+class Vocabulary:
+    """ Entities with a Zipf-like popularity, as in the real corpus a few entities appear in most of the papers """
+
+    def __init__(self, rnd: random.Random, size: int, exponent: float = 1.1):
+        self._rnd = rnd
+        namespaces = [factory for _, share, factory in NAMESPACES for _ in range(share)]
+        ids = set()
+        while len(ids) < size:
+            ids.add(rnd.choice(namespaces)(rnd))
+        self.ids = sorted(ids)
+        rnd.shuffle(self.ids)
+        # A few text variations of each entity, with different casing, to exercise the description choice
+        self.texts = {gid: [_word(rnd) for _ in range(rnd.randint(1, 3))] for gid in self.ids}
+        self._cum_weights = list(it.accumulate(1 / (rank ** exponent) for rank in range(1, size + 1)))
+
+    def entity(self) -> str:
+        """ A grounded participant, text::id, sometimes with a suffix the build strips """
+        rnd = self._rnd
+        gid = rnd.choices(self.ids, cum_weights=self._cum_weights)[0]
+        txt = rnd.choice(self.texts[gid])
+        if rnd.random() < 0.1:
+            txt = txt.upper()
+        if rnd.random() < 0.002:
+            gid = "frailty:FR00001"  # Grounding fixed by the build
+        suffix = rnd.choice([".human", ":[Mutant]"]) if rnd.random() < 0.05 else ""
+        return f"{txt}::{gid}{suffix}"
+
+    def entities(self, max_num: int = 3) -> str:
+        """ One or more comma separated participants """
+        return ', '.join(self.entity() for _ in range(self._rnd.choices(range(1, max_num + 1),
+                                                                          weights=(8, 3, 1)[:max_num])[0]))
+
+    def complex(self) -> str:
+        return '{' + ', '.join(self.entity() for _ in range(self._rnd.randint(2, 3))) + '}'
+
+
+def _evidence(rnd: random.Random, label: str, trigger: str) -> str:
+    """ One to three sentences with the markup of the arizona output """
+    sentences = list()
+    for _ in range(rnd.choices((1, 2, 3), weights=(6, 3, 1))[0]):
+        sentences.append(f'{" ".join(rnd.choices(FILLER, k=rnd.randint(2, 12)))} '
+                         f'<span class="controller">{_word(rnd)}</span> '
+                         f'<span class="event {label}">{trigger}</span> '
+                         f'<span class="controlled">{_word(rnd)}</span> '
+                         f'{" ".join(rnd.choices(FILLER, k=rnd.randint(2, 12)))}.')
+    return ' ++++ '.join(sentences)
+
+
+def paper_rows(rnd: random.Random, vocabulary: Vocabulary, seen_in: str, num_rows: int) -> List[List[str]]:
+    """
+    Rows of a single paper. Some participants are the ids of other events of the paper, forming chains that the
+    build has to resolve, a few of them broken or cyclic. Some events output complexes
+    """
+    rows = list()
+    for i in range(num_rows):
+        event_id = f"E{i}"
+        kind = rnd.random()
+        if kind < 0.05:
+            # Significance extraction
+            input_, output, controller, label = rnd.choice(["p", "P", "r"]), \
+                rnd.choice([f"= {rnd.random() / 10:.3f}", "< 0.05", "< 0.001", f"={rnd.random():.2f}"]), \
+                "NONE", "Significance"
+        elif kind < 0.25:
+            # Association, the participants are all in the input
+            input_, output, controller, label = ', '.join(vocabulary.entity() for _ in range(2)), \
+                vocabulary.entity(), "NONE", rnd.choice(ASSOCIATION_LABELS)
+        else:
+            input_ = vocabulary.complex() if rnd.random() < 0.03 else vocabulary.entities()
+            output = vocabulary.complex() if rnd.random() < 0.03 else vocabulary.entities(2)
+            controller = vocabulary.entities(2)
+            label = rnd.choice(CONTROLLED_LABELS)
+            # Chains of events
+            if i > 0 and rnd.random() < 0.2:
+                controller = f"E{rnd.randrange(i)}"
+            if i > 0 and rnd.random() < 0.05:
+                input_ = f"E{rnd.randrange(i)}"
+            if rnd.random() < 0.005:
+                controller = f"E{num_rows + rnd.randrange(10)}"  # Broken chain
+            elif rnd.random() < 0.002:
+                input_ = output = event_id  # Cycle
+        trigger = ', '.join(rnd.sample(TRIGGERS, k=rnd.choices((1, 2), weights=(9, 1))[0]))
+        rows.append([input_, output, controller, event_id, label, str(rnd.random() < 0.05), trigger,
+                     str(rnd.randint(1, 5)), _evidence(rnd, label, trigger.split(', ')[0]), seen_in])
+    return rows
+
+
+def generate_corpus(output_dir: Path, num_rows: int, rows_per_paper: int = 40, xdd_fraction: float = 0.3,
+                    num_entities: Optional[int] = None, num_journals: int = 500, seed: int = 0) -> SyntheticCorpus:
+    """
+    Writes a corpus of about num_rows rows into output_dir: the arizona tsv files, the xDD bibliography, the PMC-ids
+    file, the uniprot fasta file and the impact factors pickle. The same arguments produce the same files
+    """
+    rnd = random.Random(seed)
+    output_dir = Path(output_dir)
+    tsv_dir = output_dir / "tsv"
+    tsv_dir.mkdir(parents=True, exist_ok=True)
+
+    num_entities = num_entities or max(200, int(num_rows ** 0.6))
+    vocabulary = Vocabulary(rnd, num_entities)
+    journals = [f"Journal of {_word(rnd).capitalize()} {_word(rnd).capitalize()}" for _ in range(num_journals)]
+
+    bibliography = list()
+    pmcid_map = list()
+    pmc_journals = dict()
+    written, papers = 0, 0
+    with tqdm(total=num_rows, desc="Generating rows") as progress:
+        while written < num_rows:
+            num = min(rnd.randint(1, 2 * rows_per_paper - 1), num_rows - written)
+            journal = rnd.choice(journals)
+            if rnd.random() < xdd_fraction:
+                xdd_id = '%024x' % rnd.getrandbits(96)
+                seen_in = f"xdd{xdd_id}"
+                doi = f"10.{rnd.randint(1000, 9999)}/{_word(rnd)}.{papers}"
+                identifiers = [{"type": "_xddid", "id": xdd_id}]
+                link = f"https://www.example.org/articles/{xdd_id}"
+                kind = rnd.random()
+                if kind < 0.6:
+                    identifiers.append({"type": "doi", "id": doi})
+                elif kind < 0.85:
+                    link = f"https://doi.org/{doi}"  # The build finds the DOI in the link
+                else:
+                    doi = None  # The rows of the papers without a DOI are discarded
+                bibliography.append({"identifier": identifiers, "journal": {"name": {"name": journal}},
+                                     "link": [{"url": link, "type": "publisher"}]})
+                if doi and rnd.random() < 0.5:
+                    pmcid_map.append((journal, doi, f"PMC{9000000 + papers}"))
+            else:
+                seen_in = f"PMC{1000000 + papers}"
+                pmc_journals[seen_in] = journal
+                pmcid_map.append((journal, f"10.{rnd.randint(1000, 9999)}/{_word(rnd)}.{papers}", seen_in))
+
+            with (tsv_dir / f"{seen_in}-out.tsv").open('w', newline='') as f:
+                writer = csv.writer(f, delimiter='\t')
+                writer.writerow(COLUMNS)
+                # A few files have the placeholder PMCID that the build replaces with the file name
+                writer.writerows(paper_rows(rnd, vocabulary, "PMC0" if rnd.random() < 0.01 else seen_in, num))
+            written += num
+            papers += 1
+            progress.update(num)
+
+    bibliography_path = output_dir / "bibjson"
+    with bibliography_path.open('w') as f:
+        json.dump(bibliography, f)
+
+    pmcid_path = output_dir / "PMC-ids.csv"
+    with pmcid_path.open('w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Journal Title", "ISSN", "eISSN", "Year", "DOI", "PMCID", "PMID"])
+        for journal, doi, pmcid in pmcid_map:
+            writer.writerow([journal, "", "", rnd.randint(2000, 2021), doi, pmcid, ""])
+
+    uniprot_path = output_dir / "uniprot_sprot.fasta"
+    with uniprot_path.open('w') as f:
+        for gid in vocabulary.ids:
+            if gid.startswith("uniprot:") and rnd.random() < 0.8:
+                accession = gid.split(':')[1]
+                f.write(f">sp|{accession}|{_word(rnd).upper()}_HUMAN {_word(rnd).capitalize()} protein "
+                        f"OS=Homo sapiens OX=9606 GN={_word(rnd).upper()} PE=1 SV=1\n")
+                f.write(''.join(rnd.choices("ACDEFGHIKLMNPQRSTVWY", k=60)) + "\n")
+
+    impact_factors_path = output_dir / "journal_rankings.pickle"
+    ranked = [j for j in journals if rnd.random() < 0.8]
+    with impact_factors_path.open('wb') as f:
+        pickle.dump({
+            'pmc_to_sjr': [(j, j.lower()) for j in ranked],
+            'journals': pmc_journals,
+            'hindex': {j: float(rnd.randint(5, 400)) for j in ranked},
+            'sjr': {j: round(rnd.lognormvariate(0, 1), 3) for j in ranked},
+        }, f)
+
+    return SyntheticCorpus(tsv_dir, bibliography_path, pmcid_path, uniprot_path, impact_factors_path, written, papers)
+
+
+def parse_scale(s: str) -> int:
+    """ Number of rows, with optional k or M suffix, i.e. 10k or 1M """
+    s = s.strip()
+    factor = {'k': 1_000, 'm': 1_000_000}.get(s[-1].lower(), 1)
+    return int(float(s[:-1] if factor > 1 else s) * factor)
+
+
+@plac.pos('output_dir', 'Directory for the generated corpus', type=Path)
+@plac.opt('num_rows', 'Number of rows, with optional k or M suffix (10k to 10M)', type=parse_scale)
+@plac.opt('rows_per_paper', 'Average number of rows of each paper', type=int)
+@plac.opt('xdd_fraction', 'Fraction of the papers that come from xDD instead of PMC', type=float)
+@plac.opt('num_entities', 'Size of the entity vocabulary. Defaults to rows^0.6', type=int, abbrev='e')
+@plac.opt('seed', 'Random seed', type=int)
+def main(output_dir: Path, num_rows: int = 10_000, rows_per_paper: int = 40, xdd_fraction: float = 0.3,
+         num_entities: Optional[int] = None, seed: int = 0):
+    corpus = generate_corpus(output_dir, num_rows, rows_per_paper, xdd_fraction, num_entities, seed=seed)
+    print(f"{corpus.rows} rows in {corpus.papers} papers written to {corpus.tsv_dir}")
+
+
+if __name__ == '__main__':
+    plac.call(main)
@@ -1,9 +1,7 @@
 """ Creates an elastic search index from the evidence in a networkx graph """
 import pickle
-from io import StringIO
 from pathlib import Path
-from typing import Optional, List, Tuple, Iterable
-from html.parser import HTMLParser
+from typing import List, Tuple, Iterable
 from tqdm import tqdm
 import logging
 import elasticsearch
@@ -12,58 +10,13 @@ from elasticsearch import helpers
 import plac
 
 from evidence_index import Evidence
-
-
-class EvidenceParser(HTMLParser):
-    """ Use this class to strip markup and get the attributes of the tags as properties of the instance """
-    def __init__(self, data:str):
-        super().__init__()
-        self.current_tag:Optional[str] = None
-        self._raw_sentence = StringIO()
-        self.event_type:Optional[str] = None
-        self._data = data
-        self.feed(data)
-
-    def handle_starttag(self, tag: str, attrs: list[tuple[str, Optional[str]]]) -> None:
-        # We can assume there will be no nested tags
-        self.current_tag = tag
-        if tag == "span":
-            # Make attributes a dict for convenience
-            attrs = dict(attrs)
-            # Test whether this is the event's span tag
-            classes = attrs.get("class", "")
-            if "event" in classes:
-                self.event_type = classes.split()[1]
-
-
-    def handle_data(self, data: str) -> None:
-        self._raw_sentence.write(data)
-
-    @property
-    def raw_sentence(self) -> str:
-        return self._raw_sentence.getvalue()
-
-    @property
-    def directed(self) -> bool:
-        if "association" in self.event_type.lower():
-            return False
-        else:
-            return  True
-
-    @property
-    def polarity(self) -> str:
-        if "positive" in self.event_type.lower():
-            return "pos"
-        elif "negative" in self.event_type.lower():
-            return "neg"
-        else:
-            return "neutral"
+from evidence_index.markup import EvidenceParser, parse_evidence_markup, is_directed, polarity_of
 
 
 def parse_markup(markup:str) -> Tuple[str, str, bool, str]:
     """ Extract the data from the markup text present in the arizona output """
-    parser = EvidenceParser(markup)
-    return parser.raw_sentence, parser.event_type, parser.directed, parser.polarity
+    raw_sentence, event_type = parse_evidence_markup(markup)
+    return raw_sentence, event_type, is_directed(event_type), polarity_of(event_type)
 
 
 def extract_evidence(data_path: Path) -> List[Evidence]:
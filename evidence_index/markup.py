@@ -0,0 +1,139 @@
+""" Extraction of the raw sentence and the event type from the evidence markup of the arizona output """
+import re
+from html import unescape
+from html.parser import HTMLParser
+from io import StringIO
+from typing import Optional, Tuple, List, Iterable
+
+
+class MarkupStripper(HTMLParser):
+    """ Use this class to strip the markup and get the raw sentence """
+    def __init__(self, data:str):
+        super().__init__()
+        self._raw_sentence = StringIO()
+        self._data = data
+        self.feed(data)
+
+    def handle_data(self, data: str) -> None:
+        self._raw_sentence.write(data)
+
+    @property
+    def raw_sentence(self) -> str:
+        return self._raw_sentence.getvalue()
+
+
+class EvidenceParser(MarkupStripper):
+    """ Use this class to strip markup and get the attributes of the tags as properties of the instance """
+    def __init__(self, data:str):
+        self.current_tag:Optional[str] = None
+        self.event_type:Optional[str] = None
+        super().__init__(data)
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, Optional[str]]]) -> None:
+        # We can assume there will be no nested tags
+        self.current_tag = tag
+        if tag == "span":
+            # Make attributes a dict for convenience
+            attrs = dict(attrs)
+            # Test whether this is the event's span tag
+            classes = attrs.get("class", "")
+            if "event" in classes:
+                self.event_type = classes.split()[1]
+
+    @property
+    def directed(self) -> bool:
+        return is_directed(self.event_type)
+
+    @property
+    def polarity(self) -> str:
+        return polarity_of(self.event_type)
+
+
+def is_directed(event_type: str) -> bool:
+    if "association" in event_type.lower():
+        return False
+    else:
+        return  True
+
+
+def polarity_of(event_type: str) -> str:
+    if "positive" in event_type.lower():
+        return "pos"
+    elif "negative" in event_type.lower():
+        return "neg"
+    else:
+        return "neutral"
+
+
+# What follows a '<' in the markup written by the arizona output: <span class="..."> or </span>
+_span_tag = re.compile(r'span(?:\s+class="([^">]*)")?\s*>|(/span\s*>)')
+# A trailing character reference that may be incomplete
+_reference_end = re.compile(r'[\s;]')
+
+
+def _split_markup(markup: str) -> Optional[Tuple[List[str], List[str]]]:
+    """
+    Splits the markup into its text fragments and the classes of its span tags, with the same results as
+    EvidenceParser. Returns None when the markup has any other kind of tag, which is left to the HTML parser
+    """
+    fragments = markup.split('<')
+    texts = [fragments[0]]
+    classes = list()
+    for ix, fragment in enumerate(fragments[1:], start=1):
+        if fragment and (fragment[0].isascii() and fragment[0].isalpha() or fragment[0] in '/!?'):
+            match = _span_tag.match(fragment)
+            if match is None:
+                return None
+            if match.group(2) is None:
+                cls = match.group(1) or ''
+                classes.append(unescape(cls) if '&' in cls else cls)
+            texts.append(fragment[match.end():])
+        elif fragment or ix < len(fragments) - 1:
+            # Not a tag, the HTML parser takes the '<' as text
+            texts.append('<')
+            texts.append(fragment)
+        else:
+            # The parser waits for the rest of a tag at the end of the data
+            texts.append('')
+
+    # The HTML parser holds back trailing text that could end with an incomplete character reference
+    n = len(markup)
+    amppos = markup.rfind('&', max(n - len(texts[-1]), n - 34))
+    if amppos >= 0 and not _reference_end.search(markup, amppos):
+        texts.pop()
+
+    return [unescape(t) if '&' in t else t for t in texts], classes
+
+
+def parse_evidence_markup(markup: str) -> Tuple[str, Optional[str]]:
+    """ Returns the raw sentence and the event type of the markup """
+    split = _split_markup(markup)
+    if split is None:
+        parser = EvidenceParser(markup)
+        return parser.raw_sentence, parser.event_type
+
+    texts, classes = split
+    event_type = None
+    for cls in classes:
+        if "event" in cls:
+            event_type = cls.split()[1]
+    return ''.join(texts), event_type
+
+
+def parse_evidence_markups(markups: Iterable[str]) -> List[Tuple[str, Optional[str]]]:
+    """ Batch version of parse_evidence_markup """
+    return [parse_evidence_markup(m) for m in markups]
+
+
+def strip_markup(markup: str, normalize_spaces: bool = False) -> str:
+    """ Returns the raw sentence of the markup. Optionally, with the runs of whitespace collapsed into a space """
+    split = _split_markup(markup)
+    raw_sentence = ''.join(split[0]) if split is not None else MarkupStripper(markup).raw_sentence
+    if normalize_spaces:
+        raw_sentence = ' '.join(raw_sentence.split())
+    return raw_sentence
+
+
+def strip_markups(markups: Iterable[str], normalize_spaces: bool = False) -> List[str]:
+    """ Batch version of strip_markup """
+    return [strip_markup(m, normalize_spaces) for m in markups]
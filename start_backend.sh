@@ -1,2 +1,7 @@
 #!/bin/bash
-PYTHONPATH=. python -m uvicorn "backend.start:app" --port  1601
\ No newline at end of file
+# Set WORKERS to serve with forked worker processes that share the loaded data
+if [ -n "$WORKERS" ]; then
+  PYTHONPATH=. python -m backend.start --port 1601 --workers "$WORKERS"
+else
+  PYTHONPATH=. python -m uvicorn "backend.start:app" --port  1601
+fi
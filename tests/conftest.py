@@ -0,0 +1,60 @@
+""" Shared fixtures of the tests. Run from the repository root with python -m pytest """
+import random
+import sys
+from array import array
+from pathlib import Path
+from typing import Any, Dict
+
+import networkx as nx
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+# build_network imports the rankings module of the backend directory
+for path in (ROOT, ROOT / "backend"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from backend.network import SignificanceRow
+
+LABELS = ["Positive_activation", "Negative_activation", "Activation", "Positive_association", "Association"]
+PREFIXES = ["uniprot", "mesh", "go", "chebi", "uberon", "fplx", "unknown"]
+
+
+def make_graph_data(seed: int = 0, num_nodes: int = 40, num_edges: int = 200) -> Dict[str, Any]:
+    """
+    Random output of build_network: the graph with its self loops, parallel edges, uaz nodes and an unlabeled node,
+    with the significance, synonyms and id lookup tables
+    """
+    rnd = random.Random(seed)
+    nodes = [f"{rnd.choice(PREFIXES)}:N{ix}" for ix in range(num_nodes)] + ["uaz:U1", "uniprot:NOLABEL"]
+    documents = [f"PMC{ix}" for ix in range(1, 31)]
+    journals = [None] + [f"Journal {ix}" for ix in range(6)]
+
+    graph = nx.MultiDiGraph()
+    for node in nodes:
+        if node != "uniprot:NOLABEL":
+            graph.add_node(node, label=f"entity {node.split(':')[1].lower()}")
+    for _ in range(num_edges):
+        u, v = rnd.choice(nodes), rnd.choice(nodes)
+        label = rnd.choice(LABELS)
+        docs = sorted(rnd.sample(range(len(documents)), rnd.randint(1, 3)))
+        evidence = sorted({(f"https://www.ncbi.nlm.nih.gov/pmc/articles/{documents[doc]}", rnd.choice([0., 1.5, 2.25]),
+                            f'<span class="controller">{u}</span> <span class="event {label}">acts on</span> '
+                            f'<span class="controlled">{v}</span> {rnd.randint(0, 4)}')
+                           for doc in docs for _ in range(rnd.randint(0, 2))})
+        graph.add_edge(u, v, input=nodes.index(v), trigger=rnd.choice(["increases", "decreases", label]),
+                       freq=len(evidence), evidence=evidence, seen_in=array('I', docs), label=label,
+                       journals=array('I', sorted(rnd.sample(range(len(journals)), rnd.randint(1, 2)))),
+                       impact_factors=array('d', [rnd.choice([0., 0.5, 3.25]) for _ in docs]))
+
+    significance = {doc: [SignificanceRow("p", rnd.choice(["0.01", "< 0.05", "p = 0.2", "n.s."]))
+                          for _ in range(rnd.randint(1, 2))]
+                    for doc in range(len(documents)) if rnd.random() < 0.5}
+    synonyms = {node: [f"Entity {node}", f"{node.upper()}"] for node in nodes if rnd.random() < 0.7}
+    return {'graph': graph, 'significance': significance, 'synonyms': synonyms, 'entities': nodes,
+            'documents': documents, 'journals': journals}
+
+
+@pytest.fixture
+def graph_data() -> Dict[str, Any]:
+    return make_graph_data()
@@ -0,0 +1,142 @@
+""" Round trip of the output of build_network through the columnar artifact """
+import json
+import pickle
+import random
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from backend import dependencies
+from backend.columnar import MANIFEST_FILE, ColumnarGraph, GraphColumns, StringColumn, content_hash, is_columnar, \
+    read_graph_columns, read_graph_data, write_columnar
+from backend.compact_graph import CompactGraph
+
+
+def nodes_and_edges(graph):
+    return list(graph.nodes(data=True)), list(graph.edges(keys=True, data=True))
+
+
+def assert_same_graph_data(actual, expected):
+    assert nodes_and_edges(actual['graph']) == nodes_and_edges(expected['graph'])
+    for name in ('significance', 'synonyms', 'entities', 'documents', 'journals'):
+        assert actual[name] == expected[name], name
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_round_trip(graph_data, tmp_path, mmap):
+    write_columnar(tmp_path / "graph", graph_data)
+    assert is_columnar(tmp_path / "graph")
+    assert_same_graph_data(ColumnarGraph(tmp_path / "graph", mmap=mmap).to_graph_data(), graph_data)
+
+
+def test_same_data_as_the_pickle(graph_data, tmp_path):
+    with (tmp_path / "graph.pickle").open('wb') as f:
+        pickle.dump(graph_data, f)
+    write_columnar(tmp_path / "graph", graph_data)
+    assert not is_columnar(tmp_path / "graph.pickle")
+    assert_same_graph_data(read_graph_data(tmp_path / "graph"), read_graph_data(tmp_path / "graph.pickle"))
+
+
+def test_edge_order_of_the_build(graph_data, tmp_path):
+    # The order in which build_network adds the edges, which the networkx graph doesn't keep
+    graph = graph_data['graph']
+    edge_order = list(graph.edges(keys=True))
+    random.Random(1).shuffle(edge_order)
+    built = nx.MultiDiGraph()
+    built.add_nodes_from(graph.nodes(data=True))
+    built.add_edges_from((u, v, k, graph[u][v][k]) for u, v, k in edge_order)
+    graph_data['graph'] = built
+    write_columnar(tmp_path / "graph", graph_data, edge_order)
+    columnar = ColumnarGraph(tmp_path / "graph")
+    stored = [(columnar.node_ids[u], columnar.node_ids[v], k)
+              for u, v, k in zip(columnar.edge_src.tolist(), columnar.edge_dst.tolist(), columnar.edge_key.tolist())]
+    assert stored == edge_order
+    assert_same_graph_data(columnar.to_graph_data(), graph_data)
+
+
+def served_graph(columns: GraphColumns) -> CompactGraph:
+    """ The compact graph without the self loops and the uaz entities, with neutral edges """
+    return CompactGraph(columns, ["Neutral"], np.zeros(len(columns.edge_src), dtype=np.int8),
+                        np.array([not n.startswith("uaz:") for n in columns.node_ids]),
+                        columns.edge_src != columns.edge_dst)
+
+
+def served_contents(graph: CompactGraph):
+    return (graph.node_ids, graph.node_labels, list(graph.edges()),
+            [graph.edge_data(e) for e in range(graph.number_of_edges())],
+            [graph.evidence(e) for e in range(graph.number_of_edges())])
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_columns_like_the_networkx_graph(graph_data, tmp_path, mmap):
+    write_columnar(tmp_path / "graph", graph_data)
+    columns = ColumnarGraph(tmp_path / "graph", mmap=mmap).columns()
+    expected = GraphColumns.from_networkx(graph_data['graph'])
+    assert served_contents(served_graph(columns)) == served_contents(served_graph(expected))
+
+
+def test_served_without_the_networkx_graph(graph_data, tmp_path, monkeypatch):
+    with (tmp_path / "graph.pickle").open('wb') as f:
+        pickle.dump(graph_data, f)
+    write_columnar(tmp_path / "graph", graph_data)
+    expected = read_graph_columns(tmp_path / "graph.pickle")
+
+    def to_networkx(*args, **kwargs):
+        raise AssertionError("Built the networkx graph")
+
+    monkeypatch.setattr(ColumnarGraph, 'to_networkx', to_networkx)
+    actual = read_graph_columns(tmp_path / "graph")
+    assert actual['significance'] == expected['significance']
+    assert actual['synonyms'] == expected['synonyms']
+    assert served_contents(served_graph(actual['columns'])) == served_contents(served_graph(expected['columns']))
+
+
+def test_empty_graph(graph_data, tmp_path):
+    graph_data['graph'] = graph_data['graph'].subgraph([]).copy()
+    graph_data['significance'], graph_data['synonyms'] = dict(), dict()
+    write_columnar(tmp_path / "graph", graph_data)
+    assert_same_graph_data(ColumnarGraph(tmp_path / "graph").to_graph_data(), graph_data)
+
+
+def test_unsupported_version(graph_data, tmp_path):
+    write_columnar(tmp_path / "graph", graph_data)
+    manifest_path = tmp_path / "graph" / MANIFEST_FILE
+    manifest = json.loads(manifest_path.read_text())
+    manifest['version'] += 1
+    manifest_path.write_text(json.dumps(manifest))
+    with pytest.raises(Exception, match="Unsupported graph artifact"):
+        ColumnarGraph(tmp_path / "graph")
+
+
+def test_content_hash(graph_data, tmp_path, monkeypatch):
+    write_columnar(tmp_path / "graph", graph_data)
+    write_columnar(tmp_path / "copy", graph_data)
+    graph_data['synonyms'] = {**graph_data['synonyms'], 'uniprot:new': ["new"]}
+    write_columnar(tmp_path / "other", graph_data)
+    assert content_hash(tmp_path / "graph") == content_hash(tmp_path / "copy") != content_hash(tmp_path / "other")
+
+    # The graph hash is read from the manifest, without reading the columns
+    monkeypatch.setattr(dependencies, 'get_graph_file', lambda: str(tmp_path / "graph"))
+    monkeypatch.setattr(dependencies, 'md5_hash', lambda path: pytest.fail(f"Hashed {path}"))
+    assert dependencies.get_graph_hash.__wrapped__() == content_hash(tmp_path / "graph")
+
+
+def test_content_hash_of_older_artifacts(graph_data, tmp_path, monkeypatch):
+    write_columnar(tmp_path / "graph", graph_data)
+    manifest_path = tmp_path / "graph" / MANIFEST_FILE
+    manifest = json.loads(manifest_path.read_text())
+    del manifest['md5']
+    manifest_path.write_text(json.dumps(manifest))
+    assert content_hash(tmp_path / "graph") is None
+    monkeypatch.setattr(dependencies, 'get_graph_file', lambda: str(tmp_path / "graph"))
+    assert dependencies.get_graph_hash.__wrapped__() == dependencies.md5_hash(str(tmp_path / "graph"))
+
+
+def test_string_column():
+    strings = ["", "a", "unicode é α", "", "last"]
+    column = StringColumn(*StringColumn.encode(strings))
+    assert len(column) == len(strings)
+    assert list(column) == strings
+    assert [column[ix] for ix in range(len(strings))] == strings
+    assert column.slice(1, 4) == strings[1:4]
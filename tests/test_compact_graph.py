@@ -0,0 +1,165 @@
+""" The compact graph built from the columns and masks against the networkx graph cleaned the previous way """
+import pickle
+import random
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from backend.columnar import ColumnarGraph, GraphColumns, Ragged, intern_ids, read_graph_data, write_columnar
+from backend.compact_graph import CompactGraph
+from backend.dependencies import POLARITIES
+
+
+def polarity_of(label):
+    return "Positive" if "positive" in label.lower() else "Negative" if "negative" in label.lower() else "Neutral"
+
+
+def cleaned_networkx(graph):
+    """ The served graph as read_graph_and_significance built it over networkx """
+    # Copied as loaded from the pickle, the predecessors in the same order. The copy method adds the edges anew
+    graph = pickle.loads(pickle.dumps(graph))
+    for _, _, d in graph.edges(data=True):
+        d['polarity'] = polarity_of(d['label'])
+    graph.remove_edges_from(list(nx.selfloop_edges(graph)))
+    graph.remove_nodes_from([n for n in list(graph.nodes) if n.startswith("uaz:")])
+    return graph
+
+
+def compact_with_masks(graph):
+    columns = GraphColumns.from_networkx(graph)
+    label_polarity = np.array([POLARITIES.index(polarity_of(label)) for label in columns.edge_label_table])
+    nodes = np.array([not n.startswith("uaz:") for n in columns.node_ids])
+    return CompactGraph(columns, POLARITIES, label_polarity[columns.edge_label], nodes,
+                        columns.edge_src != columns.edge_dst)
+
+
+def graph_contents(graph: CompactGraph):
+    return (list(graph.node_ids), graph.node_labels, list(graph.edges()),
+            [graph.edge_data(e) for e in range(graph.number_of_edges())],
+            [sorted(graph.evidence(e)) for e in range(graph.number_of_edges())])
+
+
+def test_masks_like_the_networkx_cleaning(graph_data):
+    graph = graph_data['graph']
+    assert any(u == v for u, v in graph.edges()) and any(n.startswith("uaz:") for n in graph)
+    expected = CompactGraph.from_networkx(cleaned_networkx(graph))
+    actual = compact_with_masks(graph)
+
+    assert graph_contents(actual) == graph_contents(expected)
+    for name in ('pair_src', 'pair_dst', 'edge_pair', 'pair_offsets', 'out_offsets', 'in_pairs', 'in_offsets'):
+        assert np.array_equal(getattr(actual, name), getattr(expected, name)), name
+
+
+def test_pairs_in_order_of_first_appearance():
+    graph = nx.MultiDiGraph()
+    graph.add_nodes_from(["a", "b", "c"])
+    for u, v in [("b", "c"), ("a", "c"), ("b", "a"), ("a", "b"), ("b", "c"), ("a", "c")]:
+        graph.add_edge(u, v, input=0, trigger="t", freq=1, seen_in=[], label="Activation", journals=[],
+                       impact_factors=[], polarity="Neutral")
+    compact = CompactGraph.from_networkx(graph)
+    assert list(compact.edges()) == list(graph.edges(keys=True))
+    assert [compact.pair_endpoints(p) for p in range(compact.number_of_pairs())] == \
+           [("a", "c"), ("a", "b"), ("b", "c"), ("b", "a")]
+
+
+def add_edges(graph, pairs):
+    for u, v in pairs:
+        graph.add_edge(u, v, input=0, trigger="t", freq=1, seen_in=[], label="Activation", journals=[],
+                       impact_factors=[], polarity="Neutral", evidence=[])
+
+
+def test_shortest_path_like_networkx():
+    # Tied paths from a to e, the predecessors of e added out of the order of the nodes
+    graph = nx.MultiDiGraph()
+    graph.add_nodes_from("abcde")
+    add_edges(graph, [("d", "e"), ("a", "b"), ("c", "e"), ("a", "c"), ("b", "e"), ("a", "d"), ("c", "e")])
+    compact = CompactGraph.from_networkx(graph)
+    assert compact.predecessors("e") == list(graph.pred["e"]) == ["d", "c", "b"]
+    assert compact.shortest_path("a", "e") == nx.bidirectional_shortest_path(graph, "a", "e") == ["a", "d", "e"]
+
+    # And on a random graph with many ties, built in random order
+    rng = random.Random(0)
+    nodes = [f"n{ix}" for ix in range(30)]
+    graph = nx.MultiDiGraph()
+    graph.add_nodes_from(nodes)
+    add_edges(graph, [(rng.choice(nodes), rng.choice(nodes)) for _ in range(90)])
+    compact = CompactGraph.from_networkx(graph)
+    for source in nodes:
+        assert compact.predecessors(source) == list(graph.pred[source])
+        for target in nodes:
+            try:
+                expected = nx.bidirectional_shortest_path(graph, source, target)
+            except nx.NetworkXNoPath:
+                with pytest.raises(nx.NetworkXNoPath):
+                    compact.shortest_path(source, target)
+                continue
+            assert compact.shortest_path(source, target) == expected, (source, target)
+
+
+def test_predecessors_in_the_order_of_the_build(tmp_path):
+    graph = nx.MultiDiGraph()
+    graph.add_nodes_from("abcd")
+    edge_order = [("c", "d", 0), ("a", "b", 0), ("b", "d", 0), ("a", "d", 0), ("b", "d", 1)]
+    add_edges(graph, [(u, v) for u, v, _ in edge_order])
+    write_columnar(tmp_path / "graph", {'graph': graph, 'significance': dict(), 'synonyms': dict(),
+                                        'entities': [], 'documents': [], 'journals': []}, edge_order)
+    compact = CompactGraph(ColumnarGraph(tmp_path / "graph").columns(), ["Neutral"], np.zeros(5, dtype=np.int8))
+    assert compact.predecessors("d") == list(graph.pred["d"]) == ["c", "b", "a"]
+
+
+def test_dropped_evidence(graph_data):
+    graph = compact_with_masks(graph_data['graph'])
+    assert any(graph.evidence(e) for e in range(graph.number_of_edges()))
+    graph.drop_evidence()
+    assert all(graph.evidence(e) == [] for e in range(graph.number_of_edges()))
+    assert pickle.loads(pickle.dumps(graph)).evidence(0) == []
+
+
+def test_ragged_take():
+    rows = [[1, 2], [], [3], [4, 5, 6]]
+    ragged = Ragged.from_rows(rows, np.int64)
+    taken = ragged.take(np.array([3, 1, 0, 3]))
+    assert [taken[ix].tolist() for ix in range(len(taken))] == [rows[3], rows[1], rows[0], rows[3]]
+    assert len(ragged.take(np.zeros(0, dtype=np.int64))) == 0
+
+
+def names_graph_data(graph_data):
+    """ The output of build_network from before the id lookup tables """
+    graph = graph_data['graph'].copy()
+    entities, documents, journals = graph_data['entities'], graph_data['documents'], graph_data['journals']
+    for _, _, d in graph.edges(data=True):
+        d['input'] = entities[d['input']]
+        d['seen_in'] = {documents[doc] for doc in d['seen_in']}
+        d['journals'] = {journals[journal] for journal in d['journals']}
+        d['impact_factors'] = list(d['impact_factors'])
+    return {'graph': graph, 'significance': {documents[doc]: rows for doc, rows in graph_data['significance'].items()},
+            'synonyms': graph_data['synonyms']}
+
+
+def test_graphs_with_names_need_the_ids(graph_data):
+    old = names_graph_data(graph_data)
+    with pytest.raises(Exception, match="rebuild it with build_network.py"):
+        GraphColumns.from_networkx(old['graph'])
+
+
+def test_names_are_interned(graph_data, tmp_path):
+    path = tmp_path / "old.pickle"
+    with path.open('wb') as f:
+        pickle.dump(names_graph_data(graph_data), f)
+    data = read_graph_data(path)
+
+    # The same names once the ids are looked up
+    assert list(names_graph_data(data)['graph'].edges(keys=True, data=True)) == \
+           list(names_graph_data(graph_data)['graph'].edges(keys=True, data=True))
+    assert names_graph_data(data)['significance'] == names_graph_data(graph_data)['significance']
+    assert data['documents'] == sorted(data['documents'])
+    assert data['journals'][0] is None
+    # And the graph is served the same
+    assert graph_contents(compact_with_masks(data['graph']))[:3] == \
+           graph_contents(compact_with_masks(graph_data['graph']))[:3]
+
+
+def test_intern_ids_of_an_empty_graph():
+    data = intern_ids({'graph': nx.MultiDiGraph(), 'significance': dict(), 'synonyms': dict()})
+    assert (data['entities'], data['documents'], data['journals']) == ([], [], [])
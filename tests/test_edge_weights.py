@@ -0,0 +1,81 @@
+""" The vectorized edge weights against the weight formula evaluated edge by edge """
+import networkx as nx
+import numpy as np
+import pytest
+
+from backend.compact_graph import CompactGraph
+from backend.edge_weights import EdgeWeights
+from backend.utils import WEIGHT_COEFFICIENTS, calculateWeight, summarize_edges_significance
+from benchmarks.bench_node_radius import WEIGHTS, blob_views, node_radius_by_paths
+
+
+def served_graph(graph: nx.MultiDiGraph) -> nx.MultiDiGraph:
+    """ The graph as the backend serves it, without self loops nor uaz nodes """
+    for _, _, d in graph.edges(data=True):
+        d['polarity'] = "Neutral"
+    graph.remove_edges_from(list(nx.selfloop_edges(graph)))
+    graph.remove_nodes_from([n for n in list(graph.nodes) if n.startswith("uaz:")])
+    return graph
+
+
+@pytest.fixture
+def weighted(graph_data):
+    compact = CompactGraph.from_networkx(served_graph(graph_data['graph']))
+    edge_significance = summarize_edges_significance(compact, graph_data['significance'])
+    return compact, edge_significance, EdgeWeights.from_graph(compact, edge_significance)
+
+
+def test_raw_weights_like_the_formula(weighted):
+    compact, edge_significance, edge_weights = weighted
+    expected = [calculateWeight({'freq': int(compact.edge_freq[edge]),
+                                 'impact_factors': compact.edge_impact_factors[edge].tolist(),
+                                 **edge_significance[edge].to_dict()}, WEIGHTS)
+                for edge in range(compact.number_of_edges())]
+    assert edge_weights.edge_weights(WEIGHTS).tolist() == expected
+
+    pair_weights = edge_weights.pair_weights(WEIGHTS).tolist()
+    assert pair_weights == [sum(expected[edge] for edge in compact.pair_edges(pair)) for pair in range(len(pair_weights))]
+
+
+def test_normalized_terms_are_min_max_scaled(weighted):
+    compact, _, _ = weighted
+    num_edges = compact.number_of_edges()
+    features = np.zeros((num_edges, len(WEIGHT_COEFFICIENTS)))
+    features[:, 0] = np.linspace(-3., 5., num_edges)   # Negative values too
+    features[:, 1] = 2.5                                # The same for all the edges
+    features[:, 2] = np.arange(num_edges) % 3
+    edge_weights = EdgeWeights(compact, features)
+
+    for column, name in enumerate(WEIGHT_COEFFICIENTS):
+        weights = edge_weights.edge_weights({name: 1.}, normalized=True)
+        values = features[:, column]
+        if values.max() == values.min():
+            assert (weights == 0).all()
+        else:
+            assert weights.min() == 0. and weights.max() == 1.
+            assert np.allclose(weights, (values - values.min()) / (values.max() - values.min()))
+
+    # The normalized weights of the coefficients sum up
+    weights = edge_weights.edge_weights({'frequency': .5, 'avgImpactFactor': 2.}, normalized=True)
+    assert np.allclose(weights, .5 * np.linspace(0., 1., num_edges) + 2. * (features[:, 2] / 2))
+
+
+def test_empty_graph():
+    compact = CompactGraph.from_networkx(nx.MultiDiGraph())
+    edge_weights = EdgeWeights(compact, np.zeros((0, len(WEIGHT_COEFFICIENTS))))
+    assert len(edge_weights.edge_weights(WEIGHTS, normalized=True)) == 0
+    assert edge_weights.top_pairs(WEIGHTS, 5) == []
+
+
+def test_node_radius_like_the_shortest_path_subgraphs(graph_data, weighted):
+    """ The radii of /viz_api/noderadius against the weights of the shortest path subgraphs it replaces """
+    compact, edge_significance, edge_weights = weighted
+    graph = graph_data['graph']  # Without self loops nor uaz nodes, like the compact graph
+    graph_se = nx.DiGraph(graph)
+    significance_by_edge = dict(zip(compact.edges(), edge_significance))
+
+    views = blob_views(graph_se, 10, 12, seed=0) + [list(graph.nodes), ["uniprot:missing", next(iter(graph.nodes))]]
+    for view in views:
+        expected = node_radius_by_paths(view, WEIGHTS, graph, graph_se, significance_by_edge)
+        # The same weights, added up in another order
+        assert edge_weights.node_weights(view, WEIGHTS) == pytest.approx(expected, rel=1e-12, abs=0)
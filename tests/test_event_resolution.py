@@ -0,0 +1,122 @@
+""" EventResolutionTable against the recursive resolution it replaces """
+import random
+
+import pytest
+
+from backend.build_network import EventResolutionTable
+
+
+def recursive_resolve(eid, col, paper, dataset_inputs, dataset_outputs):
+    """ The resolve closure of build_network before the table """
+    cache = dataset_inputs if col == 'OUTPUT' else dataset_outputs
+
+    if "::" not in eid and eid != 'NONE':
+        # Resolve complex events by following the trace of the events in the frame
+        row = cache[(eid, paper)]
+        # If we look for the input, of an event, then the realized element is the outut of the input
+        if col == 'INPUT':
+            return recursive_resolve(row, 'OUTPUT', paper, dataset_inputs, dataset_outputs)
+        elif col == 'OUTPUT':
+            return recursive_resolve(row, 'INPUT', paper, dataset_inputs, dataset_outputs)
+        elif col == 'CONTROLLER':
+            return recursive_resolve(row, 'OUTPUT', paper, dataset_inputs, dataset_outputs)
+        else:
+            raise Exception("Invalid resolution")
+    else:
+        return eid
+
+
+def expected_resolution(eid, col, paper, dataset_inputs, dataset_outputs):
+    """ The participant, or None where the recursion failed and build_edges skipped the row """
+    try:
+        return recursive_resolve(eid, col, paper, dataset_inputs, dataset_outputs)
+    except (KeyError, RecursionError):
+        return None
+
+
+def table_resolution(table, eid, col, paper):
+    try:
+        return table.resolve(eid, col, paper)
+    except Exception:
+        return None
+
+
+def random_events(seed: int, num_papers: int = 5, events_per_paper: int = 40):
+    """ Events whose participants are entities, NONE, other events of the paper, or events that don't exist """
+    rnd = random.Random(seed)
+    dataset_inputs, dataset_outputs = dict(), dict()
+
+    def participant(paper_events):
+        kind = rnd.random()
+        if kind < 0.3:
+            return f"p{rnd.randint(0, 9)}::uniprot:P{rnd.randint(0, 9)}"
+        if kind < 0.35:
+            return 'NONE'
+        if kind < 0.4:
+            return 'E-missing'
+        return rnd.choice(paper_events)
+
+    for paper in range(num_papers):
+        events = [f"E{ix}" for ix in range(events_per_paper)]
+        for event in events:
+            dataset_inputs[(event, f"PMC{paper}")] = participant(events)
+            dataset_outputs[(event, f"PMC{paper}")] = participant(events)
+    return dataset_inputs, dataset_outputs
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_same_resolution_as_recursion(seed):
+    dataset_inputs, dataset_outputs = random_events(seed)
+    table = EventResolutionTable(dataset_inputs, dataset_outputs)
+    resolved = 0
+    for event, paper in dataset_inputs:
+        for col in ('INPUT', 'OUTPUT', 'CONTROLLER'):
+            expected = expected_resolution(event, col, paper, dataset_inputs, dataset_outputs)
+            assert table_resolution(table, event, col, paper) == expected, (event, col, paper)
+            resolved += expected is not None
+    # Both resolved chains and broken or looping ones are covered
+    assert 0 < resolved < 3 * len(dataset_inputs)
+
+
+def test_participants_resolve_to_themselves():
+    table = EventResolutionTable(dict(), dict())
+    assert table.resolve("il6::uniprot:P05231", 'INPUT', "PMC1") == "il6::uniprot:P05231"
+    assert table.resolve('NONE', 'CONTROLLER', "PMC1") == 'NONE'
+
+
+def test_cycles_and_broken_chains_are_unresolved():
+    dataset_inputs = {("E1", "PMC1"): "E2", ("E2", "PMC1"): "E1", ("E3", "PMC1"): "E9", ("E4", "PMC1"): "E4"}
+    dataset_outputs = {("E1", "PMC1"): "E2", ("E2", "PMC1"): "E1", ("E3", "PMC1"): "E9", ("E4", "PMC1"): "E4"}
+    table = EventResolutionTable(dataset_inputs, dataset_outputs)
+    for event in ("E1", "E2", "E3", "E4"):
+        for col in ('INPUT', 'OUTPUT', 'CONTROLLER'):
+            with pytest.raises(Exception):
+                table.resolve(event, col, "PMC1")
+
+
+def test_events_resolve_within_their_paper():
+    dataset_inputs = {("E1", "PMC1"): "a::uniprot:A", ("E1", "PMC2"): "b::uniprot:B"}
+    dataset_outputs = {("E1", "PMC1"): "c::uniprot:C", ("E1", "PMC2"): "d::uniprot:D"}
+    table = EventResolutionTable(dataset_inputs, dataset_outputs)
+    assert table.resolve("E1", 'INPUT', "PMC1") == "c::uniprot:C"
+    assert table.resolve("E1", 'OUTPUT', "PMC1") == "a::uniprot:A"
+    assert table.resolve("E1", 'CONTROLLER', "PMC2") == "d::uniprot:D"
+    with pytest.raises(Exception):
+        table.resolve("E1", 'INPUT', "PMC3")
+
+
+def test_invalid_column():
+    with pytest.raises(Exception, match="Invalid resolution"):
+        EventResolutionTable(dict(), dict()).resolve("E1", 'TRIGGER', "PMC1")
+
+
+def test_chains_longer_than_the_recursion_limit():
+    # The recursion failed on these, the table follows them iteratively
+    length = 5000
+    dataset_inputs, dataset_outputs = dict(), dict()
+    for ix in range(length):
+        nxt = f"E{ix + 1}" if ix < length - 1 else "end::uniprot:END"
+        dataset_inputs[(f"E{ix}", "PMC1")] = nxt
+        dataset_outputs[(f"E{ix}", "PMC1")] = nxt
+    table = EventResolutionTable(dataset_inputs, dataset_outputs)
+    assert table.resolve("E0", 'INPUT', "PMC1") == "end::uniprot:END"
@@ -0,0 +1,123 @@
+""" The evidence store of the graph edges, the pruning of the stores of the previous graphs and the warm starts """
+import os
+import pickle
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+from backend import dependencies
+from backend.columnar import write_columnar
+from backend.dependencies import Generation, prune_evidence_stores
+from backend.evidence_store import EvidenceStore, build_evidence_store, is_evidence_store
+
+ROWS = [("a", "b", "Positive", "a activates b", 2.5, "http://a"),
+        ("a", "b", "Positive", "a really activates b", 1., "http://b"),
+        ("b", "c", "Neutral", "b and c", 0., "http://c")]
+
+
+@pytest.fixture
+def store(tmp_path):
+    build_evidence_store(tmp_path / "evidence.sqlite", ROWS)
+    return EvidenceStore(tmp_path / "evidence.sqlite")
+
+
+def test_evidence_of_an_edge(store):
+    assert [(item.sentence, float(item.impact), item.hyperlink) for item in store[("a", "b", "Positive")]] == \
+           [row[3:] for row in ROWS[:2]]
+    assert store[("a", "b", "Negative")] == []
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="POSIX only")
+def test_queried_from_a_forked_process(store):
+    assert len(store[("a", "b", "Positive")]) == 2
+    parent_db = store._db
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        ok = False
+        try:
+            # Not cached yet, so it's queried, through a connection of its own
+            ok = [item.sentence for item in store[("b", "c", "Neutral")]] == ["b and c"] and store._db is not parent_db
+        finally:
+            os.write(write, b"1" if ok else b"0")
+            os._exit(0)
+    os.close(write)
+    assert os.read(read, 1) == b"1"
+    os.waitpid(pid, 0)
+    # And the parent keeps its own
+    assert store._db is parent_db and len(store[("b", "c", "Neutral")]) == 1
+
+
+def stores(store_dir, names):
+    for name in names:
+        build_evidence_store(store_dir / name, ROWS[:1])
+    return [store_dir / name for name in names]
+
+
+@pytest.fixture
+def served(monkeypatch, tmp_path):
+    """ A generation served with the store of a previous graph """
+    def serve(store_path):
+        generation = Generation(0, str(tmp_path / "graph.pickle"))
+        generation._values[dependencies.get_evidence_sentences_and_frequencies.__wrapped__] = \
+            (EvidenceStore(store_path), dict())
+        monkeypatch.setattr(dependencies, '_generation', generation)
+    return serve
+
+
+def test_pruned_in_the_store_directory(monkeypatch, tmp_path, served):
+    store_dir = tmp_path / "stores"
+    monkeypatch.setattr(dependencies, 'get_cli_args',
+                        lambda: SimpleNamespace(evidence_store_dir=str(store_dir), state_cache_dir=None))
+    served_store, new_store, *stale = stores(store_dir, ["evidence-v5-served.sqlite", "evidence-v5-new.sqlite",
+                                                         "evidence-v4-new.sqlite", "evidence-v5-old.sqlite"])
+    other = store_dir / "records.sqlite"
+    other.write_text("")
+    served(served_store)
+
+    prune_evidence_stores(new_store)
+    assert is_evidence_store(served_store) and is_evidence_store(new_store)
+    assert not any(path.exists() for path in stale)
+    assert other.exists()
+
+
+def test_not_pruned_in_the_temporary_directory(monkeypatch, tmp_path, served):
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+    monkeypatch.setattr(dependencies, 'get_cli_args',
+                        lambda: SimpleNamespace(evidence_store_dir=None, state_cache_dir=None))
+    store_dir = dependencies._evidence_store_dir()
+    assert store_dir == tmp_path / "frailty_viz"
+    served_store, new_store, other_server = stores(store_dir, ["evidence-v5-served.sqlite", "evidence-v5-new.sqlite",
+                                                               "evidence-v5-other.sqlite"])
+    served(served_store)
+
+    prune_evidence_stores(new_store)
+    assert all(is_evidence_store(path) for path in (served_store, new_store, other_server))
+
+
+def test_warm_start_of_the_columnar_artifact(graph_data, monkeypatch, tmp_path):
+    write_columnar(tmp_path / "graph", graph_data)
+    monkeypatch.setattr(dependencies, 'get_cli_args', lambda: SimpleNamespace(
+        state_cache_dir=str(tmp_path / "cache"), evidence_store_dir=None, evidence_cache_size=16))
+    monkeypatch.setattr(dependencies, 'get_rankings_hash', lambda: "rankings")
+
+    def start():
+        monkeypatch.setattr(dependencies, '_generation', Generation(0, str(tmp_path / "graph")))
+        graph, significance, synonyms = dependencies.read_graph_and_significance()
+        store, frequencies = dependencies.get_evidence_sentences_and_frequencies()
+        edges = list(graph.edges())
+        return ((graph.node_ids, edges, [graph.edge_data(e) for e in range(len(edges))], graph.in_pairs.tolist(),
+                 [graph.evidence(e) for e in range(len(edges))], significance, synonyms, frequencies),
+                [store[(u, v, graph.polarity(e))] for e, (u, v, _) in enumerate(edges)])
+
+    cold = start()
+    assert any(cold[1])
+    with dependencies._state_cache_path().open('rb') as f:
+        assert set(pickle.load(f)) == {'significance', 'synonyms', 'frequencies'}
+
+    def read_graph_columns(path):
+        raise AssertionError("Not a warm start")
+
+    monkeypatch.setattr(dependencies, 'read_graph_columns', read_graph_columns)
+    assert start() == cold
@@ -0,0 +1,160 @@
+""" The generations of the graph data: computed once, pinned for each request and swapped in by a reload """
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from backend import admin_api, dependencies
+from backend.dependencies import Generation, GraphReloader, PinGeneration, active_generation, generation_cache
+
+
+@pytest.fixture
+def generation(monkeypatch, tmp_path):
+    """ A generation of a graph file that doesn't load anything, served as the current one """
+    generation = Generation(0, str(tmp_path / "graph.pickle"))
+    monkeypatch.setattr(dependencies, '_generation', generation)
+    return generation
+
+
+def test_computed_once_by_concurrent_callers(generation):
+    calls = list()
+
+    def dependency():
+        calls.append(threading.get_ident())
+        time.sleep(0.05)
+        return object()
+
+    values = list()
+    threads = [threading.Thread(target=lambda: values.append(generation.get(dependency))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert len(values) == 8 and all(value is values[0] for value in values)
+
+
+def test_failure_is_cached(generation):
+    calls = list()
+
+    def broken():
+        calls.append(1)
+        raise ValueError("broken graph file")
+
+    for _ in range(3):
+        with pytest.raises(ValueError, match="broken graph file"):
+            generation.get(broken)
+    assert len(calls) == 1
+    assert generation.computed(broken) is None
+
+
+def test_computed_doesnt_compute(generation, monkeypatch):
+    monkeypatch.setattr(dependencies, '_generation_dependencies', list())
+    calls = list()
+
+    @generation_cache
+    def dependency():
+        calls.append(1)
+        return "value"
+
+    assert generation.computed(dependency) is None
+    assert calls == []
+    assert dependency() == "value"
+    assert generation.computed(dependency) == "value"
+    assert calls == [1]
+
+
+def test_requests_keep_their_generation(generation, monkeypatch, tmp_path):
+    """ A request pinned before a swap finishes with its generation, the next one sees the new one """
+    seen = list()
+    swapped, resumed = asyncio.Event(), asyncio.Event()
+    new_generation = Generation(1, str(tmp_path / "other.pickle"))
+
+    async def app(scope, receive, send):
+        seen.append((scope['name'], active_generation()))
+        if scope['name'] == 'first':
+            swapped.set()
+            await resumed.wait()
+            seen.append((scope['name'], active_generation()))
+
+    async def requests():
+        middleware = PinGeneration(app)
+        first = asyncio.ensure_future(middleware({'name': 'first'}, None, None))
+        await swapped.wait()
+        monkeypatch.setattr(dependencies, '_generation', new_generation)
+        await middleware({'name': 'second'}, None, None)
+        resumed.set()
+        await first
+
+    asyncio.run(requests())
+    assert seen == [('first', generation), ('second', new_generation), ('first', generation)]
+    # Outside of a request, the current generation
+    assert active_generation() is new_generation
+
+
+def test_reload_swaps_the_generation(generation, monkeypatch, tmp_path):
+    built = list()
+    monkeypatch.setattr(dependencies, 'preload_generation', lambda: built.append(active_generation()))
+    reloader = GraphReloader()
+    reloader._build(str(tmp_path / "other.pickle"))
+
+    assert len(built) == 1 and built[0] is not generation
+    assert dependencies.current_generation() is built[0]
+    assert built[0].number == generation.number + 1
+    assert reloader.status()['graph_file'] == str(tmp_path / "other.pickle")
+    assert reloader.last_error is None and not reloader.reloading
+
+
+def test_failed_reload_keeps_the_generation(generation, monkeypatch, tmp_path):
+    def broken():
+        raise ValueError("broken graph file")
+
+    monkeypatch.setattr(dependencies, 'preload_generation', broken)
+    reloader = GraphReloader()
+    reloader._build(str(tmp_path / "other.pickle"))
+
+    assert dependencies.current_generation() is generation
+    assert reloader.last_error == "ValueError: broken graph file"
+    assert not reloader.reloading
+
+
+def test_disabled_reloads_are_refused(generation, monkeypatch):
+    monkeypatch.setattr(dependencies, 'preload_generation', lambda: pytest.fail("Reloaded"))
+    reloader = GraphReloader()
+    reloader.disable("served with forked workers")
+    monkeypatch.setattr(admin_api, 'graph_reloader', reloader)
+
+    assert reloader.reload() is False
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(admin_api.reload_graph())
+    assert error.value.status_code == 409 and error.value.detail == "served with forked workers"
+    threads = threading.active_count()
+    reloader.watch(0.01)
+    assert threading.active_count() == threads
+    assert reloader.status()['reload_disabled'] == "served with forked workers"
+    assert dependencies.current_generation() is generation
+
+
+def test_startup_preload_loads_once(monkeypatch):
+    calls = list()
+
+    def preload(dependencies):
+        calls.append(threading.get_ident())
+        time.sleep(0.05)
+        return {'graph': 0.05}
+
+    monkeypatch.setattr(dependencies, 'preload', preload)
+    startup_preload = dependencies.StartupPreload()
+    threads = [threading.Thread(target=startup_preload.start) for _ in range(4)] + \
+              [threading.Thread(target=startup_preload.run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    startup_preload.run()
+    # Returns once the load that started first is done
+    assert startup_preload.ready
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert startup_preload.status() == {'ready': True, 'error': None, 'seconds': {'graph': 0.05}}
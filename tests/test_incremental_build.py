@@ -0,0 +1,175 @@
+""" The incremental build against a full build of the same files """
+import csv
+import glob
+import os
+import shutil
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from backend import build_network as bn
+from benchmarks.synthetic_corpus import generate_corpus
+from rankings import ImpactFactors
+
+
+@pytest.fixture(scope="module")
+def corpus(tmp_path_factory):
+    path = tmp_path_factory.mktemp("corpus")
+    corpus = generate_corpus(path, 1500, rows_per_paper=20, seed=3)
+    bibliography = bn.parse_xdd_blibliography(corpus.bibliography)
+    dois = {metadata.doi for metadata in bibliography.values() if metadata.doi}
+    return {
+        'tsv_dir': Path(corpus.tsv_dir),
+        'bibliography': bibliography,
+        'doi2pmcid': bn.PmcidIndex(corpus.pmcid_map).lookup_many(dois),
+        'uniprot_names': bn.UniprotIndex(corpus.uniprot),
+        'index_factors': ImpactFactors(corpus.impact_factors),
+    }
+
+
+@pytest.fixture
+def files(corpus, tmp_path) -> List[str]:
+    """ A copy of the arizona files, in sorted order, to change them """
+    tsv_dir = tmp_path / "tsv"
+    shutil.copytree(corpus['tsv_dir'], tsv_dir)
+    return sorted(glob.glob(str(tsv_dir / "*.tsv")))
+
+
+def full_build(paths, corpus):
+    rows = list(bn.iter_rows(paths, corpus['bibliography']))
+    scan = bn.scan_rows(rows, corpus['bibliography'], corpus['doi2pmcid'], corpus['uniprot_names'])
+    events = bn.EventResolutionTable(scan.dataset_inputs, scan.dataset_outputs)
+    return scan, bn.build_edges(rows, events, corpus['bibliography'], corpus['doi2pmcid'], corpus['index_factors'])
+
+
+def incremental_build(paths, corpus, cache_dir, signatures=None):
+    cache = bn.IncrementalBuildCache(cache_dir, signatures or {'uniprot': None})
+    return bn.incremental_build(paths, cache, corpus['bibliography'], corpus['doi2pmcid'], corpus['uniprot_names'],
+                                corpus['index_factors'])
+
+
+def build_output(scan, aggregates):
+    """ What the graph is made of, in the order that shows in the graph """
+    return {
+        'descriptions': {gid: counts.most_common()[0][0] for gid, counts in scan.all_descriptions.items()},
+        'synonyms': {gid: list(counts) for gid, counts in scan.all_descriptions.items()},
+        'significance': dict(scan.significance_extractions),
+        'edges': {key: (aggregates.counts[key], sorted(aggregates.evidences[key]), sorted(aggregates.seen_in[key]),
+                        sorted(aggregates.journals[key], key=str), aggregates.impact_factors[key])
+                  for key in aggregates.edges},
+    }
+
+
+def assert_same_as_full_build(paths, corpus, scan, aggregates):
+    expected = build_output(*full_build(paths, corpus))
+    actual = build_output(scan, aggregates)
+    assert actual['edges'] == expected['edges']
+    assert actual == expected
+
+
+@pytest.fixture
+def parsed(monkeypatch) -> List[str]:
+    """ The files parsed by the incremental builds """
+    parsed = list()
+    iter_parsed_files = bn.iter_parsed_files
+
+    def recording(ps, bibliography, workers=1):
+        for p, rows in iter_parsed_files(ps, bibliography, workers):
+            parsed.append(p)
+            yield p, rows
+
+    monkeypatch.setattr(bn, 'iter_parsed_files', recording)
+    return parsed
+
+
+def test_first_build(files, corpus, tmp_path):
+    assert_same_as_full_build(files, corpus, *incremental_build(files, corpus, tmp_path / "cache"))
+
+
+def test_unchanged_files_are_not_parsed(files, corpus, tmp_path, parsed):
+    incremental_build(files, corpus, tmp_path / "cache")
+    parsed.clear()
+    # Touched, with the same contents
+    stat = os.stat(files[0])
+    os.utime(files[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    result = incremental_build(files, corpus, tmp_path / "cache")
+    assert parsed == []
+    assert_same_as_full_build(files, corpus, *result)
+
+
+def test_appended_files(files, corpus, tmp_path, parsed):
+    incremental_build(files[:-3], corpus, tmp_path / "cache")
+    parsed.clear()
+    result = incremental_build(files, corpus, tmp_path / "cache")
+    assert parsed == files[-3:]
+    assert_same_as_full_build(files, corpus, *result)
+
+
+def test_files_added_between_previous_files(files, corpus, tmp_path, parsed):
+    incremental_build(files[:5] + files[12:], corpus, tmp_path / "cache")
+    parsed.clear()
+    result = incremental_build(files, corpus, tmp_path / "cache")
+    assert parsed == files[5:12]
+    assert_same_as_full_build(files, corpus, *result)
+
+
+def test_reordered_files(files, corpus, tmp_path, parsed):
+    incremental_build(files, corpus, tmp_path / "cache")
+    parsed.clear()
+    reordered = files[::-1]
+    result = incremental_build(reordered, corpus, tmp_path / "cache")
+    assert parsed == []
+    assert_same_as_full_build(reordered, corpus, *result)
+
+
+def test_removed_files(files, corpus, tmp_path, parsed):
+    incremental_build(files, corpus, tmp_path / "cache")
+    parsed.clear()
+    remaining = files[:3] + files[6:]
+    result = incremental_build(remaining, corpus, tmp_path / "cache")
+    assert parsed == []
+    assert_same_as_full_build(remaining, corpus, *result)
+
+
+def rewrite_rows(path, keep):
+    with open(path) as f:
+        reader = csv.reader(f, delimiter='\t')
+        header, rows = next(reader), list(reader)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f, delimiter='\t', lineterminator='\n')
+        writer.writerow(header)
+        writer.writerows(row for ix, row in enumerate(rows) if keep(ix))
+
+
+def test_changed_file(files, corpus, tmp_path, parsed):
+    incremental_build(files, corpus, tmp_path / "cache")
+    parsed.clear()
+    rewrite_rows(files[4], lambda ix: ix % 2 == 0)
+    result = incremental_build(files, corpus, tmp_path / "cache")
+    assert parsed == [files[4]]
+    assert_same_as_full_build(files, corpus, *result)
+
+
+def test_files_sharing_a_paper(files, corpus, tmp_path, parsed):
+    # Split a file in two, so the events of the paper are resolved across files
+    second_part = files[2].replace('-out.tsv', '-part2-out.tsv')
+    shutil.copy(files[2], second_part)
+    rewrite_rows(files[2], lambda ix: ix % 2 == 0)
+    rewrite_rows(second_part, lambda ix: ix % 2 == 1)
+    paths = files[:3] + [second_part] + files[3:]
+    incremental_build(paths, corpus, tmp_path / "cache")
+    parsed.clear()
+
+    rewrite_rows(second_part, lambda ix: ix != 0)
+    result = incremental_build(paths, corpus, tmp_path / "cache")
+    assert parsed == [second_part]
+    assert_same_as_full_build(paths, corpus, *result)
+
+
+def test_other_auxiliary_inputs_discard_the_cache(files, corpus, tmp_path, parsed):
+    incremental_build(files, corpus, tmp_path / "cache", {'uniprot': {'size': 1, 'mtime': 1}})
+    parsed.clear()
+    result = incremental_build(files, corpus, tmp_path / "cache", {'uniprot': {'size': 2, 'mtime': 1}})
+    assert parsed == files
+    assert_same_as_full_build(files, corpus, *result)
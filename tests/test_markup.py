@@ -0,0 +1,75 @@
+""" The markup splitter against the HTML parser it replaces, including the markup it leaves to the parser """
+import re
+
+import pytest
+
+from benchmarks.bench_markup import synthetic_markups
+from evidence_index.markup import EvidenceParser, MarkupStripper, _split_markup, parse_evidence_markup, \
+    parse_evidence_markups, strip_markup, strip_markups
+
+space_remover = re.compile(r'\s+')
+
+# Markup of the arizona output and the corner cases of the HTML parser
+SPLIT_MARKUPS = [
+    '',
+    'No markup at all',
+    '<span class="controller">IL-6</span> <span class="event Positive_activation">increases</span> '
+    '<span class="controlled">CRP</span>.',
+    '<span class="event Negative_association">is associated</span> with frailty (p < 0.05)',
+    'a<0.05 and b <= 3',
+    'ends with a bracket <',
+    '<<span class="controller">x</span>',
+    'Tom &amp; Jerry &lt;3 &#x41; &#66;',
+    'trailing reference &amp',
+    'trailing reference &#12',
+    'trailing ampersand &',
+    'reference then space &amp more',
+    '<span class="event Activation&amp;More">x</span>',
+    '<span>no class</span>',
+    '<span class="">empty class</span >',
+    '</span>closing only',
+    'unicode éè <span class="controller">α-syn</span>\xa0and\ttabs\n\nnew lines',
+    '<span class="event Activation">a</span><span class="event Negative_activation">b</span>',
+]
+
+# Markup with other tags, left to the HTML parser
+FALLBACK_MARKUPS = [
+    'some <b>bold</b> text',
+    '<SPAN class="event Activation">upper case</SPAN>',
+    '<!-- a comment --> text',
+    '<span id="x" class="event Activation">other attributes</span>',
+    '<br/> self closing',
+    "<span class='event Activation'>single quotes</span>",
+    'a <?processing instruction?> b',
+]
+
+
+def html_parser(markup):
+    parser = EvidenceParser(markup)
+    return parser.raw_sentence, parser.event_type
+
+
+@pytest.mark.parametrize("markup", SPLIT_MARKUPS)
+def test_split_markup_like_the_html_parser(markup):
+    assert _split_markup(markup) is not None
+    assert parse_evidence_markup(markup) == html_parser(markup)
+    assert strip_markup(markup) == MarkupStripper(markup).raw_sentence
+
+
+@pytest.mark.parametrize("markup", FALLBACK_MARKUPS)
+def test_other_tags_fall_back_to_the_html_parser(markup):
+    assert _split_markup(markup) is None
+    assert parse_evidence_markup(markup) == html_parser(markup)
+    assert strip_markup(markup) == MarkupStripper(markup).raw_sentence
+
+
+def test_normalized_spaces_are_the_deduplication_keys():
+    markups = SPLIT_MARKUPS + FALLBACK_MARKUPS + synthetic_markups(200, seed=1)
+    assert strip_markups(markups, normalize_spaces=True) == \
+           [space_remover.sub(' ', MarkupStripper(m).raw_sentence.strip()) for m in markups]
+
+
+def test_synthetic_markups():
+    markups = synthetic_markups(1000)
+    assert parse_evidence_markups(markups) == [html_parser(m) for m in markups]
+    assert strip_markups(markups) == [MarkupStripper(m).raw_sentence for m in markups]
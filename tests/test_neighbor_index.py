@@ -0,0 +1,92 @@
+""" The top neighbors of NeighborIndex against the sorting of the simple networkx graph it replaces """
+import networkx as nx
+import numpy as np
+import pytest
+
+from backend.compact_graph import CompactGraph
+from backend.neighbor_index import NeighborIndex
+from backend.viz_api import category_encoding, category_number_or_default
+
+NUM_CATEGORIES = max(category_encoding) + 1
+
+
+def simple_graphs(graph):
+    """ The simple graph, with the frequencies of the parallel edges summed up, and its reverse, as in get_blob_graph """
+    G_se = nx.DiGraph()
+    G_se.add_nodes_from(graph.nodes.data())
+    edges = {(u, v): 0 for u, v, _ in graph.edges}
+    for u, v, d in graph.edges.data():
+        edges[(u, v)] += d['freq']
+    for (u, v), freq in edges.items():
+        G_se.add_edge(u, v, freq=freq)
+    return G_se, G_se.reverse()
+
+
+def sorted_neighbors(adjacency, node, category, k, nodes):
+    neighbors = [(n, d['freq']) for n, d in adjacency[node].items()
+                 if category_number_or_default(n) == category and n not in nodes]
+    return sorted(neighbors, key=lambda x: x[1], reverse=True)[:k]
+
+
+@pytest.fixture
+def graphs(graph_data):
+    graph = graph_data['graph']
+    for _, _, d in graph.edges(data=True):
+        d['polarity'] = "Neutral"
+    compact = CompactGraph.from_networkx(graph)
+    pair_freqs = np.add.reduceat(compact.edge_freq, compact.pair_offsets[:-1], dtype=np.int64)
+    index = NeighborIndex.from_graph(compact, pair_freqs, category_number_or_default, NUM_CATEGORIES)
+    return graph, index
+
+
+@pytest.mark.parametrize("k", [1, 2, 5, 100])
+def test_top_like_sorting(graphs, k):
+    graph, index = graphs
+    G_se, G_se_rev = simple_graphs(graph)
+    nodes = list(graph.nodes)
+    requests = [nodes[:1], nodes[3:6], nodes[::7]]
+    for requested in requests:
+        excluded = {index.node_index[n] for n in requested}
+        for node in requested:
+            node_id = index.node_index[node]
+            for category in range(NUM_CATEGORIES):
+                for adjacency, incoming in ((G_se, False), (G_se_rev, True)):
+                    expected = sorted_neighbors(adjacency, node, category, k, requested)
+                    actual = [(index.nodes[n], freq) for n, freq in index.top(node_id, category, k, excluded, incoming)]
+                    assert actual == expected, (node, category, incoming)
+
+
+def test_pair_frequencies(graphs):
+    graph, index = graphs
+    G_se, _ = simple_graphs(graph)
+    out = dict()
+    for u in range(len(index.nodes)):
+        # The segments of all the categories of a node are contiguous
+        start, end = index.out_offsets[u * NUM_CATEGORIES], index.out_offsets[(u + 1) * NUM_CATEGORIES]
+        for v, freq in zip(index.out_neighbors[start:end].tolist(), index.out_freqs[start:end].tolist()):
+            out[(index.nodes[u], index.nodes[v])] = freq
+    assert out == {(u, v): d['freq'] for u, v, d in G_se.edges(data=True)}
+
+
+def test_skipped_target(graph_data):
+    graph = graph_data['graph']
+    for _, _, d in graph.edges(data=True):
+        d['polarity'] = "Neutral"
+    skipped = next(v for _, v in graph.edges())
+    compact = CompactGraph.from_networkx(graph)
+    pair_freqs = np.add.reduceat(compact.edge_freq, compact.pair_offsets[:-1], dtype=np.int64)
+    index = NeighborIndex.from_graph(compact, pair_freqs, category_number_or_default, NUM_CATEGORIES,
+                                     skip_target=skipped)
+    skipped_id = index.node_index[skipped]
+    assert skipped_id not in index.out_neighbors.tolist()
+    assert index.in_offsets[skipped_id * NUM_CATEGORIES] == index.in_offsets[(skipped_id + 1) * NUM_CATEGORIES]
+
+
+def test_out_of_range():
+    index = NeighborIndex(["a", "b"], {"a": 0, "b": 1}, np.zeros(2, dtype=np.int8), np.array([0]), np.array([1]),
+                          np.array([3]), 1)
+    assert index.top(0, 0, 5, set()) == [(1, 3)]
+    assert index.top(0, 1, 5, set()) == []
+    assert index.top(0, -1, 5, set()) == []
+    assert index.top(0, 0, 0, set()) == []
+    assert index.top(0, 0, 5, {1}) == []
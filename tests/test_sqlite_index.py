@@ -0,0 +1,52 @@
+""" The persistent SQLite indices of the uniprot descriptions and the PMCIDs against the dictionaries they replace """
+import os
+import sqlite3
+
+import pytest
+
+from backend.build_network import PmcidIndex, SQLiteIndex, UniprotIndex, read_uniprot
+
+FASTA = """>sp|P05231|IL6_HUMAN Interleukin-6 OS=Homo sapiens OX=9606 GN=IL6 PE=1 SV=1
+MNSFSTSAFGPVAFSLGLLLVLPAAFPAPVPPGEDSKDVAAPHRQPLTSSERIDKQIRYILDGISALRKETCNKSNMCESSKEALAENNLNLPKMAEKDGCFQSGFNEETCLVKII
+>sp|P01375|TNFA_HUMAN Tumor necrosis factor OS=Homo sapiens OX=9606 GN=TNF PE=1 SV=1
+MSTESMIRDVELAEEALPKKTGGPQGSRRCLFLSLFSFLIVAGATTLFCLLHFGVIGPQREEFPRDLSLISPLAQAVRSSSRTPSDKPVAHVVANPQAEGQLQWLNRRANALLANG
+"""
+
+
+@pytest.fixture
+def fasta(tmp_path):
+    path = tmp_path / "uniprot.fasta"
+    path.write_text(FASTA)
+    return path
+
+
+def test_abstract():
+    with pytest.raises(TypeError):
+        SQLiteIndex(None)
+
+
+def test_uniprot_index_like_the_dictionary(fasta):
+    expected = read_uniprot(fasta)
+    with UniprotIndex(fasta) as index:
+        assert {accession: index.get(accession) for accession in expected} == expected
+        assert index.get("P99999", "default") == "default"
+        assert index.lookup_many(list(expected) + ["P99999"]) == expected
+
+
+def test_rebuilt_when_the_source_changes(fasta):
+    with UniprotIndex(fasta) as index:
+        assert index.get("P05231") is not None
+    fasta.write_text(FASTA.split(">sp|P01375")[0].replace("Interleukin-6", "IL-6"))
+    stat = fasta.stat()
+    os.utime(fasta, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    with UniprotIndex(fasta) as index:
+        assert index.lookup_many(["P05231", "P01375"]) == read_uniprot(fasta)
+
+
+def test_closed(tmp_path):
+    path = tmp_path / "PMC-ids.csv"
+    path.write_text("DOI,PMCID\n10.1/a,PMC1\n10.1/b,PMC2\n")
+    with PmcidIndex(path) as index:
+        assert index.lookup_many(["10.1/a", "10.1/b", "10.1/c"]) == {"10.1/a": "PMC1", "10.1/b": "PMC2"}
+    with pytest.raises(sqlite3.ProgrammingError):
+        index.lookup("10.1/a")
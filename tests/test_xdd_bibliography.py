@@ -0,0 +1,113 @@
+""" The streaming parser of the xDD bibliography against json.load, and the cache of the parsed entries """
+import io
+import json
+import os
+
+import pytest
+
+from backend.build_network import XDDMetaData, doi_pattern, iter_json_array, parse_xdd_blibliography
+
+DOCUMENTS = [
+    '[]',
+    '  [ ]  ',
+    '[1, -2, 3.5, 1e10, -4.25E-3, 0, 12345678901234567890]',
+    '[true, false, null, "", "a"]',
+    '["brackets ] [ and , commas", "escaped \\" quote \\\\ and \\u00e9 \\n"]',
+    '[{"a": [1, {"b": "]"}], "c": {}}, [], [[]], {"d": "}"}]',
+    '\n[\n  {"x": 1}\n  ,\n  {"y": "\\u00fcnicode é"}\n]\n',
+    '[0.000001,100000000000]',
+]
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 1 << 20])
+def test_same_elements_as_json_load(document, chunk_size):
+    assert list(iter_json_array(io.StringIO(document), chunk_size)) == json.loads(document)
+
+
+@pytest.mark.parametrize("document", ['{"a": 1}', '', '1', '"[1]"'])
+def test_not_an_array(document):
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO(document), 2))
+
+
+@pytest.mark.parametrize("document", ['[1 2]', '[1, 2', '[{"a": 1]', '[1,]', '["unterminated'])
+@pytest.mark.parametrize("chunk_size", [1, 3, 1 << 20])
+def test_malformed_arrays(document, chunk_size):
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO(document), chunk_size))
+
+
+def old_parse_xdd_bibliography(path):
+    """ parse_xdd_blibliography before the streaming parser and the cache """
+    with path.open() as f:
+        bib = json.load(f)
+
+    entries = list()
+    for elem in bib:
+        key, doi = None, None
+        for identifier in elem["identifier"]:
+            id_type = identifier["type"]
+            if id_type == "_xddid":
+                key = identifier["id"]
+            elif id_type == "doi":
+                doi = identifier["id"]
+
+        assert key is not None, f"Problem reading xdd id"
+
+        journal = elem["journal"]["name"]["name"]
+        link = elem["link"][0]["url"]
+
+        # If no DOI specified, try finding it in the link
+        if doi is None:
+            match = doi_pattern.search(link)
+            if match:
+                doi = match.group()
+            else:
+                doi = None
+
+        entry = XDDMetaData(journal, link, doi)
+        entries.append((key, entry))
+
+    return dict(entries)
+
+
+def bibliography_entries(num: int):
+    entries = list()
+    for ix in range(num):
+        identifiers = [{"type": "_xddid", "id": f"{ix:024x}"}]
+        if ix % 3 == 0:
+            identifiers.append({"type": "doi", "id": f"10.1234/doi.{ix}"})
+        link = f"https://doi.org/10.5555/link.{ix}" if ix % 3 == 1 else f"https://www.example.org/articles/{ix}"
+        entries.append({"identifier": identifiers, "journal": {"name": {"name": f"Journal {ix % 7}"}},
+                        "link": [{"url": link}], "title": f"Title [{ix}], with \"quotes\""})
+    return entries
+
+
+def test_bibliography_like_the_old_parser(tmp_path):
+    path = tmp_path / "bibjson"
+    path.write_text(json.dumps(bibliography_entries(50), indent=1))
+    expected = old_parse_xdd_bibliography(path)
+
+    assert parse_xdd_blibliography(path) == expected
+    # The second time from the cache
+    assert (tmp_path / "bibjson.cache.pickle").exists()
+    assert parse_xdd_blibliography(path) == expected
+
+
+def test_cache_follows_the_bibliography(tmp_path):
+    path = tmp_path / "bibjson"
+    cache_path = tmp_path / "bib.cache"
+    path.write_text(json.dumps(bibliography_entries(10)))
+    parse_xdd_blibliography(path, cache_path)
+
+    # Touched, with the same contents
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert parse_xdd_blibliography(path, cache_path) == old_parse_xdd_bibliography(path)
+
+    # Changed
+    path.write_text(json.dumps(bibliography_entries(12)))
+    parsed = parse_xdd_blibliography(path, cache_path)
+    assert len(parsed) == 12
+    assert parsed == old_parse_xdd_bibliography(path)